@@ -0,0 +1,626 @@
+"""
+MERGEABLE AGGREGATES FOR THE REPORT TABLES
+==========================================
+Grouped report tables expressed as (grouping key, metrics) specs so the same
+table can be produced either from the full frame in memory or from partial
+aggregates merged across chunks of the CSV.
+
+A metric is a (column, function) pair using the pandas names 'sum',
+'count', 'mean' and 'nunique'. Partial aggregates keep only mergeable
+components: sums, counts, minima and maxima per group (a mean is carried
+as sum/count) and the distinct (group, value) rows needed for exact
+'nunique' counts. Partial state can be saved to disk and merged with later
+batches (see incremental.py).
+
+With ``approx_error`` set, 'nunique' metrics are estimated from one
+HyperLogLog sketch per group instead (see sketches.py), so the memory for a
+distinct count is a fixed number of registers per group whatever the data
+size. Per-customer and per-product counts always stay exact: those groups
+are many and tiny, so the exact (group, order) rows are smaller than a
+sketch per group.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import save_frame, load_frame
+from rfm import customer_names, rfm_table
+from sketches import CoMoments, GroupedHyperLogLog, Histogram, HyperLogLog, QuantileSketch
+from topk import top_k
+
+# Report tables shared by the in-memory and streaming paths
+TABLE_SPECS = {
+    'region_analysis': ('Region', [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique'),
+        ('Customer ID', 'nunique'), ('Quantity', 'sum')]),
+    'category_analysis': ('Category', [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique'),
+        ('Quantity', 'sum'), ('Discount', 'mean')]),
+    'segment_analysis': ('Segment', [
+        ('Customer ID', 'nunique'), ('Order ID', 'nunique'),
+        ('Sales', 'sum'), ('Profit', 'sum')]),
+    'yearly_perf': ('Order Year', [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique'),
+        ('Customer ID', 'nunique')]),
+    'shipping_analysis': ('Ship Mode', [
+        ('Order ID', 'count'), ('Shipping Days', 'mean'),
+        ('Sales', 'sum'), ('Profit', 'sum')]),
+    'discount_analysis': ('Discount Range', [
+        ('Order ID', 'count'), ('Sales', 'sum'), ('Sales', 'mean'),
+        ('Profit', 'sum'), ('Profit', 'mean'), ('Quantity', 'sum')]),
+    'monthly_data': ('Year-Month', [('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique')]),
+    'rfm': ('Customer ID', [('Order Date', 'max'), ('Order ID', 'nunique'), ('Sales', 'sum')]),
+}
+
+# Overall totals behind the section 3 KPIs, grouped by year only to keep the
+# partial state small; the distinct order/customer/product counts are merged
+# across years. Customer names are kept as (ID, name) pairs for RFM.
+KPI_SPEC = ('Order Year', [
+    ('Sales', 'sum'), ('Profit', 'sum'), ('Quantity', 'sum'),
+    ('Profit Margin', 'sum'), ('Profit Margin', 'count'),
+    ('Order ID', 'nunique'), ('Customer ID', 'nunique'), ('Product ID', 'nunique')])
+CUSTOMER_NAMES_SPEC = (['Customer ID', 'Customer Name'], [])
+
+# Row-level statistics: the section 12 correlation matrix and the profit
+# margin distribution of chart 5, binned on fixed edges (5 points wide) so
+# chunk histograms add up
+CORRELATION_COLUMNS = ['Sales', 'Quantity', 'Discount', 'Profit', 'Shipping Days', 'Profit Margin']
+MARGIN_EDGES = np.linspace(-300, 100, 81)
+
+# Grouping keys whose distinct counts are never approximated
+EXACT_DISTINCT_KEYS = {'Customer ID', 'Product ID', 'Product Name'}
+
+
+# Every grouped aggregation the in-memory report needs, keyed by the table
+# or chart it feeds. The AggregationEngine computes each distinct grouping
+# key once for all of the entries that share it.
+REPORT_AGGREGATIONS = {
+    'order_totals': ('Order ID', [('Sales', 'sum')]),
+    **TABLE_SPECS,
+    'region_sales': ('Region', [('Sales', 'sum')]),
+    'category_sales': ('Category', [('Sales', 'sum')]),
+    'subcat_sales': ('Sub-Category', [('Sales', 'sum')]),
+    'subcat_profit': ('Sub-Category', [('Profit', 'sum')]),
+    'subcat_loss': ('Sub-Category', [('Profit', 'sum')]),
+    'top_subcats': ('Sub-Category', [('Sales', 'sum')]),
+    'segment_data': ('Segment', [('Sales', 'sum'), ('Profit', 'sum')]),
+    'customer_sales': (['Customer ID', 'Customer Name'], [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique')]),
+    'customer_frequency': ('Customer ID', [('Order ID', 'nunique')]),
+    'yearly_sales': ('Order Year', [('Sales', 'sum')]),
+    'monthly_trend': ('Year-Month', [('Sales', 'sum'), ('Profit', 'sum')]),
+    'quarterly_perf': (['Order Year', 'Order Quarter'], [('Sales', 'sum'), ('Profit', 'sum')]),
+    'top_products_sales': ('Product Name', [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Quantity', 'sum'), ('Order ID', 'nunique')]),
+    'top_products_profit': ('Product Name', [('Sales', 'sum'), ('Profit', 'sum'), ('Quantity', 'sum')]),
+    'loss_products': ('Product Name', [
+        ('Sales', 'sum'), ('Profit', 'sum'), ('Order ID', 'nunique'), ('Discount', 'mean')]),
+    'product_matrix': ('Product Name', [('Sales', 'sum'), ('Profit', 'sum'), ('Quantity', 'sum')]),
+    'region_shipping': (['Region', 'Ship Mode'], [('Shipping Days', 'mean')]),
+    'sales_heatmap': (['Region', 'Category'], [('Sales', 'sum')]),
+}
+
+
+def _keys(by):
+    return [by] if isinstance(by, str) else list(by)
+
+
+def _approx_for(by, approx_error):
+    """The sketch error to use for 'nunique' metrics grouped by ``by``."""
+    return None if EXACT_DISTINCT_KEYS.intersection(_keys(by)) else approx_error
+
+
+def count_distinct(values, approx_error=None):
+    """Number of distinct non-null values, estimated when ``approx_error`` is set."""
+    if approx_error:
+        return HyperLogLog(approx_error).update(values).estimate()
+    return values.nunique()
+
+
+def aggregate(df, by, metrics):
+    """Group ``df`` by ``by`` and compute ``metrics`` in memory.
+
+    Columns of the result are the metric tuples, in spec order.
+    """
+    named = {f'm{i}': metric for i, metric in enumerate(metrics)}
+    base = df.groupby(by, observed=True).agg(**named)
+    base.columns = pd.MultiIndex.from_tuples(metrics)
+    return base
+
+
+def _concat(frames, columns):
+    """Concatenate frames row-wise. Categorical ``columns`` whose categories
+    differ between frames are recoded to the sorted union first; a plain
+    concat would turn them into strings. Other columns are left to the plain
+    concat, which is much cheaper for long ID columns that are only counted."""
+    frames = list(frames)
+    for column in columns:
+        dtypes = [frame[column].dtype for frame in frames]
+        if isinstance(dtypes[0], pd.CategoricalDtype) and any(dtype != dtypes[0] for dtype in dtypes):
+            categories = dtypes[0].categories.append([dtype.categories for dtype in dtypes[1:]])
+            dtype = pd.CategoricalDtype(categories.unique().sort_values())
+            frames = [frame.assign(**{column: frame[column].astype(dtype)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _drop_duplicates(frame):
+    """``frame.drop_duplicates()``, comparing period columns by their integer
+    ordinals; hashing Period objects is many times slower."""
+    view = pd.DataFrame({i: frame[column].array.asi8 if isinstance(frame[column].dtype, pd.PeriodDtype)
+                         else frame[column] for i, column in enumerate(frame.columns)}, index=frame.index)
+    return frame[~view.duplicated()]
+
+
+class AggregationEngine:
+    """Shared group-by pass for a set of named aggregations.
+
+    Requests that group by the same key are merged into one ``groupby().agg``
+    call over the union of their metrics, so each distinct key costs a
+    single pass over the rows however many tables and charts use it. With
+    ``approx_error`` set, keys with 'nunique' metrics are computed through a
+    PartialAggregate so the distinct counts come from sketches.
+
+    ``bind`` attaches the frame without scanning it; each key is then
+    computed the first time one of its requests is read, so a partial report
+    only pays for the keys it uses. ``run`` computes every key up front.
+
+    With a ``cube_factory`` (returning an ``olap_cube.SalesCube`` of the
+    same frame), keys that ``cube_answers(by, metrics)`` accepts are rolled
+    up from the cube's cells instead of scanning rows. The factory is called
+    on the first such key, so runs that never roll up never build the cube;
+    ``rolled`` counts the keys answered by it.
+    """
+
+    def __init__(self, requests=None, approx_error=None, cube_factory=None, cube_answers=None):
+        self.requests = {}
+        self.results = {}
+        self.plan = {}
+        self.df = None
+        self.approx_error = approx_error
+        self.cube_factory = cube_factory
+        self.cube_answers = cube_answers
+        self.cube = None
+        self.rolled = 0
+        for name, (by, metrics) in (requests or {}).items():
+            self.request(name, by, metrics)
+
+    def request(self, name, by, metrics):
+        self.requests[name] = (by, list(metrics))
+
+    def bind(self, df):
+        """Plan one pass per distinct key over ``df``; returns ``(requests, passes)``."""
+        self.df, self.results, self.plan, self.rolled = df, {}, {}, 0
+        for by, metrics in self.requests.values():
+            union = self.plan.setdefault(tuple(_keys(by)), [])
+            union.extend(metric for metric in metrics if metric not in union)
+        return len(self.requests), len(self.plan)
+
+    def run(self, df):
+        """Compute every requested key once; returns ``(requests, passes)``."""
+        requested, passes = self.bind(df)
+        for key in self.plan:
+            self._compute(key)
+        return requested, passes
+
+    def _compute(self, key):
+        if key not in self.results:
+            metrics = self.plan[key]
+            by = list(key) if len(key) > 1 else key[0]
+            approx_error = _approx_for(by, self.approx_error)
+            if approx_error and any(func == 'nunique' for _, func in metrics):
+                self.results[key] = PartialAggregate(by, metrics, approx_error).update(self.df).result()
+            elif self.cube_factory is not None and self.cube_answers(by, metrics):
+                if self.cube is None:
+                    self.cube = self.cube_factory()
+                self.results[key] = self.cube.rollup(by, metrics)
+                self.rolled += 1
+            else:
+                self.results[key] = aggregate(self.df, by, metrics)
+        return self.results[key]
+
+    def get(self, name):
+        """Grouped metrics for a named request, laid out like ``aggregate``."""
+        by, metrics = self.requests[name]
+        return self._compute(tuple(_keys(by)))[metrics]
+
+    def series(self, name, column, func='sum'):
+        """One metric of a named request as a Series named after its column."""
+        return self.get(name)[(column, func)].rename(column)
+
+
+class PartialAggregate:
+    """Mergeable partial state for one grouped table.
+
+    'nunique' metrics are tracked as distinct (group, value) rows, or as
+    grouped HyperLogLog sketches when ``approx_error`` is given.
+    """
+
+    def __init__(self, by, metrics, approx_error=None):
+        self.by = by
+        self.metrics = list(metrics)
+        self.approx_error = approx_error
+        self.totals = None
+        self.distinct = {}
+        self.sketches = {}
+
+    def _components(self):
+        components = {}
+        for column, func in self.metrics:
+            if func in ('sum', 'mean'):
+                components[f'{column}|sum'] = (column, 'sum')
+            if func in ('count', 'mean'):
+                components[f'{column}|count'] = (column, 'count')
+            if func in ('min', 'max'):
+                components[f'{column}|{func}'] = (column, func)
+        return components
+
+    @staticmethod
+    def _reducer(component):
+        """How two partial values of a component combine."""
+        func = component.rsplit('|', 1)[-1]
+        return func if func in ('min', 'max') else 'sum'
+
+    def update(self, chunk):
+        """Fold a chunk of cleaned rows into the partial state."""
+        keys = _keys(self.by)
+        grouped = chunk.groupby(self.by, observed=True)
+        totals = grouped.size().to_frame('rows')
+        components = self._components()
+        if components:
+            totals = totals.join(grouped.agg(**components))
+        distinct, sketches = {}, {}
+        for column in self._distinct_columns():
+            if self.approx_error:
+                sketches[column] = GroupedHyperLogLog(self.approx_error).update(
+                    totals.index, grouped.ngroup().to_numpy(), chunk[column])
+            else:
+                distinct[column] = chunk[keys + [column]].drop_duplicates()
+        self._merge(totals, distinct, sketches)
+        return self
+
+    def merge(self, other):
+        """Fold another partial of the same spec into this one."""
+        self._merge(other.totals, other.distinct, other.sketches)
+        return self
+
+    @classmethod
+    def combine(cls, partials):
+        """Merge ``partials`` of one spec in a single step.
+
+        One concatenation and group-by covers all of them, where pairwise
+        merges would regroup the growing state once per partial.
+        """
+        partials = [partial for partial in partials if partial.totals is not None]
+        first = partials[0]
+        combined = cls(first.by, first.metrics, first.approx_error)
+        keys = _keys(first.by)
+        reducers = {component: cls._reducer(component) for component in first.totals.columns}
+        totals = _concat([partial.totals.reset_index() for partial in partials], keys)
+        combined.totals = totals.groupby(keys, observed=True).agg(reducers)
+        for column in first.distinct:
+            rows = _drop_duplicates(_concat([partial.distinct[column] for partial in partials], keys))
+            combined.distinct[column] = rows.reset_index(drop=True)
+        for column, sketch in first.sketches.items():
+            merged = GroupedHyperLogLog(precision=sketch.precision)
+            for partial in partials:
+                merged.merge(partial.sketches[column])
+            combined.sketches[column] = merged
+        return combined
+
+    def _distinct_columns(self):
+        return list(dict.fromkeys(column for column, func in self.metrics if func == 'nunique'))
+
+    def _merge(self, totals, distinct, sketches):
+        if totals is None:
+            return
+        if self.totals is None:
+            self.totals = totals
+        else:
+            reducers = {component: self._reducer(component) for component in totals.columns}
+            self.totals = (pd.concat([self.totals, totals])
+                           .groupby(level=_keys(self.by), observed=True).agg(reducers))
+        for column, rows in distinct.items():
+            if column in self.distinct:
+                rows = pd.concat([self.distinct[column], rows], ignore_index=True).drop_duplicates()
+            self.distinct[column] = rows.reset_index(drop=True)
+        for column, sketch in sketches.items():
+            if column in self.sketches:
+                sketch = self.sketches[column].merge(sketch)
+            self.sketches[column] = sketch
+
+    def result(self):
+        """Final metrics per group, laid out like ``aggregate``."""
+        keys = _keys(self.by)
+        totals = self.totals.sort_index()
+        base = pd.DataFrame(index=totals.index)
+        for i, (column, func) in enumerate(self.metrics):
+            if func == 'sum':
+                values = totals[f'{column}|sum']
+            elif func == 'count':
+                values = totals[f'{column}|count']
+            elif func == 'mean':
+                values = totals[f'{column}|sum'] / totals[f'{column}|count']
+            elif func in ('min', 'max'):
+                values = totals[f'{column}|{func}']
+            elif func == 'nunique' and self.approx_error:
+                values = self.sketches[column].estimates().reindex(totals.index, fill_value=0)
+            elif func == 'nunique':
+                counts = self.distinct[column].dropna().groupby(keys, observed=True).size()
+                values = counts.reindex(totals.index, fill_value=0)
+            else:
+                raise ValueError(f"Metric '{func}' cannot be merged across chunks")
+            base[i] = values
+        base.columns = pd.MultiIndex.from_tuples(self.metrics)
+        return base
+
+    def distinct_total(self, column):
+        """Distinct values of a 'nunique' column over all groups combined."""
+        if self.approx_error:
+            return self.sketches[column].total()
+        return self.distinct[column][column].nunique()
+
+    def save(self, path):
+        """Write the partial state to the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        save_frame(self.totals.reset_index(), os.path.join(path, 'totals'))
+        for i, column in enumerate(self._distinct_columns()):
+            if self.approx_error:
+                sketch = self.sketches[column]
+                np.save(os.path.join(path, f'sketch{i}.npy'), sketch.registers)
+                save_frame(sketch.labels.to_frame(index=False), os.path.join(path, f'sketch{i}_labels'))
+            else:
+                save_frame(self.distinct[column], os.path.join(path, f'distinct{i}'))
+
+    @classmethod
+    def load(cls, path, by, metrics, approx_error=None):
+        """Read partial state written by ``save`` for the same spec."""
+        partial = cls(by, metrics, approx_error)
+        partial.totals = load_frame(os.path.join(path, 'totals'), mmap=False).set_index(_keys(by))
+        for i, column in enumerate(partial._distinct_columns()):
+            if approx_error:
+                sketch = GroupedHyperLogLog(approx_error)
+                sketch.registers = np.load(os.path.join(path, f'sketch{i}.npy'))
+                labels = load_frame(os.path.join(path, f'sketch{i}_labels'), mmap=False)
+                sketch.labels = pd.MultiIndex.from_frame(labels) if labels.shape[1] > 1 else pd.Index(labels.iloc[:, 0])
+                partial.sketches[column] = sketch
+            else:
+                partial.distinct[column] = load_frame(os.path.join(path, f'distinct{i}'), mmap=False)
+        return partial
+
+
+class ReportStatistics:
+    """Mergeable row-level statistics: co-moments of the CORRELATION_COLUMNS
+    and the profit margin histogram and quantile sketch."""
+
+    def __init__(self, relative_error=None):
+        self.moments = CoMoments(CORRELATION_COLUMNS)
+        self.margins = Histogram(MARGIN_EDGES)
+        self.margin_quantiles = QuantileSketch(*[relative_error] if relative_error else [])
+
+    def update(self, chunk):
+        """Fold a chunk of cleaned rows into the statistics."""
+        self.moments.update(chunk)
+        self.margins.update(chunk['Profit Margin'])
+        self.margin_quantiles.update(chunk['Profit Margin'])
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.margins.merge(other.margins)
+        self.margin_quantiles.merge(other.margin_quantiles)
+        return self
+
+    def correlation(self):
+        """The section 12 correlation matrix."""
+        return self.moments.corr().round(3)
+
+    def margin_summary(self):
+        """Mean, estimated median and histogram of the profit margin."""
+        return {'mean': self.moments.means[CORRELATION_COLUMNS.index('Profit Margin')],
+                'median': self.margin_quantiles.quantile(0.5),
+                'counts': self.margins.counts, 'edges': self.margins.edges,
+                'outside': self.margins.below + self.margins.above}
+
+
+def report_spec(name):
+    """The (key, metrics) spec behind a ``report_partials`` entry."""
+    if name == 'kpis':
+        return KPI_SPEC
+    if name == 'customer_names':
+        return CUSTOMER_NAMES_SPEC
+    return TABLE_SPECS[name]
+
+
+def report_partials(tables, approx_error=None):
+    """Empty partial aggregates for the KPIs and the named TABLE_SPECS tables."""
+    partials = {'kpis': PartialAggregate(*KPI_SPEC, approx_error=approx_error)}
+    for name in tables:
+        by, metrics = TABLE_SPECS[name]
+        partials[name] = PartialAggregate(by, metrics, _approx_for(by, approx_error))
+    if 'rfm' in tables:
+        partials['customer_names'] = PartialAggregate(*CUSTOMER_NAMES_SPEC)
+    return partials
+
+
+def report_from_partials(partials):
+    """KPIs and finished report tables from merged ``report_partials``.
+
+    Returns ``(kpis, tables)``; ``tables`` holds every TABLE_SPECS table
+    present in ``partials``, in TABLE_SPECS order.
+    """
+    kpis = kpis_from_partials(partials)
+    total_sales = kpis['total_sales']
+    finishers = {
+        'region_analysis': lambda base: region_table(base, total_sales),
+        'category_analysis': lambda base: category_table(base, total_sales),
+        'segment_analysis': segment_table,
+        'yearly_perf': yearly_table,
+        'shipping_analysis': lambda base: shipping_table(base, kpis['total_rows']),
+        'discount_analysis': discount_table,
+        'monthly_data': monthly_table,
+        'rfm': lambda base: rfm_table(
+            base, customer_names(partials['customer_names'].totals.index.to_frame(index=False)))[0],
+    }
+    tables = {name: finishers[name](partials[name].result())
+              for name in TABLE_SPECS if name in partials}
+    return kpis, tables
+
+
+def distinct_count_report(df, approx_error, requests=None):
+    """Exact vs sketched distinct counts for every approximated 'nunique'.
+
+    One row per (grouping, column) with the summed counts, the worst and
+    mean per-group relative error, and the memory of the sketches against
+    the distinct (group, value) rows an exact count keeps.
+    """
+    requests = REPORT_AGGREGATIONS if requests is None else requests
+    specs = {'kpis': KPI_SPEC, **requests}
+    rows, seen = [], set()
+    for name, (by, metrics) in specs.items():
+        keys = tuple(_keys(by))
+        columns = [column for column, func in metrics if func == 'nunique']
+        if not columns or not _approx_for(by, approx_error) or keys in seen:
+            continue
+        seen.add(keys)
+        grouping = 'Overall' if name == 'kpis' else ' x '.join(keys)
+        exact = PartialAggregate(by, [(c, 'nunique') for c in columns]).update(df)
+        approx = PartialAggregate(by, [(c, 'nunique') for c in columns], approx_error).update(df)
+        exact_counts, approx_counts = exact.result(), approx.result()
+        for column in columns:
+            if name == 'kpis':
+                true = pd.Series([exact.distinct_total(column)])
+                estimate = pd.Series([approx.distinct_total(column)])
+            else:
+                true = exact_counts[(column, 'nunique')]
+                estimate = approx_counts[(column, 'nunique')]
+            error = ((estimate - true).abs() / true).replace(np.inf, np.nan) * 100
+            rows.append({
+                'Grouping': grouping, 'Column': column, 'Groups': len(true),
+                'Exact': int(true.sum()), 'Estimated': int(estimate.sum()),
+                'Max Error %': round(error.max(), 2), 'Mean Error %': round(error.mean(), 2),
+                'Sketch KB': round(approx.sketches[column].nbytes / 1024, 1),
+                'Exact Set KB': round(exact.distinct[column].memory_usage(deep=True).sum() / 1024, 1),
+            })
+    return pd.DataFrame(rows)
+
+
+# ==========================================
+# REPORT TABLE FINISHERS
+# ==========================================
+# Each finisher turns the grouped metrics of a TABLE_SPECS entry into the
+# report table printed and exported by sales_analysis.py.
+
+def region_table(base, total_sales):
+    table = base.round(2)
+    table.columns = ['Total Sales', 'Total Profit', 'Total Orders',
+                     'Total Customers', 'Quantity Sold']
+    table['Profit Margin %'] = ((table['Total Profit'] / table['Total Sales']) * 100).round(2)
+    table['Avg Order Value'] = (table['Total Sales'] / table['Total Orders']).round(2)
+    table = table.sort_values('Total Sales', ascending=False)
+    table['% of Total Sales'] = ((table['Total Sales'] / total_sales) * 100).round(2)
+    return table
+
+
+def category_table(base, total_sales):
+    table = base.round(2)
+    table.columns = ['Total Sales', 'Total Profit', 'Total Orders',
+                     'Quantity Sold', 'Avg Discount']
+    table['Profit Margin %'] = ((table['Total Profit'] / table['Total Sales']) * 100).round(2)
+    table['% of Sales'] = ((table['Total Sales'] / total_sales) * 100).round(2)
+    return table.sort_values('Total Sales', ascending=False)
+
+
+def segment_table(base):
+    table = base.round(2)
+    table.columns = ['Total Customers', 'Total Orders', 'Total Sales', 'Total Profit']
+    table['Avg Order Value'] = (table['Total Sales'] / table['Total Orders']).round(2)
+    table['Orders per Customer'] = (table['Total Orders'] / table['Total Customers']).round(2)
+    table['Profit Margin %'] = ((table['Total Profit'] / table['Total Sales']) * 100).round(2)
+    return table.sort_values('Total Sales', ascending=False)
+
+
+def yearly_table(base):
+    table = base.round(2)
+    table.columns = ['Sales', 'Profit', 'Orders', 'Customers']
+    table['Profit Margin %'] = ((table['Profit'] / table['Sales']) * 100).round(2)
+    table['Sales Growth %'] = table['Sales'].pct_change() * 100
+    table['Profit Growth %'] = table['Profit'].pct_change() * 100
+    return table
+
+
+def shipping_table(base, total_rows):
+    table = base.round(2)
+    table.columns = ['Total Shipments', 'Avg Shipping Days', 'Total Sales', 'Total Profit']
+    table['% of Orders'] = ((table['Total Shipments'] / total_rows) * 100).round(2)
+    return table.sort_values('Total Sales', ascending=False)
+
+
+def discount_table(base):
+    table = base.round(2)
+    table.columns = ['Orders', 'Total Sales', 'Avg Sales',
+                     'Total Profit', 'Avg Profit', 'Quantity']
+    table['Profit Margin %'] = ((table['Total Profit'] / table['Total Sales']) * 100).round(2)
+    return table
+
+
+def monthly_table(base):
+    table = base.round(2)
+    table.columns = ['Sales', 'Profit', 'Orders']
+    return table
+
+
+def customer_sales_table(base):
+    table = base.round(2)
+    table.columns = ['Total Sales', 'Total Profit', 'Number of Orders']
+    return top_k(table, 20, 'Total Sales')
+
+
+def product_sales_table(base):
+    table = base.round(2)
+    table.columns = ['Sales', 'Profit', 'Quantity', 'Times Ordered']
+    return top_k(table, 15, 'Sales')
+
+
+def product_profit_table(base):
+    table = base.round(2)
+    table.columns = ['Sales', 'Profit', 'Quantity']
+    table['Profit Margin %'] = ((table['Profit'] / table['Sales']) * 100).round(2)
+    return top_k(table, 15, 'Profit')
+
+
+def loss_products_table(base):
+    table = base.round(2)
+    table.columns = ['Sales', 'Profit', 'Times Ordered', 'Avg Discount']
+    return top_k(table[table['Profit'] < 0], 10, 'Profit', ascending=True)
+
+
+# Ranked REPORT_AGGREGATIONS tables: the summed column they are ranked on,
+# the rows kept, the direction and the finisher. Ranking a sum lets the
+# streaming path narrow the groups down with TopKCandidates.
+RANKINGS = {
+    'top_products_sales': ('Sales', 15, False, product_sales_table),
+    'top_products_profit': ('Profit', 15, False, product_profit_table),
+    'loss_products': ('Profit', 10, True, loss_products_table),
+    'customer_sales': ('Sales', 20, False, customer_sales_table),
+}
+
+
+def kpis_from_partials(partials):
+    """Section 3 KPIs from the 'kpis' partial aggregate."""
+    kpis = partials['kpis']
+    totals = kpis.totals
+    total_sales = totals['Sales|sum'].sum()
+    total_orders = kpis.distinct_total('Order ID')
+    return {
+        'total_sales': total_sales,
+        'total_profit': totals['Profit|sum'].sum(),
+        'total_orders': total_orders,
+        'total_customers': kpis.distinct_total('Customer ID'),
+        'unique_products': kpis.distinct_total('Product ID'),
+        'avg_profit_margin': totals['Profit Margin|sum'].sum() / totals['Profit Margin|count'].sum(),
+        'avg_order_value': total_sales / total_orders,
+        'total_quantity': totals['Quantity|sum'].sum(),
+        'total_rows': totals['rows'].sum(),
+    }
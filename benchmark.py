@@ -0,0 +1,478 @@
+"""
+REPORT BENCHMARK
+================
+Times every section of sales_analysis.py on a synthetic Superstore dataset
+of a chosen size and records how long each took and how much memory it
+allocated.
+
+Each run builds a fresh InstrumentedPipeline (see instrumentation.py) on
+the dataset. The cleaned-data and chart caches are off, and the run happens
+in a scratch directory, so the workbook and charts it writes do not touch
+the project. Per section it records the wall time and the peak Python heap
+above what the section started with. Tracing the heap slows pandas down
+several times over, so the times come from untraced runs and the heap from
+one extra, traced run (``--no-memory`` skips it). The peak resident set
+size of the timed runs is recorded too. With ``--repeat`` the median time
+of the runs is kept.
+
+The results are saved as JSON. Comparing them with a baseline file flags
+every section that got slower or bigger by more than ``--tolerance``; the
+exit status is 1 if any did.
+
+    python benchmark.py --rows 1m --output bench_1m.json
+    python benchmark.py --rows 1m --baseline bench_1m.json --tolerance 0.15
+
+``--dates`` benchmarks only the date stage of cleaning instead: it compares
+per-row parsing and ``.dt`` accessors with ``superstore_data.add_date_columns``
+(one parse per distinct date, plus a calendar lookup table) on the dataset's
+date columns, and checks that both give the same columns.
+
+    python benchmark.py --rows 10m --dates
+
+``--statistics`` checks the mergeable statistics (see sketches.py) against
+the exact ones: the correlation matrix and profit margin mean from
+co-moments, the median from a quantile sketch and the RFM quartile edges from
+per-measure sketches. Each is built on ``--shards`` slices of the data and
+merged, and the table lists their error, size and time.
+
+    python benchmark.py --rows 1m --statistics --shards 8
+
+``--scaling`` runs the map-reduce mode (see parallel.py) with 1, 2, 4, 8
+and 16 workers and reports the speed-up and parallel efficiency (speed-up
+divided by workers) against one worker, checking that every worker count
+gives the same KPIs.
+
+    python benchmark.py --rows 1m --scaling --split rows
+
+``--windows`` answers ``--queries`` random date windows per region and
+category twice: with a date mask and a group-by over the rows, and from
+the prefix sums of the daily time buckets (see time_buckets.py). It checks
+that both give the same sums.
+
+    python benchmark.py --rows 1m --windows --queries 200
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from aggregates import CORRELATION_COLUMNS, TABLE_SPECS, ReportStatistics, aggregate
+from instrumentation import InstrumentedPipeline
+from parallel import SPLITS, parallel_report
+from rfm import RFM_COLUMNS, RFM_QUANTILES, RFMScorer, rfm_measures
+from sketches import QuantileSketch
+from superstore_data import DATE_FORMAT, add_date_columns, clean_superstore, load_superstore
+from synthetic_data import DEFAULT_SEED, SCALES, generate_superstore, parse_rows
+from time_buckets import BUCKET_DIMENSIONS, BUCKET_MEASURES, TimeBuckets
+
+BENCHMARK_DATA_DIR = 'benchmark_data'
+RESULTS_VERSION = 1
+DEFAULT_TOLERANCE = 0.10
+DEFAULT_SHARDS = 8
+SCALING_WORKERS = [1, 2, 4, 8, 16]
+DEFAULT_QUERIES = 200
+# Changes smaller than these are noise, whatever the relative change
+MIN_SECONDS_CHANGE = 0.05
+MIN_MB_CHANGE = 1.0
+
+
+def dataset_path(rows, seed=DEFAULT_SEED, data_dir=BENCHMARK_DATA_DIR):
+    """Generated CSV for ``rows`` and ``seed``, reused across benchmark runs."""
+    return os.path.join(data_dir, f'superstore_{rows}_seed{seed}.csv')
+
+
+def ensure_dataset(rows, seed=DEFAULT_SEED, data_dir=BENCHMARK_DATA_DIR):
+    """Path of the synthetic dataset, generating it first if needed.
+
+    Returns ``(path, generation_info or None)``.
+    """
+    path = dataset_path(rows, seed, data_dir)
+    if os.path.exists(path):
+        return path, None
+    os.makedirs(data_dir, exist_ok=True)
+    partial = path + '.partial'
+    info = generate_superstore(partial, rows, seed=seed)
+    os.replace(partial, path)
+    return path, info
+
+
+def run_report(input_path, targets=None, report_args=(), trace_memory=False):
+    """One silent report run over ``input_path``; returns its section metrics by name."""
+    # Imported here so that importing benchmark.py stays cheap
+    from sales_analysis import SECTIONS, build_parser
+
+    input_path = os.path.abspath(input_path)
+    options = build_parser().parse_args(['--input', input_path, '--no-cache', '--no-chart-cache',
+                                         *report_args])
+    scratch = tempfile.mkdtemp(prefix='benchmark_')
+    cwd = os.getcwd()
+    try:
+        os.chdir(scratch)
+        pipeline = InstrumentedPipeline(SECTIONS, options, trace_memory=trace_memory)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            pipeline.run(targets)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {metric['section']: metric for metric in pipeline.metrics}
+
+
+def benchmark(input_path, repeat=1, targets=None, report_args=(), trace_memory=True):
+    """Time the report ``repeat`` times, then trace its heap once.
+
+    Returns the results dict saved as JSON; without ``trace_memory`` the
+    heap figures are None.
+    """
+    runs = [run_report(input_path, targets, report_args) for _ in range(repeat)]
+    max_rss = max(metric['rss_peak_mb'] or 0 for run in runs for metric in run.values())
+    memory = run_report(input_path, targets, report_args, trace_memory=True) if trace_memory else {}
+    sections = {}
+    for name in runs[0]:
+        samples = [run[name]['wall_seconds'] for run in runs]
+        traced = memory.get(name, {})
+        sections[name] = {
+            'seconds': round(statistics.median(samples), 4),
+            'peak_mb': traced.get('heap_peak_mb'),
+            'retained_mb': traced.get('heap_net_mb'),
+            'samples': [round(sample, 4) for sample in samples],
+        }
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'pandas': pd.__version__, 'numpy': np.__version__},
+        'dataset': {'path': input_path, 'bytes': os.path.getsize(input_path)},
+        'report_args': list(report_args),
+        'repeat': repeat,
+        'sections': sections,
+        'total_seconds': round(sum(section['seconds'] for section in sections.values()), 4),
+        'max_rss_mb': round(max_rss, 1),
+    }
+
+
+def rowwise_date_columns(df):
+    """The date stage as cleaning did it before ``add_date_columns``: every row
+    parsed and every calendar column derived row by row."""
+    df['Order Date'] = pd.to_datetime(df['Order Date'], format=DATE_FORMAT)
+    df['Ship Date'] = pd.to_datetime(df['Ship Date'], format=DATE_FORMAT)
+    df['Order Year'] = df['Order Date'].dt.year
+    df['Order Month'] = df['Order Date'].dt.month
+    df['Order Month Name'] = df['Order Date'].dt.strftime('%b')
+    df['Order Quarter'] = df['Order Date'].dt.quarter
+    df['Shipping Days'] = (df['Ship Date'] - df['Order Date']).dt.days
+    df['Year-Month'] = df['Order Date'].dt.to_period('M')
+    df['Year-Quarter'] = df['Order Date'].dt.to_period('Q')
+    return df
+
+
+def date_benchmark(input_path, repeat=1):
+    """Time the row-wise and memoized date stages on the date columns of ``input_path``.
+
+    Returns the results dict saved as JSON.
+    """
+    dates = load_superstore(input_path, columns=['Order Date', 'Ship Date'])
+    timings, frames = {}, {}
+    for name, stage in (('rowwise', rowwise_date_columns), ('memoized', add_date_columns)):
+        samples = []
+        for _ in range(repeat):
+            frame = dates.copy()
+            start = time.perf_counter()
+            frames[name] = stage(frame)
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples)
+    pd.testing.assert_frame_equal(frames['rowwise'], frames['memoized'])
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'dataset': {'path': input_path, 'rows': len(dates),
+                    'order_dates': int(dates['Order Date'].nunique()),
+                    'ship_dates': int(dates['Ship Date'].nunique())},
+        'repeat': repeat,
+        'rowwise_seconds': round(timings['rowwise'], 4),
+        'memoized_seconds': round(timings['memoized'], 4),
+        'speedup': round(timings['rowwise'] / timings['memoized'], 1),
+    }
+
+
+def statistics_benchmark(input_path, shards=DEFAULT_SHARDS):
+    """Exact row-level statistics against sketches merged from ``shards`` slices.
+
+    Returns a frame with one row per statistic: the exact and merged values
+    (the worst one for several), the relative or absolute error, and the
+    seconds each took.
+    """
+    df = clean_superstore(load_superstore(input_path), verbose=False)
+    start = time.perf_counter()
+    exact_corr = df[CORRELATION_COLUMNS].corr()
+    margin_mean, margin_median = df['Profit Margin'].mean(), df['Profit Margin'].median()
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged = ReportStatistics()
+    for rows in np.array_split(np.arange(len(df)), shards):
+        merged.merge(ReportStatistics().update(df.iloc[rows]))
+    margins = merged.margin_summary()
+    sketch_seconds = time.perf_counter() - start
+
+    measures, reference_date = rfm_measures(aggregate(df, 'Customer ID', TABLE_SPECS['rfm'][1]))
+    start = time.perf_counter()
+    exact_edges = {column: np.quantile(measures[column].to_numpy(dtype=float), RFM_QUANTILES)
+                   for column in RFM_COLUMNS}
+    rfm_exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    sketches = {column: QuantileSketch() for column in RFM_COLUMNS}
+    for rows in np.array_split(np.arange(len(measures)), shards):
+        for column, sketch in sketches.items():
+            sketch.merge(QuantileSketch().update(measures[column].iloc[rows]))
+    sketched = RFMScorer.fit_sketches(sketches, reference_date, len(measures))
+    rfm_sketch_seconds = time.perf_counter() - start
+
+    corr_error = (merged.moments.corr() - exact_corr).abs().to_numpy().max()
+    edge_errors = {column: np.abs(sketched.edges[column] / exact_edges[column] - 1).max()
+                   for column in RFM_COLUMNS}
+    worst = max(edge_errors, key=edge_errors.get)
+    return pd.DataFrame([
+        {'Statistic': 'Correlation matrix', 'Method': 'co-moments', 'Error': f'{corr_error:.1e} (abs)',
+         'Sketch bytes': merged.moments.comoments.nbytes, 'Exact s': exact_seconds, 'Merged s': sketch_seconds},
+        {'Statistic': 'Profit margin mean', 'Method': 'co-moments',
+         'Error': f'{abs(margins["mean"] / margin_mean - 1):.1e}', 'Sketch bytes': None},
+        {'Statistic': 'Profit margin median', 'Method': 'quantile sketch',
+         'Error': f'{abs(margins["median"] / margin_median - 1):.2%}', 'Sketch bytes': merged.margin_quantiles.nbytes},
+        {'Statistic': f'RFM edges (worst: {worst})', 'Method': 'quantile sketch',
+         'Error': f'{edge_errors[worst]:.2%}', 'Sketch bytes': sum(sketch.nbytes for sketch in sketches.values()),
+         'Exact s': rfm_exact_seconds, 'Merged s': rfm_sketch_seconds},
+    ]).set_index('Statistic').round(4)
+
+
+def scaling_benchmark(input_path, split='rows', worker_counts=SCALING_WORKERS, repeat=1):
+    """Time ``parallel_report`` on ``input_path`` for each worker count.
+
+    Returns a frame with one row per count: the median wall time, the map
+    and merge times of the last run, and the speed-up and efficiency
+    against the first count.
+    """
+    rows, reference = [], None
+    with tempfile.TemporaryDirectory(prefix='superstore-scaling-') as cache_dir:
+        for workers in worker_counts:
+            samples = []
+            for _ in range(repeat):
+                kpis, _, stats = parallel_report(input_path, split, workers, cache_dir=cache_dir)
+                samples.append(stats['wall_seconds'])
+            reference = reference or kpis
+            if any(not np.isclose(kpis[name], reference[name], rtol=1e-12) for name in kpis):
+                raise AssertionError(f"{workers} workers gave different KPIs than {worker_counts[0]}")
+            rows.append({'Workers': workers, 'Pieces': stats['pieces'], 'Seconds': statistics.median(samples),
+                         'Map s': stats['map_seconds'], 'Merge s': stats['reduce_seconds']})
+    table = pd.DataFrame(rows).set_index('Workers')
+    table['Speed-up'] = table['Seconds'].iloc[0] / table['Seconds']
+    table['Efficiency %'] = 100 * table['Speed-up'] * table.index[0] / table.index
+    return table.round(2)
+
+
+def window_benchmark(input_path, queries=DEFAULT_QUERIES, seed=DEFAULT_SEED):
+    """Random date windows per region and category from the rows and from the
+    time buckets.
+
+    Returns a frame with one row per method: the setup seconds (building the
+    buckets), the query seconds in total and per query, and the largest
+    difference from the row sums.
+    """
+    df = clean_superstore(load_superstore(input_path), verbose=False)
+    start = time.perf_counter()
+    buckets = TimeBuckets.build(df)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    first, days = buckets.dates[0], buckets.days
+    windows = []
+    for _ in range(queries):
+        a, b = sorted(rng.integers(0, days, 2))
+        windows.append((first + pd.Timedelta(days=int(a)), first + pd.Timedelta(days=int(b))))
+
+    start = time.perf_counter()
+    scanned = []
+    for window_start, window_end in windows:
+        rows = df[(df['Order Date'] >= window_start) & (df['Order Date'] <= window_end)]
+        scanned.append(rows.groupby(BUCKET_DIMENSIONS, observed=True)[BUCKET_MEASURES].sum())
+    scan_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    answered = [buckets.total(window_start, window_end) for window_start, window_end in windows]
+    bucket_seconds = time.perf_counter() - start
+
+    error = 0.0
+    for scan, answer in zip(scanned, answered):
+        scan = scan.set_axis(scan.index.map(lambda key: tuple(map(str, key))))
+        answer = answer.set_axis(answer.index.map(lambda key: tuple(map(str, key))))
+        error = max(error, float((scan.reindex(answer.index, fill_value=0) - answer).abs().to_numpy().max()))
+    return pd.DataFrame([
+        {'Method': 'date mask + group-by', 'Setup s': 0.0, 'Query s': scan_seconds,
+         'Per query ms': 1000 * scan_seconds / queries, 'Max abs diff': 0.0},
+        {'Method': 'time-bucket prefix sums', 'Setup s': build_seconds, 'Query s': bucket_seconds,
+         'Per query ms': 1000 * bucket_seconds / queries, 'Max abs diff': error},
+    ]).set_index('Method').round(6)
+
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Per-section change from ``baseline`` to ``current``.
+
+    A section regresses when its time or peak heap grew by more than
+    ``tolerance`` (a fraction) and by more than the noise floor
+    (MIN_SECONDS_CHANGE / MIN_MB_CHANGE); it improved when it shrank by as
+    much.
+    """
+    def change(new, old, floor):
+        if abs(new - old) <= floor or old == 0:
+            return 0
+        ratio = new / old - 1
+        return 1 if ratio > tolerance else -1 if ratio < -tolerance else 0
+
+    rows = []
+    for name, section in current['sections'].items():
+        old = baseline['sections'].get(name)
+        if old is None:
+            rows.append({'Section': name, 'Baseline s': None, 'Current s': section['seconds'], 'Time %': None,
+                         'Baseline MB': None, 'Current MB': section['peak_mb'], 'Memory %': None,
+                         'Status': 'new'})
+            continue
+        time_change = change(section['seconds'], old['seconds'], MIN_SECONDS_CHANGE)
+        memory_change = (change(section['peak_mb'], old['peak_mb'], MIN_MB_CHANGE)
+                         if section['peak_mb'] is not None and old['peak_mb'] is not None else 0)
+        status = ('regression' if max(time_change, memory_change) > 0
+                  else 'improved' if min(time_change, memory_change) < 0 else 'ok')
+        rows.append({
+            'Section': name,
+            'Baseline s': old['seconds'], 'Current s': section['seconds'],
+            'Time %': round(100 * (section['seconds'] / old['seconds'] - 1), 1) if old['seconds'] else None,
+            'Baseline MB': old['peak_mb'], 'Current MB': section['peak_mb'],
+            'Memory %': (round(100 * (section['peak_mb'] / old['peak_mb'] - 1), 1)
+                         if old['peak_mb'] and section['peak_mb'] is not None else None),
+            'Status': status,
+        })
+    return pd.DataFrame(rows).set_index('Section')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the report sections on synthetic data.')
+    parser.add_argument('--rows', type=parse_rows, default=SCALES['1m'],
+                        help=f"synthetic row count or one of {', '.join(SCALES)} (default: 1m)")
+    parser.add_argument('--input', help='benchmark this CSV instead of a generated one')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='generator seed (default: %(default)s)')
+    parser.add_argument('--data-dir', default=BENCHMARK_DATA_DIR,
+                        help='where generated datasets are kept (default: %(default)s)')
+    parser.add_argument('--only', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        help='comma-separated sections to benchmark (with their dependencies)')
+    parser.add_argument('--tables-only', action='store_true', help='skip the charts section')
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs to take the median of (default: %(default)s)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures the heap')
+    parser.add_argument('--dates', action='store_true',
+                        help='benchmark only the date-parsing stage, row-wise against memoized')
+    parser.add_argument('--statistics', action='store_true',
+                        help='check the mergeable correlation, median and RFM edge sketches against exact values')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS,
+                        help='slices the --statistics sketches are built on and merged from (default: %(default)s)')
+    parser.add_argument('--scaling', action='store_true',
+                        help='time the --parallel map-reduce mode with 1, 2, 4, 8 and 16 workers')
+    parser.add_argument('--split', choices=SPLITS, default='rows',
+                        help='how --scaling splits the input (default: %(default)s)')
+    parser.add_argument('--windows', action='store_true',
+                        help='compare date-window sums from the rows and from the time buckets')
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES,
+                        help='random windows for --windows (default: %(default)s)')
+    parser.add_argument('--output', help='results JSON (default: benchmark_<rows>_<timestamp>.json)')
+    parser.add_argument('--baseline', help='earlier results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative change flagged as a regression (default: %(default)s)')
+    options = parser.parse_args(argv)
+
+    pd.set_option('display.width', None)
+    if options.input:
+        path, generated = options.input, None
+    else:
+        path, generated = ensure_dataset(options.rows, options.seed, options.data_dir)
+        if generated:
+            print(f"✓ Generated {generated['rows']:,} synthetic rows in {generated['seconds']:.1f}s ('{path}')")
+
+    if options.dates:
+        print(f"Benchmarking the date stage on '{path}' ({options.repeat} run(s))...")
+        results = date_benchmark(path, options.repeat)
+        dataset = results['dataset']
+        print(f"  {dataset['rows']:,} rows, {dataset['order_dates']:,} distinct order dates, "
+              f"{dataset['ship_dates']:,} distinct ship dates")
+        print(f"  Row-wise: {results['rowwise_seconds']:.2f}s")
+        print(f"  Memoized: {results['memoized_seconds']:.2f}s ({results['speedup']}x faster, same columns)")
+        output = options.output or f"benchmark_dates_{datetime.now():%Y%m%d_%H%M%S}.json"
+        with open(output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"✓ Results saved to '{output}'")
+        return 0
+
+    if options.statistics:
+        print(f"Checking the mergeable statistics on '{path}' ({options.shards} shards)...")
+        print(statistics_benchmark(path, options.shards))
+        return 0
+
+    if options.scaling:
+        print(f"Scaling the map-reduce mode on '{path}' (split by {options.split}, "
+              f"{os.cpu_count()} CPU(s), {options.repeat} run(s) each)...")
+        print(scaling_benchmark(path, options.split, repeat=options.repeat))
+        return 0
+
+    if options.windows:
+        print(f"Answering {options.queries} random date windows per region and category on '{path}'...")
+        print(window_benchmark(path, options.queries, options.seed))
+        return 0
+
+    report_args = ['--tables-only'] if options.tables_only else []
+    targets = options.only
+    if options.tables_only:
+        from sales_analysis import PLOTTING_SECTIONS, build_pipeline
+        targets = [name for name in build_pipeline().plan(targets) if name not in PLOTTING_SECTIONS]
+
+    print(f"Benchmarking '{path}' ({options.repeat} run(s))...")
+    results = benchmark(path, options.repeat, targets, report_args, trace_memory=not options.no_memory)
+    results['dataset']['rows'] = options.rows if not options.input else None
+    results['dataset']['seed'] = options.seed if not options.input else None
+    if generated:
+        results['dataset']['generate_seconds'] = round(generated['seconds'], 2)
+
+    table = pd.DataFrame(results['sections']).T[['seconds', 'peak_mb', 'retained_mb']]
+    table.columns = ['Seconds', 'Peak Heap MB', 'Retained MB']
+    print(table)
+    print(f"Total: {results['total_seconds']:.2f}s, peak RSS {results['max_rss_mb']:,.0f} MB")
+
+    output = options.output or (f"benchmark_{options.rows if not options.input else 'input'}_"
+                                f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"✓ Results saved to '{output}'")
+
+    if not options.baseline:
+        return 0
+    with open(options.baseline) as handle:
+        baseline = json.load(handle)
+    if baseline.get('dataset', {}).get('rows') != results['dataset'].get('rows'):
+        print("  Note: the baseline was measured on a different dataset size")
+    comparison = compare_results(results, baseline, options.tolerance)
+    print(f"\nChange against '{options.baseline}' (tolerance {options.tolerance:.0%}):")
+    print(comparison)
+    regressions = comparison.index[comparison['Status'] == 'regression']
+    if len(regressions):
+        print(f"✗ Regressions in: {', '.join(regressions)}")
+        return 1
+    print("✓ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+REPORT CHARTS
+=============
+The eight section 14 figures, each drawn by a function that takes only the
+small pre-aggregated data it plots (a few dozen values at most), so the
+figures can be rendered concurrently in a process pool.
+
+Rendering at dpi=300 is CPU-bound and the charts are independent, so with
+enough workers the visualization phase takes about as long as the slowest
+chart instead of the sum of all eight. Workers start from the forkserver
+(or, where it is unavailable, spawn) context rather than a fork of the
+report process, which may hold BLAS or pyarrow threads whose locks a fork
+would copy mid-use; they only need this module and the small chart data.
+With a single worker the charts are rendered one after another in-process.
+
+Rendered charts are content-addressed: each PNG is recorded in a manifest
+under a hash of its input data, the renderer's source and the style
+settings, and a chart whose hash and file are unchanged is not re-rendered.
+
+matplotlib and seaborn are imported, and the style applied, only when a
+chart is actually rendered, so importing this module or a run where every
+chart is a cache hit never loads the plotting stack.
+"""
+
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+CHART_DIR = 'visualizations'
+CHART_STYLE = 'seaborn-v0_8-whitegrid'
+CHART_PALETTE = 'husl'
+CHART_DPI = 300
+DEFAULT_CHART_WORKERS = min(8, os.cpu_count() or 1)
+MANIFEST_FILE = '.chart_manifest.json'
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _plotting():
+    """Import the plotting stack on first use, with the headless Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+def apply_style():
+    """Set the report's matplotlib/seaborn style in the current process."""
+    plt, sns = _plotting()
+    plt.style.use(CHART_STYLE)
+    sns.set_palette(CHART_PALETTE)
+
+
+def _save(path):
+    plt, _ = _plotting()
+    plt.tight_layout()
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
+    plt.close()
+
+
+# ==========================================
+# CHART DATA
+# ==========================================
+
+def chart_data(engine, df):
+    """Pre-aggregated inputs for every chart, keyed by chart name.
+
+    Grouped series come from the shared aggregation pass; the profit margin
+    histogram is binned here so no chart needs the row-level frame.
+    """
+    monthly_trend = engine.get('monthly_trend')
+    monthly_trend.columns = ['Sales', 'Profit']
+    monthly_trend.index = monthly_trend.index.to_timestamp()
+    segment_data = engine.get('segment_data')
+    segment_data.columns = ['Sales', 'Profit']
+    margins = df['Profit Margin'].dropna().to_numpy()
+    counts, edges = np.histogram(margins, bins=50)
+    return {
+        'sales_by_region': engine.series('region_sales', 'Sales').sort_values(ascending=False),
+        'sales_by_category': engine.series('category_sales', 'Sales'),
+        'monthly_trend': monthly_trend,
+        'top_subcategories': engine.series('top_subcats', 'Sales').sort_values(ascending=True).tail(10),
+        'profit_margin_distribution': {
+            'counts': counts, 'edges': edges,
+            'mean': df['Profit Margin'].mean(), 'median': df['Profit Margin'].median()},
+        'sales_heatmap': engine.series('sales_heatmap', 'Sales').unstack('Category'),
+        'segment_performance': segment_data,
+        'yearly_growth': engine.series('yearly_sales', 'Sales') / 1000,
+    }
+
+
+# ==========================================
+# CHART RENDERERS
+# ==========================================
+
+def sales_by_region(region_sales, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(12, 6))
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
+    bars = plt.bar(region_sales.index, region_sales.values, color=colors, edgecolor='black', linewidth=1.5)
+    plt.title('Total Sales by Region', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Region', fontsize=14, fontweight='bold')
+    plt.ylabel('Sales ($)', fontsize=14, fontweight='bold')
+    plt.xticks(fontsize=12)
+    plt.yticks(fontsize=12)
+
+    # Add value labels on bars
+    for bar, value in zip(bars, region_sales.values):
+        plt.text(bar.get_x() + bar.get_width()/2, value + 20000,
+                 f'${value:,.0f}', ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+    plt.grid(axis='y', alpha=0.3, linestyle='--')
+    _save(path)
+
+
+def sales_by_category(category_sales, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(10, 8))
+    colors_pie = ['#FF6B6B', '#4ECDC4', '#95E1D3']
+    explode = (0.05, 0.05, 0.05)
+
+    wedges, texts, autotexts = plt.pie(category_sales.values, labels=category_sales.index,
+                                       autopct='%1.1f%%', startangle=90, colors=colors_pie,
+                                       explode=explode, shadow=True, textprops={'fontsize': 12})
+
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+        autotext.set_fontsize(13)
+
+    for text in texts:
+        text.set_fontsize(14)
+        text.set_fontweight('bold')
+
+    plt.title('Sales Distribution by Category', fontsize=18, fontweight='bold', pad=20)
+    _save(path)
+
+
+def monthly_trend(monthly_data, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(16, 6))
+    plt.plot(monthly_data.index, monthly_data['Sales']/1000,
+             marker='o', linewidth=2.5, markersize=6, label='Sales', color='#FF6B6B')
+    plt.plot(monthly_data.index, monthly_data['Profit']/1000,
+             marker='s', linewidth=2.5, markersize=6, label='Profit', color='#4ECDC4')
+
+    plt.title('Monthly Sales and Profit Trend', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Month', fontsize=14, fontweight='bold')
+    plt.ylabel('Amount (Thousands $)', fontsize=14, fontweight='bold')
+    plt.legend(fontsize=12, loc='upper left')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.xticks(rotation=45, fontsize=10)
+    plt.yticks(fontsize=11)
+    _save(path)
+
+
+def top_subcategories(top_subcats, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(12, 8))
+    colors_bar = plt.cm.viridis(np.linspace(0.3, 0.9, len(top_subcats)))
+
+    bars = plt.barh(range(len(top_subcats)), top_subcats.values, color=colors_bar, edgecolor='black', linewidth=1)
+    plt.yticks(range(len(top_subcats)), top_subcats.index, fontsize=11)
+    plt.title('Top 10 Sub-Categories by Sales', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Sales ($)', fontsize=14, fontweight='bold')
+    plt.ylabel('Sub-Category', fontsize=14, fontweight='bold')
+    plt.xticks(fontsize=11)
+
+    # Add value labels
+    for i, value in enumerate(top_subcats.values):
+        plt.text(value + 5000, i, f'${value:,.0f}', va='center', fontsize=10, fontweight='bold')
+
+    plt.grid(axis='x', alpha=0.3, linestyle='--')
+    _save(path)
+
+
+def profit_margin_distribution(histogram, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(12, 6))
+    edges = histogram['edges']
+    plt.hist(edges[:-1], bins=edges, weights=histogram['counts'],
+             color='#4ECDC4', edgecolor='black', linewidth=0.5, alpha=0.7)
+    plt.axvline(histogram['mean'], color='red', linestyle='--', linewidth=2.5,
+                label=f"Mean: {histogram['mean']:.1f}%")
+    plt.axvline(histogram['median'], color='green', linestyle='--', linewidth=2.5,
+                label=f"Median: {histogram['median']:.1f}%")
+
+    plt.title('Profit Margin Distribution', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Profit Margin (%)', fontsize=14, fontweight='bold')
+    plt.ylabel('Frequency', fontsize=14, fontweight='bold')
+    plt.legend(fontsize=12)
+    plt.grid(axis='y', alpha=0.3, linestyle='--')
+    plt.xticks(fontsize=11)
+    plt.yticks(fontsize=11)
+    _save(path)
+
+
+def sales_heatmap(heatmap_data, path):
+    plt, sns = _plotting()
+    plt.figure(figsize=(10, 6))
+    sns.heatmap(heatmap_data, annot=True, fmt=',.0f', cmap='YlOrRd', linewidths=1,
+                cbar_kws={'label': 'Sales ($)'}, annot_kws={'fontsize': 10, 'fontweight': 'bold'})
+
+    plt.title('Sales Heatmap: Region vs Category', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Category', fontsize=14, fontweight='bold')
+    plt.ylabel('Region', fontsize=14, fontweight='bold')
+    plt.xticks(fontsize=12, rotation=0)
+    plt.yticks(fontsize=12, rotation=0)
+    _save(path)
+
+
+def segment_performance(segment_data, path):
+    plt, _ = _plotting()
+    x = np.arange(len(segment_data))
+    width = 0.35
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    bars1 = ax.bar(x - width/2, segment_data['Sales']/1000, width, label='Sales',
+                   color='#FF6B6B', edgecolor='black', linewidth=1)
+    bars2 = ax.bar(x + width/2, segment_data['Profit']/1000, width, label='Profit',
+                   color='#4ECDC4', edgecolor='black', linewidth=1)
+
+    ax.set_title('Sales and Profit by Customer Segment', fontsize=18, fontweight='bold', pad=20)
+    ax.set_xlabel('Customer Segment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Amount (Thousands $)', fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(segment_data.index, fontsize=12)
+    ax.legend(fontsize=12)
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+
+    # Add value labels
+    for bars in [bars1, bars2]:
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                    f'${height:.0f}K', ha='center', va='bottom', fontsize=10, fontweight='bold')
+
+    _save(path)
+
+
+def yearly_growth(yearly_sales, path):
+    plt, _ = _plotting()
+    plt.figure(figsize=(12, 6))
+    plt.plot(yearly_sales.index, yearly_sales.values, marker='o', linewidth=3,
+             markersize=10, color='#FF6B6B', markerfacecolor='white',
+             markeredgecolor='#FF6B6B', markeredgewidth=2)
+
+    plt.title('Year-over-Year Sales Growth', fontsize=18, fontweight='bold', pad=20)
+    plt.xlabel('Year', fontsize=14, fontweight='bold')
+    plt.ylabel('Sales (Thousands $)', fontsize=14, fontweight='bold')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.xticks(yearly_sales.index, fontsize=12)
+    plt.yticks(fontsize=11)
+
+    # Add value labels
+    for x, y in zip(yearly_sales.index, yearly_sales.values):
+        plt.text(x, y + 10, f'${y:.0f}K', ha='center', va='bottom',
+                 fontsize=11, fontweight='bold')
+
+    _save(path)
+
+
+# Charts in report order: name -> (output file, renderer)
+CHARTS = {
+    'sales_by_region': ('01_sales_by_region.png', sales_by_region),
+    'sales_by_category': ('02_sales_by_category.png', sales_by_category),
+    'monthly_trend': ('03_monthly_trend.png', monthly_trend),
+    'top_subcategories': ('04_top_subcategories.png', top_subcategories),
+    'profit_margin_distribution': ('05_profit_margin_distribution.png', profit_margin_distribution),
+    'sales_heatmap': ('06_sales_heatmap.png', sales_heatmap),
+    'segment_performance': ('07_segment_performance.png', segment_performance),
+    'yearly_growth': ('08_yearly_growth.png', yearly_growth),
+}
+
+
+# ==========================================
+# CHART CACHE
+# ==========================================
+
+def _hash_data(digest, data):
+    """Feed a chart input (frames, series, arrays, scalars, dicts) into ``digest``."""
+    if isinstance(data, dict):
+        for key in sorted(data):
+            digest.update(repr(key).encode())
+            _hash_data(digest, data[key])
+    elif isinstance(data, (pd.Series, pd.DataFrame)):
+        columns = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+        digest.update(repr((type(data).__name__, list(columns), list(data.index.names),
+                            [str(dtype) for dtype in np.atleast_1d(data.dtypes)])).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif isinstance(data, np.ndarray):
+        digest.update(repr((data.dtype.str, data.shape)).encode())
+        digest.update(np.ascontiguousarray(data).tobytes())
+    else:
+        digest.update(repr(data).encode())
+
+
+def chart_key(name, data):
+    """Hash of a chart's input data, renderer source and style settings."""
+    filename, renderer = CHARTS[name]
+    digest = hashlib.sha256()
+    digest.update(repr((filename, CHART_STYLE, CHART_PALETTE, CHART_DPI,
+                        version('matplotlib'), version('seaborn'))).encode())
+    digest.update(inspect.getsource(renderer).encode())
+    _hash_data(digest, data)
+    return digest.hexdigest()[:32]
+
+
+def load_manifest(out_dir=CHART_DIR):
+    """Chart file -> key of the data it was last rendered from."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE)) as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, out_dir=CHART_DIR):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+# ==========================================
+# RENDERING STAGE
+# ==========================================
+
+def render_chart(name, data, out_dir=CHART_DIR):
+    """Render one chart; returns ``(name, path, seconds)``."""
+    filename, renderer = CHARTS[name]
+    path = os.path.join(out_dir, filename)
+    start = time.perf_counter()
+    apply_style()
+    renderer(data, path)
+    return name, path, time.perf_counter() - start
+
+
+def render_charts(data, out_dir=CHART_DIR, workers=DEFAULT_CHART_WORKERS, use_cache=True):
+    """Render every chart in ``data`` (see ``chart_data``), ``workers`` at a time.
+
+    With ``use_cache``, charts whose key matches the manifest and whose PNG
+    still exists are kept as they are. Returns ``(timings, wall_seconds)``
+    where ``timings`` lists ``(name, path, seconds)`` per chart in report
+    order, with ``seconds`` None for a cache hit.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    names = [name for name in CHARTS if name in data]
+    manifest = load_manifest(out_dir) if use_cache else {}
+    keys = {name: chart_key(name, data[name]) for name in names}
+    stale = [name for name in names
+             if manifest.get(CHARTS[name][0]) != keys[name]
+             or not os.path.exists(os.path.join(out_dir, CHARTS[name][0]))]
+    workers = max(1, min(workers, len(stale)))
+    start = time.perf_counter()
+    if workers == 1:
+        rendered = [render_chart(name, data[name], out_dir) for name in stale]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+            futures = [pool.submit(render_chart, name, data[name], out_dir) for name in stale]
+            rendered = [future.result() for future in futures]
+    manifest.update({CHARTS[name][0]: keys[name] for name in stale})
+    save_manifest(manifest, out_dir)
+
+    seconds = {name: elapsed for name, _, elapsed in rendered}
+    timings = [(name, os.path.join(out_dir, CHARTS[name][0]), seconds.get(name)) for name in names]
+    return timings, time.perf_counter() - start
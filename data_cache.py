@@ -0,0 +1,210 @@
+"""
+COLUMNAR CACHE FOR THE CLEANED DATASET
+======================================
+Stores the cleaned, enriched Superstore frame as one NumPy file per column
+so warm runs skip CSV parsing and cleaning entirely.
+
+Each cache entry lives in its own directory named after a fingerprint of
+the source CSV contents and the source code of the cleaning logic. Editing
+the CSV or the cleaning module produces a new fingerprint, so stale entries
+are never read. Each entry also records its slot: the input paths and the
+columns read. Writing a fresh entry prunes the older entries of its own
+slot only, so a projected run (``--only``), the full report and other
+partition selections keep their entries side by side.
+
+Column encodings:
+- numeric, boolean and datetime columns are saved as raw arrays and
+  memory-mapped on load
+- string columns are dictionary-encoded (integer codes + unique values)
+- categorical columns keep their codes and categories
+- period columns are saved as integer ordinals
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = '.superstore_cache'
+CACHE_FORMAT = 1
+META_FILE = 'meta.json'
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(csv_path, *logic, columns=None):
+    """Fingerprint of the CSV contents plus the source of the cleaning logic.
+
+    ``logic`` holds the modules or functions whose source code determines
+    the cleaned frame; editing any of them invalidates the cache. A frame
+    read with only some ``columns`` gets its own key, so it is never served
+    to a run that needs more.
+    """
+    return digests_key([file_digest(csv_path)], *logic, columns=columns)
+
+
+def digests_key(digests, *logic, columns=None):
+    """``cache_key`` for input made of several files, from their content
+    digests in read order (e.g. the partitions of a dataset)."""
+    digest = hashlib.sha256()
+    digest.update(f'format={CACHE_FORMAT}'.encode())
+    for file_hash in digests:
+        digest.update(file_hash.encode())
+    if columns is not None:
+        digest.update(f"columns={','.join(sorted(columns))}".encode())
+    for obj in logic:
+        digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_slot(paths, columns=None):
+    """What an entry holds, apart from file contents and code: the input
+    ``paths`` and the projected ``columns``. Entries of one slot replace
+    each other; entries of other slots are kept."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.abspath(path).encode() + b'\0')
+    if columns is not None:
+        digest.update(f"columns={','.join(sorted(columns))}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _read_slot(entry):
+    try:
+        with open(os.path.join(entry, META_FILE)) as handle:
+            return json.load(handle).get('slot')
+    except (OSError, ValueError):
+        return None
+
+
+def _save_array(entry, name, values):
+    np.save(os.path.join(entry, name), np.ascontiguousarray(values), allow_pickle=False)
+    return name + '.npy'
+
+
+def _load_array(entry, name, mmap):
+    return np.load(os.path.join(entry, name), mmap_mode='r' if mmap else None, allow_pickle=False)
+
+
+def _encode_values(values):
+    """Split values into integer codes and a pickle-free array of uniques."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = np.asarray(uniques)
+    if uniques.dtype == object:
+        uniques = uniques.astype(str)
+    return codes.astype(np.int32), uniques
+
+
+def _save_column(entry, position, series):
+    prefix = f'c{position}'
+    dtype = series.dtype
+    spec = {'name': series.name, 'dtype': str(dtype)}
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = np.asarray(dtype.categories)
+        if categories.dtype == object:
+            categories = categories.astype(str)
+        spec.update(kind='categorical', ordered=bool(dtype.ordered),
+                    codes=_save_array(entry, prefix, series.cat.codes.to_numpy()),
+                    values=_save_array(entry, prefix + '_values', categories))
+    elif isinstance(dtype, pd.PeriodDtype):
+        spec.update(kind='period', codes=_save_array(entry, prefix, series.array.asi8))
+    elif isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        spec.update(kind='array', values=_save_array(entry, prefix, series.to_numpy()))
+    else:
+        codes, uniques = _encode_values(series.to_numpy())
+        spec.update(kind='encoded',
+                    codes=_save_array(entry, prefix, codes),
+                    values=_save_array(entry, prefix + '_values', uniques))
+    return spec
+
+
+def _load_column(entry, spec, index, mmap):
+    kind = spec['kind']
+    if kind == 'array':
+        values = _load_array(entry, spec['values'], mmap)
+        return pd.Series(values, index=index, name=spec['name'], copy=False)
+
+    codes = np.asarray(_load_array(entry, spec['codes'], mmap))
+    if kind == 'period':
+        dtype = pd.api.types.pandas_dtype(spec['dtype'])
+        return pd.Series(pd.arrays.PeriodArray(codes, dtype=dtype), index=index, name=spec['name'])
+
+    uniques = _load_array(entry, spec['values'], False)
+    if kind == 'categorical':
+        dtype = pd.CategoricalDtype(uniques, ordered=spec['ordered'])
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=index, name=spec['name'])
+
+    values = uniques.astype(object).take(codes)
+    values[codes < 0] = np.nan
+    series = pd.Series(values, index=index, name=spec['name'], dtype=object)
+    if spec['dtype'] != 'object':
+        series = series.astype(spec['dtype'])
+    return series
+
+
+def save_frame(df, entry, slot=None):
+    """Write ``df`` to the directory ``entry`` (written atomically), tagged
+    with its cache ``slot`` if given."""
+    parent = os.path.dirname(os.path.abspath(entry))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=parent)
+    try:
+        columns = [_save_column(staging, i, df[name]) for i, name in enumerate(df.columns)]
+        meta = {'format': CACHE_FORMAT, 'rows': len(df), 'columns': columns}
+        if isinstance(df.index, pd.RangeIndex):
+            meta['index'] = {'start': df.index.start, 'stop': df.index.stop, 'step': df.index.step}
+        else:
+            meta['index'] = {'values': _save_array(staging, 'index', df.index.to_numpy())}
+        if slot is not None:
+            meta['slot'] = slot
+        with open(os.path.join(staging, META_FILE), 'w') as handle:
+            json.dump(meta, handle, indent=2)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def load_frame(entry, mmap=True):
+    """Read a frame written by ``save_frame``; numeric columns are memory-mapped."""
+    with open(os.path.join(entry, META_FILE)) as handle:
+        meta = json.load(handle)
+    if 'values' in meta['index']:
+        index = pd.Index(_load_array(entry, meta['index']['values'], False))
+    else:
+        index = pd.RangeIndex(**meta['index'])
+    columns = [_load_column(entry, spec, index, mmap) for spec in meta['columns']]
+    return pd.concat(columns, axis=1)
+
+
+def load_cached_frame(cache_dir, key):
+    """Return the cached frame for ``key``, or None on a cache miss."""
+    entry = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(entry, META_FILE)):
+        return None
+    return load_frame(entry)
+
+
+def store_cached_frame(cache_dir, key, df, slot):
+    """Cache ``df`` under ``key`` and prune the older entries of ``slot``
+    (see ``cache_slot``), including those written before slots were kept."""
+    save_frame(df, os.path.join(cache_dir, key), slot)
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name != key and os.path.isdir(path) and _read_slot(path) in (slot, None):
+            shutil.rmtree(path, ignore_errors=True)
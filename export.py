@@ -0,0 +1,214 @@
+"""
+REPORT EXPORT
+=============
+Writes the analysis tables to the Excel workbook or to per-table files. The
+sheet layout is shared by the full report and by the streaming and append
+modes, which export the subset of tables they compute.
+
+Export backends (``EXPORT_BACKENDS``):
+- xlsx: pandas ExcelWriter on openpyxl; the whole workbook object model is
+  built in memory before it is saved
+- xlsx-stream: openpyxl's write-only workbook; rows are converted a bounded
+  chunk at a time and streamed to disk as they are appended, so memory
+  beyond the tables themselves stays flat however long they are
+- parquet / csv: one file per table in a directory, written in parallel by a
+  thread pool (pyarrow and the CSV writer release the GIL for most of the
+  work)
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+EXCEL_FILE = 'Sales_Analysis_Complete.xlsx'
+PARQUET_DIR = 'Sales_Analysis_Parquet'
+CSV_DIR = 'Sales_Analysis_CSV'
+DEFAULT_EXPORT_WORKERS = min(8, os.cpu_count() or 1)
+# Rows converted to Python cell values at a time by the streaming workbook
+SHEET_CHUNK_ROWS = 10_000
+
+# Workbook sheets in order, keyed by the report table each one holds
+SHEET_NAMES = {
+    'summary': 'Summary',
+    'region_analysis': 'Region Analysis',
+    'category_analysis': 'Category Analysis',
+    'segment_analysis': 'Segment Analysis',
+    'yearly_perf': 'Yearly Performance',
+    'monthly_data': 'Monthly Trend',
+    'period_windows': 'Sales Windows',
+    'windows_yoy': 'Sales Windows YoY',
+    'top_products_sales': 'Top Products by Sales',
+    'top_products_profit': 'Top Products by Profit',
+    'customer_sales': 'Top Customers',
+    'shipping_analysis': 'Shipping Analysis',
+    'discount_analysis': 'Discount Analysis',
+    'rfm_top20': 'RFM Analysis',
+    'correlation_matrix': 'Correlations',
+}
+# Sheets written only on request (sales_analysis.py --window-sheets)
+WINDOW_SHEETS = ['period_windows', 'windows_yoy']
+
+
+def summary_frame(kpis):
+    """The Summary sheet: formatted section 3 KPIs."""
+    return pd.DataFrame({
+        'Metric': ['Total Sales', 'Total Profit', 'Profit Margin %', 'Total Orders',
+                   'Total Customers', 'Unique Products', 'Avg Order Value', 'Total Quantity'],
+        'Value': [f"${kpis['total_sales']:,.2f}", f"${kpis['total_profit']:,.2f}",
+                  f"{kpis['avg_profit_margin']:.2f}%", kpis['total_orders'],
+                  kpis['total_customers'], kpis['unique_products'],
+                  f"${kpis['avg_order_value']:,.2f}", kpis['total_quantity']]
+    })
+
+
+def _sheets(tables):
+    """Report tables present in ``tables``, in workbook order."""
+    return [name for name in SHEET_NAMES if name in tables]
+
+
+def _with_index(name):
+    return name != 'summary'
+
+
+# ==========================================
+# EXPORT BACKENDS
+# ==========================================
+
+def write_excel(path, tables, workers=None):
+    """Write ``tables`` (report table name -> frame) as workbook sheets.
+
+    Returns the number of sheets written.
+    """
+    sheets = _sheets(tables)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name in sheets:
+            tables[name].to_excel(writer, sheet_name=SHEET_NAMES[name], index=_with_index(name))
+    return len(sheets)
+
+
+def _cell_values(values):
+    """Column values as plain Python objects for openpyxl (None for missing)."""
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.PeriodDtype):
+        values = values.dt.to_timestamp()
+    elif isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    missing = values.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(values):
+        cells = list(values.dt.to_pydatetime())
+    else:
+        cells = values.tolist()
+    return [None if gap else cell for cell, gap in zip(cells, missing)]
+
+
+def _sheet_rows(frame, index=True, chunk_rows=SHEET_CHUNK_ROWS):
+    """Header and data rows laid out like ``DataFrame.to_excel``, converted
+    ``chunk_rows`` rows at a time."""
+    yield (list(frame.index.names) if index else []) + list(frame.columns)
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        columns = [chunk.index.get_level_values(level) for level in range(chunk.index.nlevels)] if index else []
+        columns += [chunk[column] for column in chunk.columns]
+        yield from zip(*[_cell_values(column) for column in columns])
+
+
+def write_excel_streaming(path, tables, workers=None):
+    """Write ``tables`` with openpyxl's write-only (constant-memory) workbook.
+
+    Same sheets, header and values as ``write_excel``; cells carry no
+    styling. Returns the number of sheets written.
+    """
+    from openpyxl import Workbook
+
+    sheets = _sheets(tables)
+    workbook = Workbook(write_only=True)
+    for name in sheets:
+        sheet = workbook.create_sheet(SHEET_NAMES[name])
+        for row in _sheet_rows(tables[name], index=_with_index(name)):
+            sheet.append(row)
+    workbook.save(path)
+    return len(sheets)
+
+
+def _write_files(path, tables, suffix, write, workers):
+    os.makedirs(path, exist_ok=True)
+    sheets = _sheets(tables)
+    targets = [(tables[name], os.path.join(path, f'{position:02d}_{name}.{suffix}'), _with_index(name))
+               for position, name in enumerate(sheets, start=1)]
+    with ThreadPoolExecutor(max(1, min(workers or DEFAULT_EXPORT_WORKERS, len(targets) or 1))) as pool:
+        list(pool.map(lambda target: write(*target), targets))
+    return len(sheets)
+
+
+def _parquet_frame(frame):
+    """``frame`` with mixed-type object columns (the Summary values) as strings."""
+    mixed = [column for column in frame.columns if frame[column].dtype == object]
+    return frame.astype({column: str for column in mixed}) if mixed else frame
+
+
+def write_parquet(path, tables, workers=None):
+    """Write each table to ``path/NN_<table>.parquet`` in parallel."""
+    return _write_files(path, tables, 'parquet',
+                        lambda frame, target, index: _parquet_frame(frame).to_parquet(target, index=index),
+                        workers)
+
+
+def write_csv(path, tables, workers=None):
+    """Write each table to ``path/NN_<table>.csv`` in parallel."""
+    return _write_files(path, tables, 'csv',
+                        lambda frame, target, index: frame.to_csv(target, index=index), workers)
+
+
+# Export format -> (default output path, writer)
+EXPORT_BACKENDS = {
+    'xlsx': (EXCEL_FILE, write_excel),
+    'xlsx-stream': (EXCEL_FILE, write_excel_streaming),
+    'parquet': (PARQUET_DIR, write_parquet),
+    'csv': (CSV_DIR, write_csv),
+}
+
+
+def export_tables(tables, backend='xlsx', path=None, workers=None):
+    """Export ``tables`` with a backend; returns ``(path, tables_written)``."""
+    default_path, writer = EXPORT_BACKENDS[backend]
+    path = path or default_path
+    return path, writer(path, tables, workers=workers)
+
+
+def _output_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def compare_backends(tables, backends=None, workers=None):
+    """Time every backend on the same ``tables`` in a scratch directory.
+
+    Returns one row per backend with the wall time, the peak Python heap
+    allocated while writing (tracemalloc; a second, traced run so tracing
+    does not skew the timing) and the size of the output.
+    """
+    rows = []
+    scratch = tempfile.mkdtemp(prefix='export_compare_')
+    try:
+        for backend in backends or EXPORT_BACKENDS:
+            default_path, _ = EXPORT_BACKENDS[backend]
+            path = os.path.join(scratch, backend + os.path.splitext(default_path)[1])
+            start = time.perf_counter()
+            export_tables(tables, backend, path, workers)
+            seconds = time.perf_counter() - start
+
+            tracemalloc.start()
+            export_tables(tables, backend, path, workers)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append({'Backend': backend, 'Seconds': round(seconds, 3),
+                         'Peak Heap MB': round(peak / 1e6, 2), 'Output MB': round(_output_size(path) / 1e6, 3)})
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return pd.DataFrame(rows).set_index('Backend')
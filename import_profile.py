@@ -0,0 +1,85 @@
+"""
+STARTUP IMPORT PROFILE
+======================
+Measures what the report pays in imports before it reads any data, using
+``python -X importtime`` in fresh interpreters.
+
+Compares importing the report alone (tables, Excel, streaming and append
+modes) with importing it plus the plotting stack that only the charts
+section loads, and lists the slowest top-level imports of each.
+
+    python import_profile.py            # median of 5 runs per statement
+    python import_profile.py --runs 9
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+PROFILES = {
+    'report (tables-only)': 'import sales_analysis',
+    'report + plotting stack': 'import sales_analysis, charts; charts.apply_style()',
+}
+
+
+def import_times(statement):
+    """``{module: (self_us, cumulative_us)}`` for one fresh-interpreter run of ``statement``."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times.setdefault(module.strip(), (int(self_us), int(cumulative_us)))
+    return times, result.stderr
+
+
+def top_level(stderr):
+    """Modules imported directly by the statement (no indentation in the tree)."""
+    modules = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and 'self [us]' not in line:
+            name = line.rsplit('|', 1)[1]
+            if not name.startswith('  '):
+                modules.append(name.strip())
+    return modules
+
+
+def profile(statement, runs=5):
+    """Median total import time (ms) and the slowest top-level modules."""
+    totals, samples = [], []
+    for _ in range(runs):
+        times, stderr = import_times(statement)
+        roots = top_level(stderr)
+        totals.append(sum(times[name][1] for name in roots) / 1000)
+        samples.append({name: times[name][1] / 1000 for name in roots})
+    median = statistics.median(totals)
+    modules = {name: statistics.median(sample.get(name, 0) for sample in samples) for name in samples[0]}
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:5]
+    return median, slowest, 'matplotlib' in import_times(statement)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import-time profile of the report script.')
+    parser.add_argument('--runs', type=int, default=5, help='runs per statement (default: %(default)s)')
+    options = parser.parse_args(argv)
+
+    print(f"Import time, median of {options.runs} fresh interpreters ({sys.executable})")
+    print("-" * 70)
+    results = {}
+    for label, statement in PROFILES.items():
+        total, slowest, plotting = profile(statement, options.runs)
+        results[label] = total
+        print(f"{label:<26}{total:>10,.0f} ms   matplotlib loaded: {'yes' if plotting else 'no'}")
+        for name, ms in slowest:
+            print(f"    {name:<30}{ms:>10,.0f} ms")
+    baseline, lean = results['report + plotting stack'], results['report (tables-only)']
+    print("-" * 70)
+    print(f"Deferred plotting imports save {baseline - lean:,.0f} ms "
+          f"({(baseline - lean) / baseline:.0%}) on runs that render no chart")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+INCREMENTAL APPEND MODE
+=======================
+Persists the mergeable aggregate state behind the report so a batch of new
+orders can be folded in without re-reading the order history.
+
+The state directory holds one PartialAggregate per report table (KPI
+totals with the distinct order/customer/product IDs, the per-dimension
+tables, monthly_data, yearly_perf and the per-customer RFM inputs), the
+daily time buckets behind the rolling and period-to-date windows (see
+time_buckets.py) and the keys of the rows already ingested. Distinct
+counts stay exact because the distinct (group, ID) rows are part of the
+state, unless the state was created in approximate mode, which keeps
+HyperLogLog sketches instead.
+
+Rows are keyed by a deduplication policy chosen when the state is created
+(Row ID by default, or a hash of the whole row or of Order ID and Product
+ID; see dedup.py). The keys are kept in an exact hash set or a Bloom
+filter. Exact duplicate rows within a batch are dropped by cleaning; a
+batch whose keys still repeat within itself or match an earlier batch is
+rejected before anything is written. A file already ingested
+byte-for-byte is rejected from its digest alone, before it is parsed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from aggregates import PartialAggregate, report_partials, report_spec, report_from_partials
+from data_cache import file_digest
+from dedup import DEFAULT_POLICY, check_batch, load_store, new_store
+from superstore_data import load_superstore, clean_superstore
+from time_buckets import TimeBuckets
+
+STATE_DIR = '.superstore_state'
+STATE_FILE = 'state.json'
+DEDUP_DIR = 'dedup'
+BUCKETS_DIR = 'buckets'
+# Layout of the state directory; 2 added the time buckets
+STATE_FORMAT = 2
+
+# Tables maintained in the persisted state, in report order
+APPEND_TABLES = ['region_analysis', 'category_analysis', 'segment_analysis', 'yearly_perf',
+                 'monthly_data', 'shipping_analysis', 'discount_analysis', 'rfm']
+
+
+def state_version(approx_error=None):
+    """Fingerprint of the aggregate specs; state from other specs is not reused."""
+    partials = report_partials(APPEND_TABLES, approx_error)
+    specs = [(name, report_spec(name), partial.approx_error) for name, partial in partials.items()]
+    return hashlib.sha256(repr(specs).encode()).hexdigest()[:16]
+
+
+def load_state(state_dir=STATE_DIR, approx_error=None):
+    """Return ``(partials, store, buckets, meta)``, or None if no state exists yet."""
+    meta_path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as handle:
+        meta = json.load(handle)
+    if meta.get('format') != STATE_FORMAT:
+        raise ValueError(f"Aggregate state in '{state_dir}' was written in an older format (without the "
+                         f"time buckets); delete it and re-append the full history")
+    if meta['version'] != state_version(approx_error):
+        raise ValueError(f"Aggregate state in '{state_dir}' was built with different report specs "
+                         f"or distinct-count settings; delete it and re-append the full history")
+    template = report_partials(APPEND_TABLES, approx_error)
+    partials = {name: PartialAggregate.load(os.path.join(state_dir, name), *report_spec(name),
+                                            approx_error=template[name].approx_error)
+                for name in meta['partials']}
+    store = load_store(os.path.join(state_dir, DEDUP_DIR))
+    if store is None:
+        raise ValueError(f"Aggregate state in '{state_dir}' has no seen-row keys; "
+                         f"delete it and re-append the full history")
+    buckets = TimeBuckets.load(os.path.join(state_dir, BUCKETS_DIR))
+    if buckets is None:
+        raise ValueError(f"Aggregate state in '{state_dir}' has no time buckets; "
+                         f"delete it and re-append the full history")
+    return partials, store, buckets, meta
+
+
+def save_state(state_dir, partials, store, buckets, meta):
+    """Write the state to ``state_dir``, replacing the previous state atomically."""
+    staging = state_dir.rstrip(os.sep) + '.new'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, partial in partials.items():
+        partial.save(os.path.join(staging, name))
+    store.save(os.path.join(staging, DEDUP_DIR))
+    buckets.save(os.path.join(staging, BUCKETS_DIR))
+    with open(os.path.join(staging, STATE_FILE), 'w') as handle:
+        json.dump({**meta, 'partials': list(partials)}, handle, indent=2)
+
+    retired = state_dir.rstrip(os.sep) + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(state_dir):
+        os.replace(state_dir, retired)
+    os.replace(staging, state_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def append_batch(path, state_dir=STATE_DIR, approx_error=None, policy=DEFAULT_POLICY, bloom=False):
+    """Fold the orders in ``path`` into the persisted state and rebuild the reports.
+
+    The first call initialises the state (typically with the full history)
+    and fixes the deduplication ``policy`` and whether seen keys are kept
+    in a Bloom filter; later calls must use the same settings and the same
+    ``approx_error``. Returns ``(kpis, tables, meta)``.
+    """
+    state = load_state(state_dir, approx_error)
+    if state is None:
+        partials = report_partials(APPEND_TABLES, approx_error)
+        store = new_store(bloom)
+        buckets = TimeBuckets()
+        meta = {'format': STATE_FORMAT, 'version': state_version(approx_error), 'batches': 0, 'rows': 0,
+                'dedup_policy': policy, 'batch_digests': {}}
+    else:
+        partials, store, buckets, meta = state
+        if (meta['dedup_policy'], store.kind) != (policy, new_store(bloom).kind):
+            raise ValueError(f"Aggregate state in '{state_dir}' deduplicates with the "
+                             f"'{meta['dedup_policy']}' policy in a {store.kind}; append with the same settings")
+
+    digest = file_digest(path)
+    digests = meta.setdefault('batch_digests', {})
+    if digest in digests:
+        raise ValueError(f"'{os.path.basename(path)}' has the same contents as batch "
+                         f"'{digests[digest]}', which is already in the state")
+
+    batch = clean_superstore(load_superstore(path), verbose=False)
+    keys = check_batch(batch, store, policy)
+    for partial in partials.values():
+        partial.update(batch)
+    buckets.update(batch)
+    store.add(keys)
+
+    digests[digest] = os.path.basename(path)
+    meta.update(batches=meta['batches'] + 1, rows=meta['rows'] + len(batch),
+                last_batch=os.path.basename(path), last_batch_rows=len(batch),
+                seen_keys=len(store), dedup_store_mb=round(store.nbytes / 1e6, 2))
+    save_state(state_dir, partials, store, buckets, meta)
+    kpis, tables = report_from_partials(partials)
+    tables['period_windows'] = buckets.window_table()
+    tables['windows_yoy'] = buckets.yoy_table()
+    return kpis, tables, meta
@@ -0,0 +1,239 @@
+"""
+SECTION INSTRUMENTATION
+=======================
+Per-section metrics for the report pipeline: wall time, CPU time, resident
+memory, Python heap, and the rows each section received and produced.
+
+InstrumentedPipeline measures each section around ``Pipeline.execute``, so
+dependencies are always measured as separate sections. Runs without
+instrumentation use the plain Pipeline and pay nothing for it.
+
+Per section it records:
+- wall and CPU seconds (this process plus any worker processes the section
+  waited for, such as the chart renderers)
+- RSS before and after, and the section's peak RSS (Linux: the high-water
+  mark is reset before each section; elsewhere this is the process peak so
+  far)
+- with ``trace_memory``, the peak and net Python heap from tracemalloc
+  (which also sees NumPy/pandas buffers, but slows pandas down several
+  times over)
+- rows in (the largest table among the dependencies' results) and rows out
+- with ``profile_dir``, a cProfile dump ``NN_<section>.prof``
+
+The metrics are written as JSON, or as a Prometheus textfile (for
+node_exporter's textfile collector) when the path ends in '.prom'.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from pipeline import Pipeline
+
+try:
+    import resource
+except ImportError:
+    # Windows: CPU time is this process's only, peak RSS is unknown
+    resource = None
+
+PROMETHEUS_PREFIX = 'sales_report_section'
+
+# Metric -> (Prometheus name suffix, help text)
+PROMETHEUS_METRICS = {
+    'wall_seconds': ('wall_seconds', 'Wall-clock time spent in the section'),
+    'cpu_seconds': ('cpu_seconds', 'CPU time of the section, including waited-for worker processes'),
+    'rss_peak_mb': ('rss_peak_megabytes', 'Peak resident set size while the section ran'),
+    'rss_net_mb': ('rss_net_megabytes', 'Change in resident set size across the section'),
+    'heap_peak_mb': ('heap_peak_megabytes', 'Peak traced Python heap above the section start'),
+    'heap_net_mb': ('heap_net_megabytes', 'Traced Python heap retained by the section'),
+    'rows_in': ('rows_in', 'Rows in the largest table the section received'),
+    'rows_out': ('rows_out', 'Rows in the tables the section returned'),
+}
+
+
+def count_rows(value):
+    """Rows in the frames/series held by a section result, or None if it has none."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        counts = [count for count in map(count_rows, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def input_rows(inputs):
+    """Rows in the largest table among a section's inputs, or None if it got
+    none. Sections often receive the same rows twice (the load result and the
+    cleaned frame), so the inputs are not summed."""
+    counts = [count for count in map(count_rows, inputs) if count is not None]
+    return max(counts) if counts else None
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark; False where that is not possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as handle:
+            handle.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024 / 1e6
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == 'darwin' else rss * 1024 / 1e6
+
+
+def _cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+class InstrumentedPipeline(Pipeline):
+    """A Pipeline that records metrics for every section it executes.
+
+    ``metrics`` holds one dict per section, in run order.
+    """
+
+    def __init__(self, sections, options=None, trace_memory=False, profile_dir=None):
+        super().__init__(sections, options)
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.metrics = []
+        self.started = datetime.now()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def run(self, targets=None):
+        """Run the sections behind ``targets``, tracing the heap throughout if asked to."""
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            return super().run(targets)
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+    def execute(self, section, inputs):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        profiler = cProfile.Profile() if self.profile_dir else None
+
+        _reset_peak_rss()
+        rss_before = _rss_mb()
+        if tracing:
+            tracemalloc.reset_peak()
+            heap_before = tracemalloc.get_traced_memory()[0]
+        cpu_start, wall_start = _cpu_seconds(), time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            result = super().execute(section, inputs)
+        finally:
+            if profiler:
+                profiler.disable()
+        wall = time.perf_counter() - wall_start
+        cpu = _cpu_seconds() - cpu_start
+        rss_after, rss_peak = _rss_mb(), _peak_rss_mb()
+
+        metric = {
+            'section': section.name,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'rss_before_mb': _round(rss_before, 1),
+            'rss_after_mb': _round(rss_after, 1),
+            'rss_net_mb': _round(rss_after - rss_before, 1) if rss_before is not None else None,
+            'rss_peak_mb': _round(rss_peak, 1),
+            'heap_peak_mb': None,
+            'heap_net_mb': None,
+            'rows_in': input_rows(inputs),
+            'rows_out': count_rows(result),
+        }
+        if tracing:
+            heap_after, heap_peak = tracemalloc.get_traced_memory()
+            metric['heap_peak_mb'] = round((heap_peak - heap_before) / 1e6, 2)
+            metric['heap_net_mb'] = round((heap_after - heap_before) / 1e6, 2)
+        if profiler:
+            position = len(self.metrics) + 1
+            metric['profile'] = os.path.join(self.profile_dir, f'{position:02d}_{section.name}.prof')
+            profiler.dump_stats(metric['profile'])
+        self.metrics.append(metric)
+        return result
+
+    def metrics_frame(self):
+        """The recorded metrics as a DataFrame indexed by section."""
+        frame = pd.DataFrame(self.metrics).set_index('section')
+        return frame.astype({'rows_in': 'Int64', 'rows_out': 'Int64'})
+
+
+def metrics_json(pipeline):
+    """JSON document of a run's section metrics."""
+    options = pipeline.options
+    return {
+        'started': pipeline.started.isoformat(timespec='seconds'),
+        'input': getattr(options, 'input', None),
+        'trace_memory': pipeline.trace_memory,
+        'total_wall_seconds': round(sum(metric['wall_seconds'] for metric in pipeline.metrics), 4),
+        'sections': pipeline.metrics,
+    }
+
+
+def metrics_prometheus(pipeline):
+    """Prometheus text exposition of a run's section metrics (gauges labelled by section)."""
+    lines = []
+    for key, (suffix, help_text) in PROMETHEUS_METRICS.items():
+        samples = [(metric['section'], metric[key]) for metric in pipeline.metrics if metric[key] is not None]
+        if not samples:
+            continue
+        name = f'{PROMETHEUS_PREFIX}_{suffix}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(f'{name}{{section="{section}"}} {value}' for section, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(pipeline, path):
+    """Write the metrics to ``path`` (Prometheus textfile if it ends in '.prom', else JSON).
+
+    The file is replaced atomically so a collector never reads half of it.
+    """
+    if path.endswith('.prom'):
+        text = metrics_prometheus(pipeline)
+    else:
+        text = json.dumps(metrics_json(pipeline), indent=2)
+    partial = path + '.partial'
+    with open(partial, 'w') as handle:
+        handle.write(text)
+    os.replace(partial, path)
+    return path
@@ -0,0 +1,301 @@
+"""
+SALES OLAP CUBE
+===============
+A materialized cube of the Superstore rows at the finest grain the report
+slices by, so grouped tables and interactive slices are answered by rolling
+up cells instead of rescanning rows.
+
+Cells are keyed by Region, Category, Sub-Category, Segment, Ship Mode,
+Order Year, Order Quarter, Year-Month and Discount Range. Category, year and
+quarter depend on sub-category and month, so they add no cells. The number
+of cells is bounded by the dimension sizes, not by the row count. Each cell
+holds additive components: a row count, and the sums and counts behind the
+sum/count/mean of Sales, Profit, Quantity, Discount, Shipping Days and
+Profit Margin. A roll-up to any subset of the dimensions, with filters on
+any of them, is a masked group-by over the cells.
+
+Distinct counts do not add up across cells, so they are answered
+separately:
+- orders per cell at order grain (Region, Segment, Ship Mode and the order
+  month). Every order has exactly one of each, so these counts add up over
+  any roll-up of those dimensions.
+- bridges: the distinct (ID, dimensions) rows for Order ID by category and
+  the order-level dimensions, and for Customer ID by region, segment,
+  category and year. They scale with orders and customers rather than rows.
+
+A distinct count outside these dimensions raises ValueError. The state is
+built from PartialAggregates, so the cube can be folded chunk by chunk and
+saved to and loaded from disk.
+
+    python olap_cube.py --slice Region=West Category=Technology "Order Year=2017"
+    python olap_cube.py --by Region,Category
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from aggregates import PartialAggregate
+from data_cache import CACHE_DIR, cache_key, load_frame, save_frame
+import dedup
+import superstore_data
+
+CUBE_DIMENSIONS = ['Region', 'Category', 'Sub-Category', 'Segment', 'Ship Mode',
+                   'Order Year', 'Order Quarter', 'Year-Month', 'Discount Range']
+# Dimensions with a single value per order
+ORDER_DIMENSIONS = ['Region', 'Segment', 'Ship Mode', 'Order Year', 'Order Quarter', 'Year-Month']
+# Additive components kept per cell; 'mean' keeps a sum and a count
+CUBE_METRICS = [('Sales', 'mean'), ('Profit', 'mean'), ('Quantity', 'sum'), ('Discount', 'mean'),
+                ('Shipping Days', 'mean'), ('Profit Margin', 'mean'), ('Order ID', 'count')]
+# ID column -> dimensions its distinct-count bridge covers
+BRIDGES = {
+    'Order ID': ['Category', *ORDER_DIMENSIONS],
+    'Customer ID': ['Region', 'Segment', 'Category', 'Order Year'],
+}
+# Columns of the cleaned frame the cube is built from
+CUBE_COLUMNS = sorted({*CUBE_DIMENSIONS, *(column for column, _ in CUBE_METRICS), *BRIDGES})
+CUBE_SUBDIR = 'cube'
+CUBE_META = 'cube.json'
+# Measures reported by SalesCube.slice
+SLICE_METRICS = [('Sales', 'sum'), ('Profit', 'sum'), ('Quantity', 'sum'), ('Order ID', 'count'),
+                 ('Order ID', 'nunique'), ('Customer ID', 'nunique'), ('Discount', 'mean'),
+                 ('Shipping Days', 'mean')]
+
+
+def _dimensions(by):
+    return [] if not by else [by] if isinstance(by, str) else list(by)
+
+
+def cube_fingerprint():
+    """Digest of the cube and partial-aggregate code; a saved cube from other code is rebuilt."""
+    digest = hashlib.sha256()
+    for module in (sys.modules[__name__], sys.modules[PartialAggregate.__module__]):
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()[:16]
+
+
+def _filter(frame, filters, levels=True):
+    """Rows of ``frame`` whose dimension values are in ``filters`` (dimension -> values)."""
+    if not filters:
+        return frame
+    mask = None
+    for dimension, values in filters.items():
+        column = frame.index.get_level_values(dimension) if levels else frame[dimension]
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        match = pd.Index(column).isin(list(values))
+        mask = match if mask is None else mask & match
+    return frame[mask]
+
+
+class SalesCube:
+    """Cells, order counts and distinct-count bridges over CUBE_DIMENSIONS."""
+
+    def __init__(self):
+        self.cells = PartialAggregate(CUBE_DIMENSIONS, CUBE_METRICS)
+        self.bridges = {column: PartialAggregate(dimensions, [(column, 'nunique')])
+                        for column, dimensions in BRIDGES.items()}
+        self._orders = None
+
+    @classmethod
+    def build(cls, df):
+        """Cube of the cleaned frame ``df``."""
+        return cls().update(df)
+
+    def update(self, chunk):
+        """Fold a chunk of cleaned rows into the cube."""
+        self.cells.update(chunk)
+        for bridge in self.bridges.values():
+            bridge.update(chunk)
+        self._orders = None
+        return self
+
+    @property
+    def size(self):
+        return len(self.cells.totals)
+
+    @property
+    def orders(self):
+        """Orders per order-grain cell (orders have one value of each ORDER_DIMENSIONS)."""
+        if self._orders is None:
+            rows = self.bridges['Order ID'].distinct['Order ID']
+            self._orders = (rows.drop_duplicates('Order ID')
+                            .groupby(ORDER_DIMENSIONS, observed=True).size().rename('orders'))
+        return self._orders
+
+    @classmethod
+    def answers(cls, by, metrics, filters=None):
+        """Whether ``rollup`` can compute ``metrics`` grouped by ``by``. Depends
+        only on the cube's layout, so it can be asked before the cube is built."""
+        used = set(_dimensions(by)) | set(filters or {})
+        if not used <= set(CUBE_DIMENSIONS):
+            return False
+        components = set(PartialAggregate(CUBE_DIMENSIONS, CUBE_METRICS)._components())
+        for column, func in metrics:
+            if func == 'nunique':
+                if not (column == 'Order ID' and used <= set(ORDER_DIMENSIONS)) and not (
+                        column in BRIDGES and used <= set(BRIDGES[column])):
+                    return False
+            elif func in ('sum', 'mean', 'count'):
+                needed = {f'{column}|count'} if func == 'count' else {f'{column}|sum'}
+                if func == 'mean':
+                    needed.add(f'{column}|count')
+                if not needed <= components:
+                    return False
+            else:
+                return False
+        return True
+
+    def rollup(self, by, metrics, filters=None):
+        """``metrics`` grouped by ``by`` over the cells matching ``filters``.
+
+        Laid out like ``aggregates.aggregate``: one row per group (sorted),
+        one column per metric tuple. ``by`` may be empty for a grand total.
+        """
+        keys = _dimensions(by)
+        if not self.answers(keys, metrics, filters):
+            raise ValueError(f"The cube cannot answer {metrics} by {keys} with filters on {sorted(filters or {})}")
+        additive = [metric for metric in metrics if metric[1] != 'nunique']
+        columns = {}
+        if additive:
+            cells = _filter(self.cells.totals, filters)
+            partial = PartialAggregate(keys, additive)
+            partial.totals = (cells.groupby(level=keys, observed=True).sum() if keys
+                              else cells.sum().to_frame('All').T)
+            rolled = partial.result()
+            columns.update({metric: rolled[metric] for metric in additive})
+        for column, func in metrics:
+            if func == 'nunique':
+                columns[(column, func)] = self._distinct(column, keys, filters)
+        base = pd.DataFrame({i: columns[metric] for i, metric in enumerate(metrics)})
+        base.columns = pd.MultiIndex.from_tuples(metrics)
+        return base.sort_index()
+
+    def _distinct(self, column, keys, filters):
+        used = set(keys) | set(filters or {})
+        if column == 'Order ID' and used <= set(ORDER_DIMENSIONS):
+            counts = _filter(self.orders, filters)
+            return counts.groupby(level=keys, observed=True).sum() if keys else pd.Series([counts.sum()], index=['All'])
+        rows = _filter(self.bridges[column].distinct[column], filters, levels=False)
+        if not keys:
+            return pd.Series([rows[column].nunique()], index=['All'])
+        return rows.groupby(keys, observed=True)[column].nunique()
+
+    def slice(self, **filters):
+        """Headline measures for one slice, e.g. ``slice(Region='West', Category='Technology')``.
+
+        Distinct counts are None where the slice is outside their bridge.
+        """
+        metrics = [metric for metric in SLICE_METRICS if self.answers([], [metric], filters)]
+        row = self.rollup([], metrics, filters).iloc[0]
+        return {metric: row[metric] if metric in metrics else None for metric in SLICE_METRICS}
+
+    def save(self, path):
+        """Write the cube to the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        self.cells.save(os.path.join(path, 'cells'))
+        for i, bridge in enumerate(self.bridges.values()):
+            bridge.save(os.path.join(path, f'bridge{i}'))
+        save_frame(self.orders.reset_index(), os.path.join(path, 'orders'))
+        with open(os.path.join(path, CUBE_META), 'w') as handle:
+            json.dump({'fingerprint': cube_fingerprint(), 'cells': self.size}, handle, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by ``save``; None if missing or built by other code."""
+        try:
+            with open(os.path.join(path, CUBE_META)) as handle:
+                meta = json.load(handle)
+        except OSError:
+            return None
+        if meta['fingerprint'] != cube_fingerprint():
+            return None
+        cube = cls()
+        cube.cells = PartialAggregate.load(os.path.join(path, 'cells'), CUBE_DIMENSIONS, CUBE_METRICS)
+        for i, (column, dimensions) in enumerate(BRIDGES.items()):
+            cube.bridges[column] = PartialAggregate.load(os.path.join(path, f'bridge{i}'), dimensions,
+                                                         [(column, 'nunique')])
+        orders = load_frame(os.path.join(path, 'orders'), mmap=False)
+        cube._orders = orders.set_index(ORDER_DIMENSIONS)['orders']
+        return cube
+
+
+def cube_path(cache_dir, data_key):
+    """Where the cube for a cleaned-data cache entry is kept."""
+    return os.path.join(cache_dir, data_key, CUBE_SUBDIR)
+
+
+def load_or_build_cube(df, cache_dir=None, data_key=None):
+    """The cube for ``df``: loaded from the cache entry ``data_key`` when saved
+    there by the same code, else built (and saved when a key is given).
+
+    Returns ``(cube, loaded)``.
+    """
+    path = cube_path(cache_dir, data_key) if data_key else None
+    cube = SalesCube.load(path) if path else None
+    if cube is not None:
+        return cube, True
+    cube = SalesCube.build(df)
+    if path:
+        cube.save(path)
+    return cube, False
+
+
+def _parse_value(cube, dimension, raw):
+    """A command-line slice value as the dimension's type (year, period, label)."""
+    level = cube.cells.totals.index.get_level_values(dimension)
+    if isinstance(level.dtype, pd.PeriodDtype):
+        return pd.Period(raw, freq=level.dtype.freq)
+    if pd.api.types.is_integer_dtype(level.dtype):
+        return int(raw)
+    return raw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Roll up or slice the sales cube.')
+    parser.add_argument('--input', default=superstore_data.DATA_FILE, help='Superstore CSV (default: %(default)s)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='cache holding the cube (default: %(default)s)')
+    parser.add_argument('--slice', nargs='*', default=[], metavar='DIMENSION=VALUE',
+                        help='filters, e.g. Region=West "Order Year=2017" (repeat a dimension for OR)')
+    parser.add_argument('--by', default='', help='comma-separated dimensions to roll up to')
+    options = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    data_key = cache_key(options.input, superstore_data, dedup)
+    cube = SalesCube.load(cube_path(options.cache_dir, data_key))
+    if cube is None:
+        df = superstore_data.clean_superstore(superstore_data.load_superstore(options.input), verbose=False)
+        cube, _ = load_or_build_cube(df, options.cache_dir, data_key)
+        print(f"✓ Built cube: {cube.size:,} cells from {len(df):,} rows in {time.perf_counter() - start:.2f}s")
+    else:
+        print(f"✓ Loaded cube: {cube.size:,} cells in {time.perf_counter() - start:.2f}s")
+
+    filters = {}
+    for item in options.slice:
+        dimension, _, raw = item.partition('=')
+        if dimension not in CUBE_DIMENSIONS:
+            parser.error(f"Unknown dimension '{dimension}'; choose from {', '.join(CUBE_DIMENSIONS)}")
+        filters.setdefault(dimension, []).append(_parse_value(cube, dimension, raw))
+    by = [name.strip() for name in options.by.split(',') if name.strip()]
+
+    pd.set_option('display.width', None)
+    start = time.perf_counter()
+    if by:
+        metrics = [metric for metric in SLICE_METRICS if cube.answers(by, [metric], filters)]
+        result = cube.rollup(by, metrics, filters)
+        result.columns = [f'{column} ({func})' for column, func in result.columns]
+        print(result.round(2))
+    else:
+        for (column, func), value in cube.slice(**filters).items():
+            shown = 'n/a (outside the bridge dimensions)' if value is None else f'{value:,.2f}'
+            print(f"  {column + ' ' + func:<24}{shown:>20}")
+    print(f"  answered in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+MAP-REDUCE EXECUTION ACROSS WORKER PROCESSES
+============================================
+Builds the section 3-11 summary tables (KPIs, the region, category, segment,
+yearly, monthly, shipping and discount tables, RFM, and the product and
+customer rankings) with a pool of worker processes.
+
+The input is split into pieces, one or more per worker:
+- 'file': runs of consecutive partitions of a directory or glob of CSVs
+  (e.g. one file per month, see partitions.py), grouped by size into about
+  as many pieces as the other splits make
+- 'rows': byte ranges of a single CSV, cut at line ends; each worker parses
+  only its range (rows must not contain line breaks inside quotes, which
+  the Superstore export never does)
+- 'date': contiguous ranges of whole Order Date months of the cleaned-data
+  cache. Workers memory-map the cached frame and take their rows through
+  the slice index (see slicing.py), so nothing is parsed twice. The cache
+  and index are built first if missing.
+
+Each worker cleans its piece and folds it into the mergeable partial
+aggregates of aggregates.py. The coordinator combines the partials of all
+pieces in one step. Duplicate rows that fall in different pieces are found from the
+64-bit row keys (see dedup.py) the workers send back. Pieces holding
+repeats of an earlier piece are run again without those rows, so the
+tables equal the single-process report (up to the order floating-point
+sums are added in, which can move a total on a half-cent tie by a cent).
+"""
+
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dedup
+import superstore_data
+from aggregates import RANKINGS, REPORT_AGGREGATIONS, PartialAggregate, report_partials, report_from_partials
+from data_cache import CACHE_DIR, cache_key, cache_slot, load_cached_frame, store_cached_frame
+from dedup import HashSet, duplicate_mask, row_keys
+from incremental import APPEND_TABLES
+from partitions import PartitionedDataset, concat_partitions, is_partitioned
+from slicing import load_or_build_index
+from superstore_data import clean_superstore, load_superstore
+
+SPLITS = ['file', 'rows', 'date']
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Pieces per worker, so a slow piece does not hold up the whole run
+PIECES_PER_WORKER = 2
+
+
+def input_files(path):
+    """The CSVs named by ``path``: a file, or the partitions of a directory or
+    glob in date order (see partitions.py)."""
+    if not is_partitioned(path):
+        return [path]
+    partitions, _ = PartitionedDataset(path).select()
+    return [partition['path'] for partition in partitions]
+
+
+def byte_ranges(path, pieces):
+    """Split a CSV after its header into about ``pieces`` ``(start, end)``
+    byte ranges, each starting at a line start."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as handle:
+        handle.readline()
+        first = handle.tell()
+        cuts = [first]
+        for i in range(1, pieces):
+            handle.seek(first + (size - first) * i // pieces)
+            handle.readline()
+            if cuts[-1] < handle.tell() < size:
+                cuts.append(handle.tell())
+    return list(zip(cuts, cuts[1:] + [size]))
+
+
+def month_ranges(index, pieces):
+    """Split the rows of a slice index into about ``pieces`` ``(start, end)``
+    position ranges of its date order, cut at month starts."""
+    dates = np.asarray(index.dates)
+    months = dates.astype('datetime64[M]')
+    starts = np.flatnonzero(np.concatenate([[True], months[1:] != months[:-1]]))
+    targets = np.arange(1, pieces) * len(dates) / pieces
+    cuts = np.unique(starts[np.clip(np.searchsorted(starts, targets), 0, len(starts) - 1)])
+    cuts = [0] + [int(cut) for cut in cuts if 0 < cut < len(dates)] + [len(dates)]
+    return list(zip(cuts, cuts[1:]))
+
+
+def file_groups(files, pieces):
+    """Consecutive runs of ``files``, at most ``pieces`` of them, of about equal total size."""
+    sizes = np.cumsum([os.path.getsize(file) for file in files])
+    cuts = np.searchsorted(sizes, sizes[-1] * np.arange(1, pieces) / pieces, side='right')
+    cuts = sorted({0, len(files), *(int(cut) for cut in cuts)})
+    return [tuple(files[start:end]) for start, end in zip(cuts, cuts[1:])]
+
+
+def report_pieces(path, split, workers, cache_dir=CACHE_DIR):
+    """The pieces ``path`` is split into, as ``(split, source, detail)`` tasks."""
+    pieces = max(1, workers * PIECES_PER_WORKER)
+    if split != 'file' and is_partitioned(path):
+        raise ValueError(f"'{path}' is a partitioned dataset; split it by file")
+    if split == 'file':
+        return [('file', files, None) for files in file_groups(input_files(path), pieces)]
+    if split == 'rows':
+        return [('rows', path, extent) for extent in byte_ranges(path, pieces)]
+    if split == 'date':
+        data_key = cache_key(path, superstore_data, dedup)
+        df = load_cached_frame(cache_dir, data_key)
+        if df is None:
+            df = clean_superstore(load_superstore(path), verbose=False)
+            store_cached_frame(cache_dir, data_key, df, cache_slot([path]))
+        index, _ = load_or_build_index(df, cache_dir, data_key)
+        return [('date', (cache_dir, data_key), extent) for extent in month_ranges(index, pieces)]
+    raise ValueError(f"Unknown split '{split}'; choose from {', '.join(SPLITS)}")
+
+
+def empty_partials(approx_error=None):
+    """Partial aggregates for the APPEND_TABLES and the RANKINGS tables."""
+    partials = report_partials(APPEND_TABLES, approx_error)
+    for name in RANKINGS:
+        partials[name] = PartialAggregate(*REPORT_AGGREGATIONS[name])
+    return partials
+
+
+def _read_piece(kind, source, detail):
+    """The cleaned rows of a piece, and whether cleaning already dropped duplicates
+    of other pieces (true for the cache, which was cleaned as a whole)."""
+    if kind == 'date':
+        cache_dir, data_key = source
+        df = load_cached_frame(cache_dir, data_key)
+        index, _ = load_or_build_index(df, cache_dir, data_key)
+        start, end = detail
+        return df.take(np.sort(index.order[start:end])).reset_index(drop=True), True
+    if kind == 'rows':
+        start, end = detail
+        with open(source, 'rb') as handle:
+            header = handle.readline()
+            handle.seek(start)
+            raw = load_superstore(io.BytesIO(header + handle.read(end - start)))
+    else:
+        raw = concat_partitions(load_superstore(file) for file in source)
+    return raw, False
+
+
+def map_piece(task, approx_error=None, drop=None):
+    """Worker: clean a piece and fold it into fresh partials.
+
+    Rows whose key is in ``drop`` (repeats of earlier pieces) are left out.
+    Returns a dict with the partials, the row keys of the kept rows (None
+    for 'date' pieces), the row count and the seconds taken.
+    """
+    start = time.perf_counter()
+    df, deduplicated = _read_piece(*task)
+    keys = None
+    if not deduplicated:
+        keys = row_keys(df, 'row')
+        keep = ~duplicate_mask(keys)
+        if drop is not None:
+            keep &= ~HashSet(drop).contains(keys)
+        df = clean_superstore(df[keep].reset_index(drop=True), verbose=False, drop_duplicates=False)
+        keys = keys[keep]
+    partials = empty_partials(approx_error)
+    for partial in partials.values():
+        partial.update(df)
+    return {'partials': partials, 'keys': keys, 'rows': len(df),
+            'seconds': time.perf_counter() - start}
+
+
+def _map(tasks, workers, approx_error=None, drops=None):
+    drops = drops or [None] * len(tasks)
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [map_piece(task, approx_error, drop) for task, drop in zip(tasks, drops)]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        futures = [pool.submit(map_piece, task, approx_error, drop) for task, drop in zip(tasks, drops)]
+        return [future.result() for future in futures]
+
+
+def parallel_report(path, split='rows', workers=DEFAULT_WORKERS, approx_error=None, cache_dir=CACHE_DIR):
+    """KPIs and summary tables of ``path`` computed by ``workers`` processes.
+
+    Returns ``(kpis, tables, stats)``: ``tables`` holds the APPEND_TABLES
+    and RANKINGS tables (equal to the in-memory ones without
+    ``approx_error``); ``stats`` the piece, row and timing counts.
+    """
+    start = time.perf_counter()
+    tasks = report_pieces(path, split, workers, cache_dir)
+    planned = time.perf_counter()
+    results = _map(tasks, workers, approx_error)
+
+    # Keep the first occurrence of a row repeated across pieces, as cleaning
+    # the whole input would
+    seen, repeats = HashSet(), {}
+    for i, result in enumerate(results):
+        if result['keys'] is not None:
+            repeated = seen.contains(result['keys'])
+            if repeated.any():
+                repeats[i] = result['keys'][repeated]
+            seen.add(result['keys'])
+    if repeats:
+        reruns = _map([tasks[i] for i in repeats], workers, approx_error, list(repeats.values()))
+        for i, result in zip(repeats, reruns):
+            results[i] = result
+    mapped = time.perf_counter()
+
+    partials = {name: PartialAggregate.combine([result['partials'][name] for result in results])
+                for name in results[0]['partials']}
+    kpis, tables = report_from_partials(partials)
+    for name, (_, _, _, finish) in RANKINGS.items():
+        tables[name] = finish(partials[name].result())
+    end = time.perf_counter()
+
+    stats = {'split': split, 'workers': max(1, min(workers, len(tasks))), 'pieces': len(tasks),
+             'rows': sum(result['rows'] for result in results), 'rerun_pieces': len(repeats),
+             'plan_seconds': planned - start, 'map_seconds': mapped - planned, 'reduce_seconds': end - mapped,
+             'busy_seconds': sum(result['seconds'] for result in results), 'wall_seconds': end - start}
+    return kpis, tables, stats
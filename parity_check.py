@@ -0,0 +1,245 @@
+"""
+PARITY CHECK
+============
+Checks that every way of computing the report gives the same tables, so a
+change to the mergeable state cannot silently break exactness. The
+reference is the in-memory report (``sales_analysis.build_pipeline``, run
+without the cleaned-data cache). Against it:
+- stream: ``stream_tables`` and ``stream_rankings`` over odd-sized chunks
+  (PartialAggregate merges, co-moments, top-k candidate sets)
+- parallel: ``parallel_report`` split by rows, by date month and by file,
+  with each ``--workers`` count (including the duplicate rows dropped across
+  pieces)
+- append: the input's monthly partitions appended as batches in shuffled
+  order, so orders arrive for past days too. Re-appending a batch must be
+  rejected.
+- buckets: every time-bucket window against a direct sum of the rows, for
+  an index built at once and for one updated batch by batch out of order
+- sketches: HyperLogLog, quantile-sketch and co-moment states merged from
+  ``--shards`` slices against one pass over all rows
+
+Tables must match to the cent: sums added up in a different order can round
+the other way on an exact half-cent. KPIs must match to 1e-9 (relative). Each
+check prints ✓, or ✗ with its differences; the exit status is 1 if any check
+failed. Everything is written to a scratch directory.
+
+    python parity_check.py
+    python parity_check.py --input benchmark_data/superstore_100k.csv --workers 1,4
+"""
+
+import argparse
+import contextlib
+import glob
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from aggregates import RANKINGS, ReportStatistics
+from incremental import append_batch
+from parallel import parallel_report
+from partitions import write_partitions
+from sales_analysis import build_parser, build_pipeline
+from sketches import CoMoments, HyperLogLog, QuantileSketch
+from streaming import stream_rankings, stream_tables
+from superstore_data import DATA_FILE
+from time_buckets import BUCKET_DIMENSIONS, BUCKET_MEASURES, TimeBuckets
+
+REFERENCE_SECTIONS = ['kpis', 'regional', 'category', 'customer', 'time', 'product', 'shipping', 'discount',
+                      'rfm', 'correlation']
+CENT = 0.011
+KPI_TOLERANCE = 1e-9
+# Odd, so chunks and pieces never line up with months or orders
+DEFAULT_CHUNKSIZE = 997
+DEFAULT_WORKERS = [1, 3]
+DEFAULT_SHARDS = 7
+DEFAULT_SEED = 7
+# Random as-of dates whose windows are checked, besides the first and last day
+WINDOW_DATES = 20
+
+
+def reference_report(path):
+    """``(kpis, tables, df)`` of the in-memory report on ``path``."""
+    options = build_parser().parse_args(['--input', path, '--no-cache', '--tables-only'])
+    pipeline = build_pipeline(options)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sections = pipeline.run(REFERENCE_SECTIONS)
+    engine = pipeline.results['engine']
+    tables = {'region_analysis': sections['regional'], 'category_analysis': sections['category'],
+              'shipping_analysis': sections['shipping'], 'discount_analysis': sections['discount'],
+              'rfm': sections['rfm']['rfm'], 'correlation_matrix': sections['correlation'],
+              **sections['customer'], **sections['time'], **sections['product']}
+    # The ranked tables as the report builds them, before it prints a subset
+    tables.update({name: finish(engine.get(name)) for name, (_, _, _, finish) in RANKINGS.items()})
+    return sections['kpis'], tables, pipeline.results['clean']
+
+
+def _first_line(error):
+    return next((line.strip() for line in str(error).splitlines() if line.strip()), repr(error))
+
+
+def differences(reference, kpis, tables, required):
+    """Messages for every KPI or table that differs from ``reference``, and for
+    ``required`` tables that are missing."""
+    ref_kpis, ref_tables, _ = reference
+    problems = [f"{name}: missing" for name in required if name not in tables]
+    for name, value in kpis.items():
+        if name in ref_kpis and not math.isclose(float(value), float(ref_kpis[name]),
+                                                 rel_tol=KPI_TOLERANCE, abs_tol=KPI_TOLERANCE):
+            problems.append(f"KPI {name}: {value!r}, expected {ref_kpis[name]!r}")
+    for name, table in tables.items():
+        if name not in ref_tables:
+            continue
+        expected = ref_tables[name]
+        if name == 'rfm':
+            # One row per customer; the order is not part of the result
+            table, expected = table.sort_index(), expected.sort_index()
+        try:
+            pd.testing.assert_frame_equal(expected, table, check_dtype=False, check_categorical=False,
+                                          check_index_type=False, check_column_type=False, check_names=False,
+                                          check_exact=False, rtol=0, atol=CENT)
+        except AssertionError as e:
+            problems.append(f"{name}: {_first_line(e)}")
+    return problems
+
+
+def check_stream(reference, path, chunksize):
+    statistics = ReportStatistics()
+    kpis, tables = stream_tables(path, chunksize=chunksize, statistics=statistics)
+    tables['correlation_matrix'] = statistics.correlation()
+    rankings, _ = stream_rankings(path, chunksize=chunksize)
+    return differences(reference, kpis, {**tables, **rankings},
+                       ['region_analysis', 'segment_analysis', 'yearly_perf', *RANKINGS])
+
+
+def check_parallel(reference, path, partitions, workers, cache_dir):
+    problems = []
+    for split, source in [('rows', path), ('date', path), ('file', partitions)]:
+        for count in workers:
+            kpis, tables, _ = parallel_report(source, split=split, workers=count, cache_dir=cache_dir)
+            problems += [f"{split} x {count}: {problem}" for problem in
+                         differences(reference, kpis, tables, ['region_analysis', 'rfm', *RANKINGS])]
+    return problems
+
+
+def check_append(reference, batches, state_dir, seed):
+    order = np.random.default_rng(seed).permutation(len(batches))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for position in order:
+            kpis, tables, _ = append_batch(batches[position], state_dir=state_dir)
+    problems = differences(reference, kpis, tables, ['region_analysis', 'monthly_data', 'rfm', 'period_windows'])
+    try:
+        append_batch(batches[order[0]], state_dir=state_dir)
+        problems.append(f"re-appending '{batches[order[0]]}' was accepted")
+    except ValueError:
+        pass
+    return problems
+
+
+def window_differences(df, buckets, dates):
+    """Windows of ``buckets`` ending on ``dates`` that differ from a direct sum of ``df``."""
+    problems = []
+    for as_of in dates:
+        for window, (start, end) in buckets.window_bounds(as_of).items():
+            rows = df[(df['Order Date'] >= start) & (df['Order Date'] <= end)]
+            direct = rows.groupby(BUCKET_DIMENSIONS, observed=True)[BUCKET_MEASURES].sum()
+            direct = direct.reindex(buckets.keys, fill_value=0.0)
+            if not np.allclose(buckets.total(start, end).to_numpy(), direct.to_numpy(), rtol=1e-9, atol=1e-6):
+                problems.append(f"{window} window ending {as_of:%Y-%m-%d}")
+    return problems
+
+
+def check_buckets(df, seed):
+    rng = np.random.default_rng(seed)
+    built = TimeBuckets.build(df)
+    updated = TimeBuckets()
+    months = df['Order Date'].dt.to_period('M')
+    for month in rng.permutation(months.unique()):
+        updated.update(df[months == month])
+    dates = [built.dates[0], built.dates[-1], *rng.choice(built.dates, WINDOW_DATES)]
+    problems = [f"built: {problem}" for problem in window_differences(df, built, dates)]
+    problems += [f"updated: {problem}" for problem in window_differences(df, updated, dates)]
+    return problems
+
+
+def check_sketches(df, shards):
+    slices = np.array_split(np.arange(len(df)), shards)
+    problems = []
+    for column in ['Order ID', 'Customer ID']:
+        merged = HyperLogLog()
+        for rows in slices:
+            merged.merge(HyperLogLog().update(df[column].iloc[rows]))
+        if not np.array_equal(merged.registers, HyperLogLog().update(df[column]).registers):
+            problems.append(f"HyperLogLog of {column}: merged registers differ from one pass")
+
+    margins = df['Profit Margin']
+    merged = QuantileSketch()
+    for rows in slices:
+        merged.merge(QuantileSketch().update(margins.iloc[rows]))
+    quantiles = [0.01, 0.25, 0.5, 0.75, 0.99]
+    if not np.array_equal(merged.quantiles(quantiles), QuantileSketch().update(margins).quantiles(quantiles)):
+        problems.append("QuantileSketch: merged quantiles differ from one pass")
+
+    columns = ['Sales', 'Quantity', 'Discount', 'Profit']
+    merged = CoMoments(columns)
+    for rows in slices:
+        merged.merge(CoMoments(columns).update(df.iloc[rows]))
+    if not np.allclose(merged.corr().to_numpy(), df[columns].corr().to_numpy(), rtol=1e-9, atol=1e-12):
+        problems.append("CoMoments: merged correlations differ from DataFrame.corr()")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that every report mode gives the in-memory tables.')
+    parser.add_argument('--input', default=DATA_FILE, help='Superstore CSV (default: %(default)s)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='rows per chunk of the streaming check (default: %(default)s)')
+    parser.add_argument('--workers', type=lambda value: [int(count) for count in value.split(',')],
+                        default=DEFAULT_WORKERS, help='comma-separated worker counts of the parallel check '
+                                                      '(default: 1,3)')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS,
+                        help='slices the sketches are built on and merged from (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help='seed of the batch order and window dates (default: %(default)s)')
+    options = parser.parse_args(argv)
+    path = os.path.abspath(options.input)
+
+    with tempfile.TemporaryDirectory(prefix='parity_') as scratch:
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            reference = reference_report(path)
+            df = reference[2]
+            partitions = os.path.join(scratch, 'partitions')
+            write_partitions(path, partitions, layout='monthly')
+            batches = sorted(glob.glob(os.path.join(partitions, '*.csv')))
+            print(f"Reference: in-memory report on '{options.input}' ({len(df):,} rows, "
+                  f"{len(batches)} monthly batches)")
+            checks = [
+                ('stream', lambda: check_stream(reference, path, options.chunksize)),
+                ('parallel', lambda: check_parallel(reference, path, partitions, options.workers,
+                                                    os.path.join(scratch, 'cache'))),
+                ('append', lambda: check_append(reference, batches, os.path.join(scratch, 'state'), options.seed)),
+                ('buckets', lambda: check_buckets(df, options.seed)),
+                ('sketches', lambda: check_sketches(df, options.shards)),
+            ]
+            failed = 0
+            for name, check in checks:
+                problems = check()
+                if problems:
+                    failed += 1
+                    print(f"✗ {name}: {len(problems)} difference(s)")
+                    for problem in problems[:10]:
+                        print(f"  - {problem}")
+                else:
+                    print(f"✓ {name}: matches")
+        finally:
+            os.chdir(cwd)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
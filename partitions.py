@@ -0,0 +1,242 @@
+"""
+PARTITIONED DATASETS AND PARTITION PRUNING
+==========================================
+Reads the Superstore data from many CSVs instead of one: a directory (e.g.
+one file per month, or a Hive-style ``year=2017/month=03/`` tree) or a glob
+of files.
+
+A small manifest (``_manifest.json`` in the dataset's root directory) keeps,
+per partition, its size and modification time, content digest, row count
+and first and last Order Date. A run with a date window (--start-date /
+--end-date) reads only the partitions whose date range overlaps it; the
+others are skipped from the manifest without being opened. A partition
+missing from the manifest, or changed since, is scanned once (its Order Date
+column only) to fill in its entry, except when its ``year=``/``month=``
+directories already place it outside the window.
+
+The selected partitions are read in date order and concatenated, with
+categorical columns recoded to the sorted union of their categories, so the
+frame matches one read from a single CSV of the same rows (up to row order,
+which can move a float total by its last digits).
+
+    python partitions.py data/                                  # refresh and show the manifest
+    python partitions.py data/ --from Sample_Superstore.csv     # write one partition per month
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+from data_cache import digests_key, file_digest
+from superstore_data import CSV_ENCODING, date_codes, load_superstore, load_superstore_untyped
+
+MANIFEST_FILE = '_manifest.json'
+MANIFEST_FORMAT = 1
+LAYOUTS = ['hive', 'monthly']
+HIVE_KEY = re.compile(r'^(year|month)=(\d+)$', re.IGNORECASE)
+
+
+def is_partitioned(path):
+    """Whether ``path`` names a partitioned dataset (a directory or a glob)."""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def hive_range(path):
+    """First and last day implied by the ``year=``/``month=`` directories of a
+    partition's path, or None without a year key."""
+    keys = {}
+    for part in path.replace(os.sep, '/').split('/')[:-1]:
+        match = HIVE_KEY.match(part)
+        if match:
+            keys[match.group(1).lower()] = int(match.group(2))
+    if 'year' not in keys:
+        return None
+    if 'month' in keys:
+        first = pd.Timestamp(keys['year'], keys['month'], 1)
+        return first, first + pd.offsets.MonthEnd(0)
+    return pd.Timestamp(keys['year'], 1, 1), pd.Timestamp(keys['year'], 12, 31)
+
+
+def _overlaps(first, last, start, end):
+    return not ((start is not None and last < start) or (end is not None and first > end))
+
+
+class PartitionedDataset:
+    """The partitions of a directory or glob of Superstore CSVs, with their manifest."""
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            self.root = path
+            files = glob.glob(os.path.join(path, '**', '*.csv'), recursive=True)
+        else:
+            files = glob.glob(path, recursive=True)
+            self.root = os.path.commonpath([os.path.dirname(os.path.abspath(file)) for file in files]) \
+                if files else os.path.dirname(path)
+        if not files:
+            raise ValueError(f"No CSV partitions found in '{path}'")
+        self.files = sorted(os.path.relpath(file, self.root) for file in files)
+        self.manifest_path = os.path.join(self.root, MANIFEST_FILE)
+        self.entries = self._read_manifest()
+        self.scanned = 0
+        self.changed = False
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('format') != MANIFEST_FORMAT:
+            return {}
+        return manifest['partitions']
+
+    def entry(self, relative):
+        """The manifest entry of a partition, scanning it if new or changed."""
+        stat = os.stat(os.path.join(self.root, relative))
+        entry = self.entries.get(relative)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry
+        path = os.path.join(self.root, relative)
+        dates = pd.read_csv(path, encoding=CSV_ENCODING, usecols=['Order Date'], dtype=str)['Order Date']
+        _, distinct = date_codes(dates)
+        distinct = distinct.dropna()
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_digest(path),
+                 'rows': len(dates),
+                 'first': f'{distinct.min():%Y-%m-%d}' if len(distinct) else None,
+                 'last': f'{distinct.max():%Y-%m-%d}' if len(distinct) else None}
+        self.entries[relative] = entry
+        self.scanned += 1
+        self.changed = True
+        return entry
+
+    def select(self, start=None, end=None):
+        """Partitions with orders between ``start`` and ``end`` (inclusive, either
+        may be None), in date order, as manifest entries with their ``path``.
+
+        Returns ``(partitions, pruned)``; ``pruned`` counts the partitions
+        skipped on their directory keys and on their manifest entry.
+        """
+        partitions, pruned = [], {'directory': 0, 'manifest': 0}
+        for relative in self.files:
+            hint = hive_range(os.path.join(self.root, relative)) if relative not in self.entries else None
+            if hint and not _overlaps(*hint, start, end):
+                pruned['directory'] += 1
+                continue
+            entry = self.entry(relative)
+            if entry['first'] is None or not _overlaps(pd.Timestamp(entry['first']), pd.Timestamp(entry['last']),
+                                                       start, end):
+                pruned['manifest'] += 1
+                continue
+            partitions.append({**entry, 'path': os.path.join(self.root, relative)})
+        # Drop entries of partitions that no longer exist
+        stale = set(self.entries) - set(self.files)
+        for relative in stale:
+            del self.entries[relative]
+        self.changed = self.changed or bool(stale)
+        self.save()
+        partitions.sort(key=lambda partition: (partition['first'], partition['path']))
+        return partitions, pruned
+
+    def save(self):
+        """Write the manifest if it changed (best effort: a read-only dataset
+        is scanned again next time)."""
+        if not self.changed:
+            return
+        staging = self.manifest_path + '.tmp'
+        try:
+            with open(staging, 'w') as handle:
+                json.dump({'format': MANIFEST_FORMAT, 'partitions': dict(sorted(self.entries.items()))},
+                          handle, indent=1)
+            os.replace(staging, self.manifest_path)
+            self.changed = False
+        except OSError:
+            pass
+
+    def table(self):
+        """The manifest as a frame, one row per partition."""
+        for relative in self.files:
+            self.entry(relative)
+        self.save()
+        table = pd.DataFrame.from_dict({relative: self.entries[relative] for relative in self.files},
+                                       orient='index')
+        return table[['rows', 'first', 'last', 'size']].rename_axis('partition')
+
+
+def concat_partitions(frames):
+    """Concatenate partition frames, recoding categorical columns to the sorted
+    union of their categories (a plain concat turns them into strings)."""
+    frames = list(frames)
+    combined = pd.concat(frames, ignore_index=True)
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            combined[column] = pd.api.types.union_categoricals(
+                [frame[column] for frame in frames], sort_categories=True)
+    return combined
+
+
+def load_partitions(partitions, columns=None):
+    """Read and concatenate the selected partitions with the typed load schema."""
+    return concat_partitions(load_superstore(partition['path'], columns) for partition in partitions)
+
+
+def load_partitions_untyped(partitions):
+    """Read the selected partitions with pandas' default dtypes (for memory comparisons)."""
+    return pd.concat([load_superstore_untyped(partition['path']) for partition in partitions],
+                     ignore_index=True)
+
+
+def partitions_key(partitions, *logic, columns=None):
+    """Cleaned-data cache key of a partition selection (see data_cache.cache_key)."""
+    return digests_key([partition['sha256'] for partition in partitions], *logic, columns=columns)
+
+
+def write_partitions(csv_path, root, layout='hive'):
+    """Split a Superstore CSV into one partition per Order Date month under ``root``:
+    ``year=YYYY/month=MM/part-0.csv`` ('hive') or ``YYYY-MM.csv`` ('monthly').
+    Fields are copied as text, unchanged. Returns the number of partitions."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'; choose from {', '.join(LAYOUTS)}")
+    raw = pd.read_csv(csv_path, encoding=CSV_ENCODING, dtype=str, keep_default_na=False)
+    codes, dates = date_codes(raw['Order Date'])
+    months = dates.to_period('M').take(codes)
+    for month, rows in raw.groupby(months, sort=True):
+        if layout == 'hive':
+            path = os.path.join(root, f'year={month.year}', f'month={month.month:02d}', 'part-0.csv')
+        else:
+            path = os.path.join(root, f'{month.year}-{month.month:02d}.csv')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows.to_csv(path, index=False, encoding=CSV_ENCODING)
+    return months.nunique()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the manifest of a partitioned Superstore dataset.')
+    parser.add_argument('dataset', help='directory or glob of partition CSVs')
+    parser.add_argument('--from', dest='source', metavar='CSV',
+                        help='first split this CSV into monthly partitions under the dataset directory')
+    parser.add_argument('--layout', choices=LAYOUTS, default='hive',
+                        help='partition layout for --from (default: %(default)s)')
+    options = parser.parse_args(argv)
+
+    try:
+        if options.source:
+            count = write_partitions(options.source, options.dataset, options.layout)
+            print(f"✓ Wrote {count} monthly partitions of '{options.source}' to '{options.dataset}'")
+        dataset = PartitionedDataset(options.dataset)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 2
+    table = dataset.table()
+    print(f"✓ {len(table)} partitions, {table['rows'].sum():,} rows "
+          f"({dataset.scanned} scanned, manifest '{dataset.manifest_path}')")
+    print(table.to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+REPORT SECTION PIPELINE
+=======================
+Runs the analysis as named sections with declared dependencies instead of
+one top-to-bottom script.
+
+A section is a function registered in a SectionRegistry together with the
+names of the sections whose results it needs. A Pipeline resolves the
+requested targets to the sections they depend on, runs each one at most
+once in registration order and memoizes its result, so asking for a single
+target only pays for its own dependency chain.
+"""
+
+
+class Section:
+    """A registered report section: ``func(pipeline, *dependency_results)``."""
+
+    def __init__(self, name, func, requires):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+
+class SectionRegistry(dict):
+    """Ordered mapping of section name -> Section, filled by ``section``."""
+
+    def section(self, name, requires=()):
+        """Decorator registering ``func`` as section ``name``."""
+        def register(func):
+            self[name] = Section(name, func, requires)
+            return func
+        return register
+
+
+class Pipeline:
+    """One run over a SectionRegistry, memoizing section results.
+
+    ``options`` is passed through to the sections (the parsed command line
+    for the report script); ``state`` is scratch space shared by the
+    sections of this run.
+    """
+
+    def __init__(self, sections, options=None):
+        self.sections = sections
+        self.options = options
+        self.results = {}
+        self.state = {}
+        # Sections of the current run(), e.g. for loading only the columns they read
+        self.planned = None
+
+    def plan(self, targets=None):
+        """Sections needed for ``targets`` (every section by default), in run order."""
+        targets = list(self.sections) if targets is None else list(targets)
+        unknown = [name for name in targets if name not in self.sections]
+        if unknown:
+            raise ValueError(f"Unknown section(s) {', '.join(unknown)}; "
+                             f"choose from {', '.join(self.sections)}")
+        needed, visiting = set(), set()
+
+        def visit(name):
+            if name in needed:
+                return
+            if name in visiting:
+                raise ValueError(f"Section dependency cycle through '{name}'")
+            visiting.add(name)
+            for dependency in self.sections[name].requires:
+                visit(dependency)
+            visiting.discard(name)
+            needed.add(name)
+
+        for name in targets:
+            visit(name)
+        return [name for name in self.sections if name in needed]
+
+    def get(self, name):
+        """Result of section ``name``, running it (and its dependencies) if needed."""
+        if name not in self.results:
+            section = self.sections[name]
+            inputs = [self.get(dependency) for dependency in section.requires]
+            self.results[name] = self.execute(section, inputs)
+        return self.results[name]
+
+    def execute(self, section, inputs):
+        """Run one section on its dependencies' results.
+
+        Dependencies are resolved before this is called, so subclasses can
+        override it to measure each section on its own.
+        """
+        return section.func(self, *inputs)
+
+    def run(self, targets=None):
+        """Run the sections behind ``targets``; returns their results by name."""
+        self.planned = self.plan(targets)
+        for name in self.planned:
+            self.get(name)
+        return {name: self.results[name] for name in (targets or self.sections)}
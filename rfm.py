@@ -0,0 +1,186 @@
+"""
+RFM SCORING
+===========
+Recency/frequency/monetary scores per customer from precomputed quartile
+edges.
+
+The per-customer measures come from the aggregation engine's built-in
+reductions (last order date, distinct orders, summed sales), so no Python
+code runs per customer. ``RFMScorer.fit`` computes each measure's quartile
+edges once. Scoring is then a binary search of every customer against three
+edges. This gives the same scores as the report's former ``pd.qcut`` calls:
+recency 4 (most recent) to 1, frequency and monetary 1 to 4, with values
+on an edge falling in the lower quartile. Frequency was cut on first-come
+ranks to spread tied order counts evenly, and that is kept for the fitted
+customers.
+
+The edges (and the reference date recency is measured from) can be saved
+as JSON and used to score new customers without revisiting the history:
+
+    python rfm.py --edges rfm_edges.json --input new_orders.csv
+
+A new customer has no rank in the fitted population, so their frequency is
+compared with the order-count edges instead (a tie with an edge scores low).
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from superstore_data import load_superstore, parse_dates
+
+RFM_QUANTILES = [0.25, 0.5, 0.75]
+RFM_EDGES_FILE = 'rfm_edges.json'
+RFM_COLUMNS = ['Recency (days)', 'Frequency (orders)', 'Monetary (sales)']
+# Score labels by quartile, lowest values first
+SCORE_LABELS = {'Recency Score': [4, 3, 2, 1], 'Frequency Score': [1, 2, 3, 4], 'Monetary Score': [1, 2, 3, 4]}
+
+
+def rfm_measures(base, reference_date=None):
+    """Recency, frequency and monetary value per customer.
+
+    ``base`` holds the 'rfm' metrics (last order date, distinct orders,
+    sales) per customer. Recency is measured from the day after the latest
+    order unless ``reference_date`` is given. Returns ``(measures,
+    reference_date)``.
+    """
+    last_order = base[('Order Date', 'max')]
+    if reference_date is None:
+        reference_date = last_order.max() + pd.Timedelta(days=1)
+    measures = pd.DataFrame({
+        'Recency (days)': (reference_date - last_order).dt.days,
+        'Frequency (orders)': base[('Order ID', 'nunique')],
+        'Monetary (sales)': base[('Sales', 'sum')],
+    }).round(2)
+    return measures, reference_date
+
+
+def _scores(codes, labels):
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+class RFMScorer:
+    """Quartile edges of the RFM measures and the date recency counts from.
+
+    ``frequency_rank_edges`` are the edges of first-come ranks in the fitted
+    population of ``customers`` customers.
+    """
+
+    def __init__(self, edges, reference_date, customers):
+        self.edges = {column: np.asarray(values, dtype=float) for column, values in edges.items()}
+        self.reference_date = pd.Timestamp(reference_date)
+        self.customers = customers
+        self.frequency_rank_edges = np.quantile(np.arange(1, customers + 1), RFM_QUANTILES)
+
+    @classmethod
+    def fit(cls, measures, reference_date):
+        """Edges of ``measures`` (from ``rfm_measures``)."""
+        edges = {column: np.quantile(measures[column].to_numpy(dtype=float), RFM_QUANTILES)
+                 for column in RFM_COLUMNS}
+        return cls(edges, reference_date, len(measures))
+
+    @classmethod
+    def fit_sketches(cls, sketches, reference_date, customers):
+        """Edges from one ``sketches.QuantileSketch`` per measure in RFM_COLUMNS,
+        e.g. merged from shards of the customers. Each edge is within the
+        sketches' relative error of the exact one."""
+        edges = {column: sketches[column].quantiles(RFM_QUANTILES) for column in RFM_COLUMNS}
+        return cls(edges, reference_date, customers)
+
+    def score(self, measures, fitted=False):
+        """``measures`` with the three scores and their sum (the RFM Score).
+
+        ``fitted=True`` means ``measures`` is the population the edges were
+        fitted on, so frequency is scored by rank as the report always has.
+        """
+        recency = np.searchsorted(self.edges['Recency (days)'], measures['Recency (days)'].to_numpy())
+        if fitted:
+            ranks = measures['Frequency (orders)'].rank(method='first').to_numpy()
+            frequency = np.searchsorted(self.frequency_rank_edges, ranks)
+        else:
+            frequency = np.searchsorted(self.edges['Frequency (orders)'], measures['Frequency (orders)'].to_numpy())
+        monetary = np.searchsorted(self.edges['Monetary (sales)'], measures['Monetary (sales)'].to_numpy())
+
+        scored = measures.copy()
+        for column, codes in (('Recency Score', recency), ('Frequency Score', frequency),
+                              ('Monetary Score', monetary)):
+            scored[column] = pd.Series(_scores(codes, SCORE_LABELS[column]), index=scored.index)
+        scored['RFM Score'] = (np.asarray(SCORE_LABELS['Recency Score'])[recency] + frequency + monetary + 2)
+        return scored
+
+    def save(self, path=RFM_EDGES_FILE):
+        with open(path, 'w') as handle:
+            json.dump({'quantiles': RFM_QUANTILES,
+                       'reference_date': self.reference_date.strftime('%Y-%m-%d'),
+                       'customers': self.customers,
+                       'edges': {column: values.tolist() for column, values in self.edges.items()}},
+                      handle, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path=RFM_EDGES_FILE):
+        with open(path) as handle:
+            state = json.load(handle)
+        if state['quantiles'] != RFM_QUANTILES:
+            raise ValueError(f"RFM edges in '{path}' were fitted on quantiles {state['quantiles']}")
+        return cls(state['edges'], state['reference_date'], state['customers'])
+
+
+def customer_names(df):
+    """First name seen for each Customer ID."""
+    return df.groupby('Customer ID', observed=True, sort=False)['Customer Name'].first()
+
+
+def rfm_table(base, names, reference_date=None):
+    """Scored RFM table, one row per customer, with the customer's name.
+
+    ``names`` maps Customer ID to Customer Name (see ``customer_names``).
+    Returns ``(table, scorer)``; the scorer holds the fitted edges.
+    """
+    measures, reference_date = rfm_measures(base, reference_date)
+    scorer = RFMScorer.fit(measures, reference_date)
+    table = scorer.score(measures, fitted=True)
+    table['Customer Name'] = names.reindex(table.index).array
+    return table.reset_index(), scorer
+
+
+def score_customers(df, scorer, reference_date=None):
+    """Score the customers in ``df`` (raw order rows) against saved edges.
+
+    Recency counts from ``reference_date``, by default the fitted one.
+    """
+    base = df.groupby('Customer ID', observed=True).agg(
+        {'Order Date': ['max'], 'Order ID': ['nunique'], 'Sales': ['sum']})
+    measures, _ = rfm_measures(base, scorer.reference_date if reference_date is None else reference_date)
+    table = scorer.score(measures)
+    table['Customer Name'] = customer_names(df).reindex(table.index).array
+    return table.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score customers against saved RFM edges.')
+    parser.add_argument('--input', required=True, help='Superstore-format CSV of the orders to score')
+    parser.add_argument('--edges', default=RFM_EDGES_FILE,
+                        help='edges saved by sales_analysis.py --rfm-edges (default: %(default)s)')
+    parser.add_argument('--reference-date', help='date recency is counted from (default: the saved one)')
+    parser.add_argument('--output', help='write the scored customers to this CSV')
+    options = parser.parse_args(argv)
+
+    scorer = RFMScorer.load(options.edges)
+    df = load_superstore(options.input, columns=['Order ID', 'Order Date', 'Customer ID', 'Customer Name', 'Sales'])
+    df['Order Date'] = parse_dates(df['Order Date'])
+    reference_date = pd.Timestamp(options.reference_date) if options.reference_date else None
+    scored = score_customers(df, scorer, reference_date)
+    pd.set_option('display.width', None)
+    print(f"✓ Scored {len(scored):,} customers against '{options.edges}' "
+          f"(recency from {(reference_date or scorer.reference_date):%Y-%m-%d})")
+    print(scored.sort_values('RFM Score', ascending=False).head(20))
+    if options.output:
+        scored.to_csv(options.output, index=False)
+        print(f"✓ Scores written to '{options.output}'")
+
+
+if __name__ == '__main__':
+    main()
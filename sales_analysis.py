@@ -4,6 +4,14 @@ SALES PERFORMANCE DASHBOARD - PYTHON ANALYSIS SCRIPT
 This script performs comprehensive data analysis on the Superstore dataset
 using Pandas, NumPy, and creates visualizations using Matplotlib and Seaborn.
 
+The report is a set of named sections with declared dependencies (see
+pipeline.py). Running the script runs every section in order; ``--only``
+runs just the listed sections and whatever they depend on, e.g.
+``--only kpis,rfm``. Importing the module runs nothing:
+
+    from sales_analysis import build_pipeline
+    results = build_pipeline().run(['kpis'])
+
 Requirements:
 - pandas
 - numpy
@@ -13,124 +21,530 @@ Requirements:
 - openpyxl (for Excel export)
 """
 
+import argparse
+import contextlib
+import os
+import sys
+import time
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import warnings
 from datetime import datetime, timedelta
 
-warnings.filterwarnings('ignore')
+import dedup
+import superstore_data
+from aggregates import (CORRELATION_COLUMNS, REPORT_AGGREGATIONS, AggregationEngine, ReportStatistics,
+                        count_distinct, distinct_count_report, region_table, category_table, segment_table, yearly_table, shipping_table,
+                        discount_table, customer_sales_table, product_sales_table, product_profit_table,
+                        loss_products_table)
+from data_cache import CACHE_DIR, cache_key, cache_slot, load_cached_frame, store_cached_frame
+from dedup import DEDUP_POLICIES, DEFAULT_POLICY
+from export import EXPORT_BACKENDS, WINDOW_SHEETS, compare_backends, export_tables, summary_frame
+from incremental import STATE_DIR, append_batch
+from instrumentation import InstrumentedPipeline, write_metrics
+from olap_cube import CUBE_COLUMNS, SalesCube, load_or_build_cube
+from parallel import DEFAULT_WORKERS, SPLITS, parallel_report
+from partitions import (PartitionedDataset, is_partitioned, load_partitions, load_partitions_untyped,
+                        partitions_key)
+from pipeline import Pipeline, SectionRegistry
+from rfm import customer_names, rfm_table
+from sketches import DEFAULT_HLL_ERROR, CoMoments
+from slicing import FILTER_DIMENSIONS, load_or_build_index
+from sql_backend import (DATABASE_FILE, DEFAULT_SQL_WORKERS, build_database, parity_report, parse_catalogue,
+                         run_catalogue)
+from star_schema import STAR_DIR, compare_with_csv, export_star_schema, print_export
+from streaming import DEFAULT_CHUNKSIZE, stream_rankings, stream_tables
+from superstore_data import (DATA_FILE, load_superstore, load_superstore_untyped, clean_superstore,
+                             frame_memory, report_columns)
+from time_buckets import load_or_build_buckets
+from topk import top_k
+
+# Report sections in run order; see build_pipeline()
+SECTIONS = SectionRegistry()
+section = SECTIONS.section
+
+# Sections that import the plotting stack, skipped by --tables-only
+PLOTTING_SECTIONS = {'charts'}
+
+
+def comma_list(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def build_parser():
+    """Command-line options of the report script."""
+    parser = argparse.ArgumentParser(description='Sales performance analysis of the Superstore dataset.')
+    parser.add_argument('--input', default=DATA_FILE,
+                        help='Superstore CSV file to analyze, or a directory or glob of partition CSVs '
+                             '(see partitions.py)')
+    parser.add_argument('--only', type=comma_list,
+                        help='comma-separated report sections to run (with their dependencies); '
+                             f"one or more of: {', '.join(SECTIONS)}")
+    parser.add_argument('--start-date', type=pd.Timestamp, metavar='YYYY-MM-DD',
+                        help='analyze only orders placed on or after this date')
+    parser.add_argument('--end-date', type=pd.Timestamp, metavar='YYYY-MM-DD',
+                        help='analyze only orders placed on or before this date')
+    for dimension in FILTER_DIMENSIONS:
+        parser.add_argument(f'--{dimension.lower()}', type=comma_list, metavar='NAME[,NAME...]',
+                            help=f'analyze only these {dimension.lower()} values (comma-separated)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='directory for the cleaned-data cache (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse and clean the CSV; do not read or write the cache')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='also load the CSV untyped and compare memory with the typed schema')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the CSV in chunks and build only the section 3-10 summary tables '
+                             'and the correlation matrix')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='rows per chunk in --stream mode and per insert batch in --sql mode '
+                             '(default: %(default)s)')
+    parser.add_argument('--rankings', action='store_true',
+                        help='in --stream mode, also rank the top products and customers '
+                             '(a second pass over the candidate groups)')
+    parser.add_argument('--parallel', action='store_true',
+                        help='build the section 3-11 summary tables with a pool of worker processes '
+                             '(map-reduce over pieces of the input)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='worker processes for --parallel (default: %(default)s)')
+    parser.add_argument('--split', choices=SPLITS, default='rows',
+                        help="how --parallel splits the input: 'file' (a directory or glob of CSVs), "
+                             "'rows' (byte ranges of one CSV) or 'date' (Order Date months of the "
+                             "cleaned-data cache) (default: %(default)s)")
+    parser.add_argument('--append', action='store_true',
+                        help='fold --input (a batch of new orders) into the persisted aggregate state '
+                             'and rebuild the summary tables without re-reading history')
+    parser.add_argument('--state-dir', default=STATE_DIR,
+                        help='directory of the persisted aggregate state for --append (default: %(default)s)')
+    parser.add_argument('--no-cube', action='store_true',
+                        help='group the rows directly instead of rolling up the OLAP cube')
+    parser.add_argument('--dedup-policy', choices=list(DEDUP_POLICIES), default=DEFAULT_POLICY,
+                        help='how --append recognises rows it has already ingested: by Row ID, by a '
+                             'hash of the whole row, or by (Order ID, Product ID) (default: %(default)s)')
+    parser.add_argument('--dedup-bloom', action='store_true',
+                        help='keep the --append seen-row keys in a Bloom filter (2-4 bytes per row) '
+                             'instead of an exact hash set (8 bytes per row)')
+    parser.add_argument('--approx-distinct', action='store_true',
+                        help='estimate distinct order/customer counts with HyperLogLog sketches '
+                             '(per-customer and per-product counts stay exact)')
+    parser.add_argument('--distinct-error', type=float, default=DEFAULT_HLL_ERROR,
+                        help='target relative standard error for --approx-distinct (default: %(default)s)')
+    parser.add_argument('--chart-workers', type=int, default=None,
+                        help='processes rendering the section 14 charts in parallel '
+                             '(default: number of CPUs, up to 8)')
+    parser.add_argument('--no-chart-cache', action='store_true',
+                        help='re-render every chart even if its inputs are unchanged')
+    parser.add_argument('--export-format', choices=list(EXPORT_BACKENDS), default='xlsx',
+                        help='export backend: openpyxl workbook (xlsx), write-only constant-memory '
+                             'workbook (xlsx-stream), or one Parquet/CSV file per table written in '
+                             'parallel (default: %(default)s)')
+    parser.add_argument('--export-path',
+                        help='workbook file or output directory (default depends on --export-format)')
+    parser.add_argument('--export-compare', action='store_true',
+                        help='also time every export backend on the same tables and print a comparison')
+    parser.add_argument('--window-sheets', action='store_true',
+                        help="also export the rolling/period-to-date windows as the 'Sales Windows' sheets")
+    parser.add_argument('--tables-only', action='store_true',
+                        help='headless run: skip the charts and never import matplotlib/seaborn')
+    parser.add_argument('--sql', action='store_true',
+                        help='load the CSV into SQLite and run the sales_analysis_queries.sql catalogue')
+    parser.add_argument('--sql-db', default=DATABASE_FILE,
+                        help='SQLite database file for --sql (default: %(default)s)')
+    parser.add_argument('--sql-workers', type=int, default=DEFAULT_SQL_WORKERS,
+                        help='queries run concurrently on separate read connections (default: %(default)s)')
+    parser.add_argument('--sql-rebuild', action='store_true',
+                        help='reload the database even if it was built from the same CSV')
+    parser.add_argument('--no-sql-check', action='store_true',
+                        help='skip the parity check of the SQL results against the pandas tables')
+    parser.add_argument('--star-schema', action='store_true',
+                        help='append the rows of --input not exported yet to a star schema of Parquet '
+                             'fact and dimension tables for Power BI')
+    parser.add_argument('--star-dir', default=STAR_DIR,
+                        help='star-schema directory for --star-schema (default: %(default)s)')
+    parser.add_argument('--rfm-edges', metavar='PATH',
+                        help='save the RFM quartile edges to PATH for scoring new customers with rfm.py')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='record per-section time, CPU, memory and row counts to PATH '
+                             '(Prometheus textfile if it ends in .prom, JSON otherwise)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --metrics, also trace the Python heap per section (slower)')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='write a cProfile dump per section to DIR (implies instrumentation)')
+    return parser
+
+
+def report_filters(options):
+    """Dimension filters of the run (dimension -> values)."""
+    return {dimension: getattr(options, dimension.lower()) for dimension in FILTER_DIMENSIONS
+            if getattr(options, dimension.lower())}
+
+
+def is_filtered(options):
+    return bool(options.start_date or options.end_date or report_filters(options))
+
+
+def describe_filters(options):
+    """The run's filters as 'name=value' text."""
+    parts = [f"{dimension}={','.join(values)}" for dimension, values in report_filters(options).items()]
+    if options.end_date:
+        parts.insert(0, f'Order Date<={options.end_date:%Y-%m-%d}')
+    if options.start_date:
+        parts.insert(0, f'Order Date>={options.start_date:%Y-%m-%d}')
+    return ', '.join(parts)
+
+
+def approx_error(options):
+    """Target HyperLogLog error, or None for exact distinct counts."""
+    return options.distinct_error if options.approx_distinct else None
+
+
+def heading(pipeline, title, rule='='):
+    """Print a section heading once per run, however many sections share it."""
+    printed = pipeline.state.setdefault('headings', set())
+    if title not in printed:
+        printed.add(title)
+        print(f"\n{title}")
+        print(rule * 70)
 
-# Set display options
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', None)
-pd.set_option('display.max_colwidth', 50)
 
-# Set visualization style
-plt.style.use('seaborn-v0_8-whitegrid')
-sns.set_palette("husl")
+# ==========================================
+# STREAMING, PARALLEL AND APPEND MODES
+# ==========================================
+# None of these modes holds the full history in one frame: rows are folded
+# into mergeable partial aggregates, either chunk by chunk (--stream), per
+# piece in worker processes (--parallel) or on top of the state persisted by
+# earlier runs (--append). Sections that need every row at once (charts, and
+# products and correlations in append mode) are skipped.
+
+def export_report(options, report_tables):
+    """Export the report tables with the chosen backend; returns the count written."""
+    if not options.window_sheets:
+        report_tables = {name: table for name, table in report_tables.items() if name not in WINDOW_SHEETS}
+    path, written = export_tables(report_tables, options.export_format, options.export_path)
+    unit = 'sheets' if options.export_format.startswith('xlsx') else f'{options.export_format} tables'
+    print(f"✓ Analysis exported to '{path}'")
+    print(f"  Contains {written} {unit} with comprehensive analysis")
+    if options.export_compare:
+        print("\nExport backend comparison (same tables):")
+        print(compare_backends(report_tables))
+    return written
+
+
+def emit_summary_report(options, kpis, tables):
+    """Print and export the KPIs and tables built from partial aggregates."""
+    print("Key Performance Indicators:")
+    for name, value in kpis.items():
+        print(f"  {name.replace('_', ' ').title():<22}{value:>18,.2f}")
+    tables = dict(tables)
+    if 'rfm' in tables:
+        tables['rfm_top20'] = top_k(tables.pop('rfm'), 20, 'Monetary (sales)')
+    for name, table in tables.items():
+        print(f"\n{name}:")
+        print(table.tail(12) if name == 'monthly_data' else table)
+    print()
+    export_report(options, {'summary': summary_frame(kpis), **tables})
+
+
+def run_stream(options):
+    print(f"STREAMING MODE - reading '{options.input}' in chunks of {options.chunksize:,} rows")
+    print("-" * 70)
+    statistics = ReportStatistics()
+    kpis, tables = stream_tables(options.input, chunksize=options.chunksize,
+                                 approx_error=approx_error(options), statistics=statistics)
+    tables['correlation_matrix'] = statistics.correlation()
+    margins = statistics.margin_summary()
+    print(f"✓ Streamed {kpis['total_rows']:,} rows")
+    print(f"  - Profit margin: mean {margins['mean']:.2f}%, median {margins['median']:.2f}% "
+          f"(within {statistics.margin_quantiles.relative_error:.0%}), "
+          f"{len(margins['counts'])}-bin histogram from {margins['edges'][0]:.0f}% to {margins['edges'][-1]:.0f}%")
+    if options.rankings:
+        rankings, candidates = stream_rankings(options.input, chunksize=options.chunksize)
+        tables = {**tables, **rankings}
+        for name, (kept, survivors) in candidates.items():
+            print(f"  - {name}: {kept:,} candidate groups kept, {survivors:,} aggregated exactly")
+    print()
+    emit_summary_report(options, kpis, tables)
+    return 0
+
+
+def run_parallel(options):
+    print(f"PARALLEL MODE - '{options.input}' split by {options.split} across {options.workers} worker(s)")
+    print("-" * 70)
+    try:
+        kpis, tables, stats = parallel_report(options.input, split=options.split, workers=options.workers,
+                                              approx_error=approx_error(options), cache_dir=options.cache_dir)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 2
+    print(f"✓ {stats['rows']:,} rows in {stats['pieces']} pieces on {stats['workers']} worker(s): "
+          f"{stats['wall_seconds']:.2f}s ({stats['busy_seconds']:.2f}s of worker time)")
+    print(f"  - Split {stats['plan_seconds']:.2f}s, map {stats['map_seconds']:.2f}s, "
+          f"merge {stats['reduce_seconds']:.2f}s")
+    if stats['rerun_pieces']:
+        print(f"  - {stats['rerun_pieces']} piece(s) re-run without rows repeated from earlier pieces")
+    print()
+    emit_summary_report(options, kpis, tables)
+    return 0
+
+
+def run_append(options):
+    print(f"APPEND MODE - folding '{options.input}' into the state in '{options.state_dir}'")
+    print("-" * 70)
+    try:
+        kpis, tables, state = append_batch(options.input, state_dir=options.state_dir,
+                                           approx_error=approx_error(options), policy=options.dedup_policy,
+                                           bloom=options.dedup_bloom)
+    except ValueError as e:
+        print(f"✗ Batch rejected: {e}")
+        return 1
+    print(f"✓ Appended {state['last_batch_rows']:,} rows "
+          f"(batch {state['batches']}, {state['rows']:,} rows in total)")
+    print(f"  - Seen-row keys ({state['dedup_policy']} policy): {state['seen_keys']:,} "
+          f"in {state['dedup_store_mb']:,.2f} MB")
+    print()
+    emit_summary_report(options, kpis, tables)
+    return 0
 
-print("="*70)
-print("SALES PERFORMANCE DASHBOARD - DATA ANALYSIS")
-print("="*70)
-print()
 
 # ==========================================
-# 1. LOAD AND EXPLORE DATA
+# STAR-SCHEMA EXPORT
 # ==========================================
+# Writes the cleaned rows as Parquet fact and dimension tables for Power BI
+# (see star_schema.py); later runs append only the rows not exported yet.
+
+def run_star(options):
+    print(f"STAR-SCHEMA EXPORT - appending '{options.input}' to '{options.star_dir}'")
+    print("-" * 70)
+    try:
+        stats = export_star_schema(options.input, options.star_dir)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 2
+    print_export(stats, options.star_dir)
+    if options.export_compare:
+        print("\nStar schema against the flat CSV (every table read with pandas):")
+        print(compare_with_csv(options.input, options.star_dir))
+    return 0
 
-print("1. LOADING DATA...")
-print("-" * 70)
 
-# Load the dataset
-df = pd.read_csv('Sample_Superstore.csv', encoding='latin-1')
+# ==========================================
+# SQL MODE
+# ==========================================
+# Runs the SQL catalogue against an indexed SQLite copy of the CSV, then
+# checks the queries that have a pandas counterpart against the report
+# sections (run silently) that build the same tables.
+
+PARITY_SECTIONS = ['kpis', 'regional', 'category', 'customer', 'time', 'shipping']
+
+
+def run_sql(options):
+    print(f"SQL MODE - running the query catalogue on '{options.sql_db}'")
+    print("-" * 70)
+    catalogue = parse_catalogue()
+    load = build_database(options.input, options.sql_db, catalogue, batch_size=options.chunksize,
+                          rebuild=options.sql_rebuild)
+    if load['reused']:
+        print(f"✓ Reusing database ({load['rows']:,} rows, built from the same CSV)")
+    else:
+        print(f"✓ Loaded {load['rows']:,} rows in {load['batches']} batches ({load['load_seconds']:.2f}s), "
+              f"built {len(catalogue['indexes'])} indexes ({load['index_seconds']:.2f}s)")
+
+    results, wall = run_catalogue(options.sql_db, catalogue, workers=options.sql_workers)
+    print(f"✓ Ran {len(results)} queries on {options.sql_workers} connection(s) in {wall:.2f}s")
+    print()
+    for number, (title, frame, seconds) in results.items():
+        print(f"Query {number}: {title} ({len(frame):,} rows, {seconds * 1000:.0f} ms)")
+        print(frame.head(10))
+        print()
+    if options.no_sql_check:
+        return 0
+
+    pipeline = build_pipeline(options)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sections = pipeline.run(PARITY_SECTIONS)
+    tables = {'kpis': sections['kpis'], 'region_analysis': sections['regional'],
+              'category_analysis': sections['category'], 'shipping_analysis': sections['shipping'],
+              **sections['customer'], **sections['time']}
+    report = parity_report(results, tables)
+    print("Parity with the pandas report:")
+    print(report)
+    if not report['Match'].all():
+        print(f"✗ {(~report['Match']).sum()} query result(s) differ from the pandas tables")
+        return 1
+    print(f"✓ All {len(report)} comparable queries match the pandas tables")
+    return 0
 
-print(f"✓ Data loaded successfully!")
-print(f"  - Total records: {len(df):,}")
-print(f"  - Total columns: {len(df.columns)}")
-print()
 
-# Display first few rows
-print("First 5 rows of data:")
-print(df.head())
-print()
+# ==========================================
+# 1. LOAD AND EXPLORE DATA
+# ==========================================
 
-# Display data info
-print("Dataset Information:")
-print(df.info())
-print()
+@section('load')
+def load_data(pipeline):
+    """Section 1: the loaded frame, cleaned already if it came from the cache."""
+    options = pipeline.options
+    print("1. LOADING DATA...")
+    print("-" * 70)
+
+    # A partitioned dataset is narrowed to the partitions that overlap the
+    # date window, from their manifest entries
+    partitions = None
+    if is_partitioned(options.input):
+        dataset = PartitionedDataset(options.input)
+        partitions, pruned = dataset.select(options.start_date, options.end_date)
+        if not partitions:
+            raise ValueError(f"No partitions of '{options.input}' overlap the date range")
+        print(f"✓ Reading {len(partitions)} of {len(dataset.files)} partitions "
+              f"({sum(partition['rows'] for partition in partitions):,} rows)")
+        if options.start_date or options.end_date:
+            print(f"  - Skipped {pruned['manifest']} by their manifest date range and "
+                  f"{pruned['directory']} by their year=/month= directories, without reading them")
+        if dataset.scanned:
+            print(f"  - Scanned {dataset.scanned} new or changed partitions into '{dataset.manifest_path}'")
+
+    # Parse only the raw columns the planned sections (and the filters) read.
+    # A narrower set than the full report's is cached under its own key (and slot).
+    columns = report_columns(pipeline.planned)
+    if is_filtered(options):
+        columns = sorted(set(columns) | set(FILTER_DIMENSIONS))
+    projection = None if columns == report_columns() else columns
+
+    # Load the dataset, reusing the cleaned columnar cache when the CSV (or the
+    # selected partitions) and the cleaning logic are unchanged since the last run
+    cache_hit, data_key, slot = False, None, None
+    if not options.no_cache:
+        if partitions is None:
+            data_key = cache_key(options.input, superstore_data, dedup, columns=projection)
+            slot = cache_slot([options.input], projection)
+        else:
+            data_key = partitions_key(partitions, superstore_data, dedup, columns=projection)
+            slot = cache_slot([partition['path'] for partition in partitions], projection)
+        df = load_cached_frame(options.cache_dir, data_key)
+        cache_hit = df is not None
+    if not cache_hit:
+        df = load_superstore(options.input, columns) if partitions is None else load_partitions(partitions, columns)
+
+    if cache_hit:
+        print(f"✓ Cleaned data loaded from cache ({options.cache_dir}/{data_key})")
+    else:
+        print(f"✓ Data loaded successfully!")
+    print(f"  - Total records: {len(df):,}")
+    print(f"  - Total columns: {len(df.columns)}")
+    print(f"  - Memory usage: {frame_memory(df) / 1e6:,.1f} MB")
+    if options.memory_report:
+        untyped = load_superstore_untyped(options.input) if partitions is None else load_partitions_untyped(partitions)
+        untyped_memory = frame_memory(untyped)
+        print(f"  - Untyped load (all columns, default dtypes): {untyped_memory / 1e6:,.1f} MB "
+              f"-> {untyped_memory / frame_memory(df):.1f}x more than the typed schema")
+    print()
+    return {'df': df, 'cache_hit': cache_hit, 'data_key': data_key, 'slot': slot}
+
+
+@section('explore', requires=['load'])
+def explore_data(pipeline, loaded):
+    df = loaded['df']
+
+    # Display first few rows
+    print("First 5 rows of data:")
+    print(df.head())
+    print()
+
+    # Display data info
+    print("Dataset Information:")
+    print(df.info())
+    print()
+
+    # Display basic statistics
+    print("Basic Statistics:")
+    print(df.describe())
+    print()
 
-# Display basic statistics
-print("Basic Statistics:")
-print(df.describe())
-print()
 
 # ==========================================
 # 2. DATA CLEANING AND PREPROCESSING
 # ==========================================
 
-print("\n2. DATA CLEANING AND PREPROCESSING...")
-print("-" * 70)
-
-# Check for missing values
-print("Missing values:")
-missing_values = df.isnull().sum()
-print(missing_values[missing_values > 0] if missing_values.sum() > 0 else "No missing values found!")
-print()
-
-# Check for duplicates
-duplicates = df.duplicated().sum()
-print(f"Duplicate rows: {duplicates}")
-if duplicates > 0:
-    df = df.drop_duplicates()
-    print(f"✓ Removed {duplicates} duplicate rows")
-print()
-
-# Convert date columns to datetime
-df['Order Date'] = pd.to_datetime(df['Order Date'], format='%m/%d/%Y')
-df['Ship Date'] = pd.to_datetime(df['Ship Date'], format='%m/%d/%Y')
-print("✓ Date columns converted to datetime format")
-print()
-
-# Create new calculated columns
-df['Profit Margin'] = (df['Profit'] / df['Sales']) * 100
-df['Order Year'] = df['Order Date'].dt.year
-df['Order Month'] = df['Order Date'].dt.month
-df['Order Month Name'] = df['Order Date'].dt.strftime('%b')
-df['Order Quarter'] = df['Order Date'].dt.quarter
-df['Shipping Days'] = (df['Ship Date'] - df['Order Date']).dt.days
-df['Year-Month'] = df['Order Date'].dt.to_period('M')
-df['Year-Quarter'] = df['Order Date'].dt.to_period('Q')
-
-print("✓ Created calculated columns:")
-print("  - Profit Margin")
-print("  - Order Year, Month, Quarter")
-print("  - Shipping Days")
-print("  - Year-Month, Year-Quarter")
-print()
-
-print(f"✓ Final dataset shape: {df.shape}")
-print(f"  Date range: {df['Order Date'].min().date()} to {df['Order Date'].max().date()}")
-print()
+@section('clean', requires=['load'])
+def clean_data(pipeline, loaded):
+    """Section 2: the cleaned, enriched frame (stored in the cache on a miss),
+    sliced to the run's date range and dimension filters."""
+    options = pipeline.options
+    print("\n2. DATA CLEANING AND PREPROCESSING...")
+    print("-" * 70)
+
+    df = loaded['df']
+    if loaded['cache_hit']:
+        print("✓ Cleaning skipped - using cached cleaned data")
+        print()
+    else:
+        df = clean_superstore(df)
+        if not options.no_cache:
+            store_cached_frame(options.cache_dir, loaded['data_key'], df, loaded['slot'])
+
+    if is_filtered(options):
+        start = time.perf_counter()
+        index, index_loaded = load_or_build_index(df, options.cache_dir, loaded['data_key'])
+        indexed = time.perf_counter()
+        total = len(df)
+        df = index.take(df, options.start_date, options.end_date, report_filters(options))
+        if df.empty:
+            raise ValueError(f"No orders match the filters ({describe_filters(options)})")
+        print(f"✓ Filtered to {len(df):,} of {total:,} rows ({describe_filters(options)}) "
+              f"in {(time.perf_counter() - indexed) * 1000:.1f} ms")
+        print(f"  - Slice index {'loaded from cache' if index_loaded else 'built'} "
+              f"in {(indexed - start) * 1000:.1f} ms")
+
+    print(f"✓ Final dataset shape: {df.shape}")
+    print(f"  Date range: {df['Order Date'].min().date()} to {df['Order Date'].max().date()}")
+    print()
+    return df
+
+
+@section('engine', requires=['load', 'clean'])
+def aggregation_engine(pipeline, loaded, df):
+    """Shared aggregation pass: every table and chart that groups the full frame
+    reads its metrics from here, so each grouping key is scanned once, and only
+    when a section first asks for it. Keys the OLAP cube covers are rolled up
+    from its cells (kept next to the cleaned-data cache) instead, except in
+    filtered runs, which group their slice directly, and in runs that loaded
+    too few columns to build the cube."""
+    options = pipeline.options
+    cube_factory = None
+    if not (options.no_cube or options.approx_distinct or is_filtered(options) or loaded['data_key'] is None
+            or not set(CUBE_COLUMNS).issubset(df.columns)):
+        # Loaded or built on the first key the cube can roll up
+        def cube_factory():
+            cube, cube_loaded = load_or_build_cube(df, options.cache_dir, loaded['data_key'])
+            print(f"✓ OLAP cube: {cube.size:,} cells ({'loaded from cache' if cube_loaded else 'built'})")
+            return cube
+    engine = AggregationEngine(REPORT_AGGREGATIONS, approx_error=approx_error(options),
+                               cube_factory=cube_factory, cube_answers=SalesCube.answers)
+    requested, passes = engine.bind(df)
+    print(f"✓ Aggregation engine: {requested} group-bys served by {passes} passes "
+          f"({requested - passes} scans saved)")
+    print()
+    return engine
+
 
 # ==========================================
 # 3. OVERALL KPIs
 # ==========================================
 
-print("\n3. KEY PERFORMANCE INDICATORS (KPIs)")
-print("="*70)
-
-total_sales = df['Sales'].sum()
-total_profit = df['Profit'].sum()
-total_orders = df['Order ID'].nunique()
-total_customers = df['Customer ID'].nunique()
-unique_products = df['Product ID'].nunique()
-avg_profit_margin = df['Profit Margin'].mean()
-avg_order_value = df.groupby('Order ID')['Sales'].sum().mean()
-total_quantity = df['Quantity'].sum()
-
-print(f"""
+@section('kpis', requires=['clean', 'engine'])
+def overall_kpis(pipeline, df, engine):
+    heading(pipeline, "3. KEY PERFORMANCE INDICATORS (KPIs)")
+    error = approx_error(pipeline.options)
+
+    total_sales = df['Sales'].sum()
+    total_profit = df['Profit'].sum()
+    total_orders = count_distinct(df['Order ID'], error)
+    total_customers = count_distinct(df['Customer ID'], error)
+    unique_products = count_distinct(df['Product ID'], error)
+    avg_profit_margin = df['Profit Margin'].mean()
+    avg_order_value = engine.series('order_totals', 'Sales').mean()
+    total_quantity = df['Quantity'].sum()
+
+    print(f"""
 ┌─────────────────────────────────────────────────────┐
 │              BUSINESS OVERVIEW                      │
 ├─────────────────────────────────────────────────────┤
@@ -145,632 +559,391 @@ print(f"""
 └─────────────────────────────────────────────────────┘
 """)
 
+    if error:
+        print(f"Approximate distinct counts (HyperLogLog, target error {error:.1%}) vs exact:")
+        print(distinct_count_report(df, error).to_string(index=False))
+        print()
+
+    return {
+        'total_sales': total_sales, 'total_profit': total_profit,
+        'total_orders': total_orders, 'total_customers': total_customers,
+        'unique_products': unique_products, 'avg_profit_margin': avg_profit_margin,
+        'avg_order_value': avg_order_value, 'total_quantity': total_quantity,
+    }
+
+
 # ==========================================
 # 4. REGIONAL ANALYSIS
 # ==========================================
 
-print("\n4. REGIONAL ANALYSIS")
-print("="*70)
-
-region_analysis = df.groupby('Region').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique',
-    'Customer ID': 'nunique',
-    'Quantity': 'sum'
-}).round(2)
+@section('regional', requires=['engine', 'kpis'])
+def regional_analysis(pipeline, engine, kpis):
+    heading(pipeline, "4. REGIONAL ANALYSIS")
 
-region_analysis.columns = ['Total Sales', 'Total Profit', 'Total Orders', 
-                           'Total Customers', 'Quantity Sold']
-region_analysis['Profit Margin %'] = ((region_analysis['Total Profit'] / 
-                                       region_analysis['Total Sales']) * 100).round(2)
-region_analysis['Avg Order Value'] = (region_analysis['Total Sales'] / 
-                                      region_analysis['Total Orders']).round(2)
+    # Sorted by sales, with each region's contribution to total sales
+    region_analysis = region_table(engine.get('region_analysis'), kpis['total_sales'])
 
-# Sort by sales
-region_analysis = region_analysis.sort_values('Total Sales', ascending=False)
+    print("\nSales Performance by Region:")
+    print(region_analysis.drop(columns='% of Total Sales'))
+    print()
 
-print("\nSales Performance by Region:")
-print(region_analysis)
-print()
+    print("\nRegion Contribution to Total Sales:")
+    print(region_analysis[['Total Sales', '% of Total Sales']])
+    print()
+    return region_analysis
 
-# Calculate region contribution
-region_analysis['% of Total Sales'] = ((region_analysis['Total Sales'] / 
-                                        total_sales) * 100).round(2)
-print("\nRegion Contribution to Total Sales:")
-print(region_analysis[['Total Sales', '% of Total Sales']])
-print()
 
 # ==========================================
 # 5. CATEGORY ANALYSIS
 # ==========================================
 
-print("\n5. PRODUCT CATEGORY ANALYSIS")
-print("="*70)
+@section('category', requires=['engine', 'kpis'])
+def category_analysis_section(pipeline, engine, kpis):
+    heading(pipeline, "5. PRODUCT CATEGORY ANALYSIS")
 
-category_analysis = df.groupby('Category').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique',
-    'Quantity': 'sum',
-    'Discount': 'mean'
-}).round(2)
+    category_analysis = category_table(engine.get('category_analysis'), kpis['total_sales'])
 
-category_analysis.columns = ['Total Sales', 'Total Profit', 'Total Orders', 
-                             'Quantity Sold', 'Avg Discount']
-category_analysis['Profit Margin %'] = ((category_analysis['Total Profit'] / 
-                                         category_analysis['Total Sales']) * 100).round(2)
-category_analysis['% of Sales'] = ((category_analysis['Total Sales'] / 
-                                    total_sales) * 100).round(2)
+    print("\nCategory Performance:")
+    print(category_analysis)
+    print()
 
-category_analysis = category_analysis.sort_values('Total Sales', ascending=False)
+    # Sub-Category Analysis
+    print("\nTop 10 Sub-Categories by Sales:")
+    subcat_analysis = top_k(engine.series('subcat_sales', 'Sales'), 10)
+    print(subcat_analysis)
+    print()
 
-print("\nCategory Performance:")
-print(category_analysis)
-print()
+    print("\nTop 10 Sub-Categories by Profit:")
+    subcat_profit = top_k(engine.series('subcat_profit', 'Profit'), 10)
+    print(subcat_profit)
+    print()
 
-# Sub-Category Analysis
-print("\nTop 10 Sub-Categories by Sales:")
-subcat_analysis = df.groupby('Sub-Category')['Sales'].sum().sort_values(ascending=False).head(10)
-print(subcat_analysis)
-print()
+    print("\nBottom 10 Sub-Categories by Profit (Potential Issues):")
+    subcat_loss = top_k(engine.series('subcat_loss', 'Profit'), 10, ascending=True)
+    print(subcat_loss)
+    print()
+    return category_analysis
 
-print("\nTop 10 Sub-Categories by Profit:")
-subcat_profit = df.groupby('Sub-Category')['Profit'].sum().sort_values(ascending=False).head(10)
-print(subcat_profit)
-print()
-
-print("\nBottom 10 Sub-Categories by Profit (Potential Issues):")
-subcat_loss = df.groupby('Sub-Category')['Profit'].sum().sort_values(ascending=True).head(10)
-print(subcat_loss)
-print()
 
 # ==========================================
 # 6. CUSTOMER ANALYSIS
 # ==========================================
 
-print("\n6. CUSTOMER ANALYSIS")
-print("="*70)
-
-# Segment Analysis
-segment_analysis = df.groupby('Segment').agg({
-    'Customer ID': 'nunique',
-    'Order ID': 'nunique',
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).round(2)
-
-segment_analysis.columns = ['Total Customers', 'Total Orders', 'Total Sales', 'Total Profit']
-segment_analysis['Avg Order Value'] = (segment_analysis['Total Sales'] / 
-                                       segment_analysis['Total Orders']).round(2)
-segment_analysis['Orders per Customer'] = (segment_analysis['Total Orders'] / 
-                                           segment_analysis['Total Customers']).round(2)
-segment_analysis['Profit Margin %'] = ((segment_analysis['Total Profit'] / 
-                                        segment_analysis['Total Sales']) * 100).round(2)
-
-segment_analysis = segment_analysis.sort_values('Total Sales', ascending=False)
-
-print("\nCustomer Segment Analysis:")
-print(segment_analysis)
-print()
-
-# Top Customers
-print("\nTop 20 Customers by Sales:")
-customer_sales = df.groupby(['Customer ID', 'Customer Name']).agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique'
-}).round(2)
-customer_sales.columns = ['Total Sales', 'Total Profit', 'Number of Orders']
-customer_sales = customer_sales.sort_values('Total Sales', ascending=False).head(20)
-print(customer_sales)
-print()
-
-# Customer Frequency Distribution
-print("\nCustomer Purchase Frequency:")
-customer_frequency = df.groupby('Customer ID')['Order ID'].nunique()
-freq_dist = customer_frequency.value_counts().sort_index()
-print(freq_dist.head(10))
-print()
+@section('customer', requires=['engine'])
+def customer_analysis(pipeline, engine):
+    heading(pipeline, "6. CUSTOMER ANALYSIS")
+
+    # Segment Analysis
+    segment_analysis = segment_table(engine.get('segment_analysis'))
+
+    print("\nCustomer Segment Analysis:")
+    print(segment_analysis)
+    print()
+
+    # Top Customers
+    print("\nTop 20 Customers by Sales:")
+    customer_sales = customer_sales_table(engine.get('customer_sales'))
+    print(customer_sales)
+    print()
+
+    # Customer Frequency Distribution
+    print("\nCustomer Purchase Frequency:")
+    customer_frequency = engine.series('customer_frequency', 'Order ID', 'nunique')
+    freq_dist = customer_frequency.value_counts().sort_index()
+    print(freq_dist.head(10))
+    print()
+    return {'segment_analysis': segment_analysis, 'customer_sales': customer_sales}
+
 
 # ==========================================
 # 7. TIME-BASED ANALYSIS
 # ==========================================
 
-print("\n7. TIME-BASED ANALYSIS")
-print("="*70)
-
-# Yearly Performance
-print("\nYearly Performance:")
-yearly_perf = df.groupby('Order Year').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique',
-    'Customer ID': 'nunique'
-}).round(2)
-yearly_perf.columns = ['Sales', 'Profit', 'Orders', 'Customers']
-yearly_perf['Profit Margin %'] = ((yearly_perf['Profit'] / yearly_perf['Sales']) * 100).round(2)
-
-# Calculate YoY growth
-yearly_perf['Sales Growth %'] = yearly_perf['Sales'].pct_change() * 100
-yearly_perf['Profit Growth %'] = yearly_perf['Profit'].pct_change() * 100
-
-print(yearly_perf)
-print()
-
-# Monthly Trend (Last 12 months of data)
-print("\nMonthly Sales Trend (Last 12 months):")
-monthly_data = df.groupby('Year-Month').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique'
-}).round(2)
-monthly_data.columns = ['Sales', 'Profit', 'Orders']
-print(monthly_data.tail(12))
-print()
-
-# Quarterly Performance
-print("\nQuarterly Performance:")
-quarterly_perf = df.groupby(['Order Year', 'Order Quarter']).agg({
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).round(2)
-print(quarterly_perf)
-print()
+@section('time', requires=['load', 'clean', 'engine'])
+def time_analysis(pipeline, loaded, df, engine):
+    heading(pipeline, "7. TIME-BASED ANALYSIS")
+    options = pipeline.options
+
+    # Yearly Performance
+    print("\nYearly Performance:")
+    # Includes YoY growth
+    yearly_perf = yearly_table(engine.get('yearly_perf'))
+
+    print(yearly_perf)
+    print()
+
+    # Monthly Trend (Last 12 months of data)
+    print("\nMonthly Sales Trend (Last 12 months):")
+    monthly_data = engine.get('monthly_data').round(2)
+    monthly_data.columns = ['Sales', 'Profit', 'Orders']
+    print(monthly_data.tail(12))
+    print()
+
+    # Quarterly Performance
+    print("\nQuarterly Performance:")
+    quarterly_perf = engine.get('quarterly_perf').round(2)
+    quarterly_perf.columns = ['Sales', 'Profit']
+    print(quarterly_perf)
+    print()
+
+    # Rolling and period-to-date windows per region and category, each a
+    # difference of two daily running totals (kept with the cache entry,
+    # except for a filtered slice)
+    data_key = None if is_filtered(options) else loaded['data_key']
+    buckets, buckets_loaded = load_or_build_buckets(df, options.cache_dir, data_key)
+    as_of = options.end_date or buckets.dates[-1]
+    print(f"Daily time buckets: {len(buckets.keys)} region/category combinations x {buckets.days:,} days "
+          f"({'loaded from cache' if buckets_loaded else 'built'})")
+    print(f"\nSales and Profit Windows (as of {as_of:%Y-%m-%d}):")
+    period_windows = buckets.window_table(as_of)
+    print(period_windows)
+    print()
+    print(f"\nYear-over-Year Growth % (same windows to {as_of - pd.DateOffset(years=1):%Y-%m-%d}):")
+    windows_yoy = buckets.yoy_table(as_of)
+    print(windows_yoy)
+    print()
+    return {'yearly_perf': yearly_perf, 'monthly_data': monthly_data,
+            'period_windows': period_windows, 'windows_yoy': windows_yoy}
+
 
 # ==========================================
 # 8. PRODUCT ANALYSIS
 # ==========================================
 
-print("\n8. DETAILED PRODUCT ANALYSIS")
-print("="*70)
-
-# Top Products
-print("\nTop 15 Products by Sales:")
-top_products_sales = df.groupby('Product Name').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Quantity': 'sum',
-    'Order ID': 'nunique'
-}).round(2)
-top_products_sales.columns = ['Sales', 'Profit', 'Quantity', 'Times Ordered']
-top_products_sales = top_products_sales.sort_values('Sales', ascending=False).head(15)
-print(top_products_sales)
-print()
-
-print("\nTop 15 Products by Profit:")
-top_products_profit = df.groupby('Product Name').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Quantity': 'sum'
-}).round(2)
-top_products_profit.columns = ['Sales', 'Profit', 'Quantity']
-top_products_profit['Profit Margin %'] = ((top_products_profit['Profit'] / 
-                                           top_products_profit['Sales']) * 100).round(2)
-top_products_profit = top_products_profit.sort_values('Profit', ascending=False).head(15)
-print(top_products_profit)
-print()
-
-# Loss-making products
-print("\nLoss-Making Products (Bottom 10 by Profit):")
-loss_products = df.groupby('Product Name').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'nunique',
-    'Discount': 'mean'
-}).round(2)
-loss_products.columns = ['Sales', 'Profit', 'Times Ordered', 'Avg Discount']
-loss_products = loss_products[loss_products['Profit'] < 0].sort_values('Profit').head(10)
-print(loss_products)
-print()
+@section('product', requires=['engine'])
+def product_analysis(pipeline, engine):
+    heading(pipeline, "8. DETAILED PRODUCT ANALYSIS")
+
+    # Top Products
+    print("\nTop 15 Products by Sales:")
+    top_products_sales = product_sales_table(engine.get('top_products_sales'))
+    print(top_products_sales)
+    print()
+
+    print("\nTop 15 Products by Profit:")
+    top_products_profit = product_profit_table(engine.get('top_products_profit'))
+    print(top_products_profit)
+    print()
+
+    # Loss-making products
+    print("\nLoss-Making Products (Bottom 10 by Profit):")
+    loss_products = loss_products_table(engine.get('loss_products'))
+    print(loss_products)
+    print()
+    return {'top_products_sales': top_products_sales, 'top_products_profit': top_products_profit}
+
 
 # ==========================================
 # 9. SHIPPING ANALYSIS
 # ==========================================
 
-print("\n9. SHIPPING AND LOGISTICS ANALYSIS")
-print("="*70)
+@section('shipping', requires=['clean', 'engine'])
+def shipping_analysis_section(pipeline, df, engine):
+    heading(pipeline, "9. SHIPPING AND LOGISTICS ANALYSIS")
 
-shipping_analysis = df.groupby('Ship Mode').agg({
-    'Order ID': 'count',
-    'Shipping Days': 'mean',
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).round(2)
+    shipping_analysis = shipping_table(engine.get('shipping_analysis'), len(df))
 
-shipping_analysis.columns = ['Total Shipments', 'Avg Shipping Days', 'Total Sales', 'Total Profit']
-shipping_analysis['% of Orders'] = ((shipping_analysis['Total Shipments'] / 
-                                    len(df)) * 100).round(2)
-shipping_analysis = shipping_analysis.sort_values('Total Sales', ascending=False)
+    print("\nShipping Mode Performance:")
+    print(shipping_analysis)
+    print()
 
-print("\nShipping Mode Performance:")
-print(shipping_analysis)
-print()
+    # Shipping by Region
+    print("\nAverage Shipping Days by Region:")
+    region_shipping = engine.series('region_shipping', 'Shipping Days', 'mean').round(1)
+    print(region_shipping.unstack(fill_value=0))
+    print()
+    return shipping_analysis
 
-# Shipping by Region
-print("\nAverage Shipping Days by Region:")
-region_shipping = df.groupby(['Region', 'Ship Mode'])['Shipping Days'].mean().round(1)
-print(region_shipping.unstack(fill_value=0))
-print()
 
 # ==========================================
 # 10. DISCOUNT ANALYSIS
 # ==========================================
 
-print("\n10. DISCOUNT IMPACT ANALYSIS")
-print("="*70)
-
-# Create discount buckets
-df['Discount Range'] = pd.cut(df['Discount'], 
-                               bins=[-0.01, 0, 0.1, 0.2, 0.3, 0.4, 1],
-                               labels=['No Discount', '1-10%', '11-20%', 
-                                      '21-30%', '31-40%', '40%+'])
-
-discount_analysis = df.groupby('Discount Range').agg({
-    'Order ID': 'count',
-    'Sales': ['sum', 'mean'],
-    'Profit': ['sum', 'mean'],
-    'Quantity': 'sum'
-}).round(2)
-
-discount_analysis.columns = ['Orders', 'Total Sales', 'Avg Sales', 
-                             'Total Profit', 'Avg Profit', 'Quantity']
-discount_analysis['Profit Margin %'] = ((discount_analysis['Total Profit'] / 
-                                         discount_analysis['Total Sales']) * 100).round(2)
-
-print("\nDiscount Impact on Performance:")
-print(discount_analysis)
-print()
-
-# Discount by Category
-print("\nAverage Discount by Category:")
-category_discount = df[df['Discount'] > 0].groupby('Category').agg({
-    'Discount': 'mean',
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).round(3)
-category_discount['Discount'] = (category_discount['Discount'] * 100).round(2)
-category_discount.columns = ['Avg Discount %', 'Sales', 'Profit']
-print(category_discount)
-print()
+@section('discount', requires=['clean', 'engine'])
+def discount_analysis_section(pipeline, df, engine):
+    heading(pipeline, "10. DISCOUNT IMPACT ANALYSIS")
+
+    discount_analysis = discount_table(engine.get('discount_analysis'))
+
+    print("\nDiscount Impact on Performance:")
+    print(discount_analysis)
+    print()
+
+    # Discount by Category
+    print("\nAverage Discount by Category:")
+    category_discount = df[df['Discount'] > 0].groupby('Category', observed=True).agg({
+        'Discount': 'mean',
+        'Sales': 'sum',
+        'Profit': 'sum'
+    }).round(3)
+    category_discount['Discount'] = (category_discount['Discount'] * 100).round(2)
+    category_discount.columns = ['Avg Discount %', 'Sales', 'Profit']
+    print(category_discount)
+    print()
+    return discount_analysis
+
 
 # ==========================================
 # 11. ADVANCED ANALYTICS
 # ==========================================
 
-print("\n11. ADVANCED ANALYTICS")
-print("="*70)
-
-# RFM Analysis (Recency, Frequency, Monetary)
-print("\nTop 20 Customers - RFM Analysis:")
-reference_date = df['Order Date'].max() + pd.Timedelta(days=1)
-
-rfm = df.groupby('Customer ID').agg({
-    'Order Date': lambda x: (reference_date - x.max()).days,
-    'Order ID': 'nunique',
-    'Sales': 'sum'
-}).round(2)
-
-rfm.columns = ['Recency (days)', 'Frequency (orders)', 'Monetary (sales)']
-rfm['Recency Score'] = pd.qcut(rfm['Recency (days)'], 4, labels=[4, 3, 2, 1])
-rfm['Frequency Score'] = pd.qcut(rfm['Frequency (orders)'].rank(method='first'), 4, labels=[1, 2, 3, 4])
-rfm['Monetary Score'] = pd.qcut(rfm['Monetary (sales)'], 4, labels=[1, 2, 3, 4])
-rfm['RFM Score'] = rfm['Recency Score'].astype(int) + rfm['Frequency Score'].astype(int) + rfm['Monetary Score'].astype(int)
-
-# Merge with customer names
-customer_names = df[['Customer ID', 'Customer Name']].drop_duplicates()
-rfm = rfm.merge(customer_names, on='Customer ID')
-
-rfm_top20 = rfm.sort_values('Monetary (sales)', ascending=False).head(20)
-print(rfm_top20[['Customer Name', 'Recency (days)', 'Frequency (orders)', 
-                  'Monetary (sales)', 'RFM Score']])
-print()
-
-# Product Performance Matrix
-print("\nProduct Performance Quadrants (BCG Matrix Approach):")
-product_matrix = df.groupby('Product Name').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Quantity': 'sum'
-}).round(2)
-
-# Calculate growth rate (using quantity as proxy for market share)
-product_matrix['Sales Rank'] = product_matrix['Sales'].rank(ascending=False)
-product_matrix['Growth Rate'] = product_matrix['Quantity'].rank(pct=True) * 100
-
-# Classify products
-product_matrix['Category'] = 'Dogs'  # Low growth, low share
-product_matrix.loc[(product_matrix['Sales Rank'] <= 100) & 
-                   (product_matrix['Growth Rate'] >= 50), 'Category'] = 'Stars'
-product_matrix.loc[(product_matrix['Sales Rank'] <= 100) & 
-                   (product_matrix['Growth Rate'] < 50), 'Category'] = 'Cash Cows'
-product_matrix.loc[(product_matrix['Sales Rank'] > 100) & 
-                   (product_matrix['Growth Rate'] >= 50), 'Category'] = 'Question Marks'
-
-print("\nProduct Category Distribution:")
-print(product_matrix['Category'].value_counts())
-print()
-
-print("\nTop 10 'Stars' (High Sales, High Growth):")
-stars = product_matrix[product_matrix['Category'] == 'Stars'].sort_values('Sales', ascending=False).head(10)
-print(stars[['Sales', 'Profit', 'Quantity']])
-print()
+@section('rfm', requires=['clean', 'engine'])
+def rfm_analysis(pipeline, df, engine):
+    heading(pipeline, "11. ADVANCED ANALYTICS")
+
+    # RFM Analysis (Recency, Frequency, Monetary)
+    print("\nTop 20 Customers - RFM Analysis:")
+    # Recency is measured from the day after the latest order; customers are
+    # scored against the quartile edges of all customers
+    rfm, scorer = rfm_table(engine.get('rfm'), customer_names(df))
+    if pipeline.options.rfm_edges:
+        print(f"✓ RFM edges saved to '{scorer.save(pipeline.options.rfm_edges)}'")
+
+    rfm_top20 = top_k(rfm, 20, 'Monetary (sales)')
+    print(rfm_top20[['Customer Name', 'Recency (days)', 'Frequency (orders)',
+                      'Monetary (sales)', 'RFM Score']])
+    print()
+    return {'rfm': rfm, 'rfm_top20': rfm_top20}
+
+
+@section('product_matrix', requires=['engine'])
+def product_matrix_analysis(pipeline, engine):
+    heading(pipeline, "11. ADVANCED ANALYTICS")
+
+    # Product Performance Matrix
+    print("\nProduct Performance Quadrants (BCG Matrix Approach):")
+    product_matrix = engine.get('product_matrix').round(2)
+    product_matrix.columns = ['Sales', 'Profit', 'Quantity']
+
+    # Calculate growth rate (using quantity as proxy for market share)
+    product_matrix['Sales Rank'] = product_matrix['Sales'].rank(ascending=False)
+    product_matrix['Growth Rate'] = product_matrix['Quantity'].rank(pct=True) * 100
+
+    # Classify products
+    product_matrix['Category'] = 'Dogs'  # Low growth, low share
+    product_matrix.loc[(product_matrix['Sales Rank'] <= 100) &
+                       (product_matrix['Growth Rate'] >= 50), 'Category'] = 'Stars'
+    product_matrix.loc[(product_matrix['Sales Rank'] <= 100) &
+                       (product_matrix['Growth Rate'] < 50), 'Category'] = 'Cash Cows'
+    product_matrix.loc[(product_matrix['Sales Rank'] > 100) &
+                       (product_matrix['Growth Rate'] >= 50), 'Category'] = 'Question Marks'
+
+    print("\nProduct Category Distribution:")
+    print(product_matrix['Category'].value_counts())
+    print()
+
+    print("\nTop 10 'Stars' (High Sales, High Growth):")
+    stars = top_k(product_matrix[product_matrix['Category'] == 'Stars'], 10, 'Sales')
+    print(stars[['Sales', 'Profit', 'Quantity']])
+    print()
+    return product_matrix
+
 
 # ==========================================
 # 12. CORRELATION ANALYSIS
 # ==========================================
 
-print("\n12. CORRELATION ANALYSIS")
-print("="*70)
+@section('correlation', requires=['clean'])
+def correlation_analysis(pipeline, df):
+    heading(pipeline, "12. CORRELATION ANALYSIS")
+
+    # Correlation of the numeric columns from their co-moments, the same
+    # mergeable summary the streaming mode builds chunk by chunk
+    correlation_matrix = CoMoments(CORRELATION_COLUMNS).update(df).corr().round(3)
 
-# Select numeric columns for correlation
-numeric_cols = ['Sales', 'Quantity', 'Discount', 'Profit', 'Shipping Days', 'Profit Margin']
-correlation_matrix = df[numeric_cols].corr().round(3)
+    print("\nCorrelation Matrix:")
+    print(correlation_matrix)
+    print()
 
-print("\nCorrelation Matrix:")
-print(correlation_matrix)
-print()
+    print("\nKey Correlations with Profit:")
+    profit_corr = correlation_matrix['Profit'].sort_values(ascending=False)
+    print(profit_corr)
+    print()
+    return correlation_matrix
 
-print("\nKey Correlations with Profit:")
-profit_corr = correlation_matrix['Profit'].sort_values(ascending=False)
-print(profit_corr)
-print()
 
 # ==========================================
 # 13. SAVE ANALYSIS RESULTS
 # ==========================================
 
-print("\n13. EXPORTING ANALYSIS RESULTS")
-print("="*70)
-
-try:
-    with pd.ExcelWriter('Sales_Analysis_Complete.xlsx', engine='openpyxl') as writer:
-        # Summary Sheet
-        summary_data = {
-            'Metric': ['Total Sales', 'Total Profit', 'Profit Margin %', 'Total Orders', 
-                      'Total Customers', 'Unique Products', 'Avg Order Value', 'Total Quantity'],
-            'Value': [f'${total_sales:,.2f}', f'${total_profit:,.2f}', f'{avg_profit_margin:.2f}%',
-                     total_orders, total_customers, unique_products, 
-                     f'${avg_order_value:,.2f}', total_quantity]
-        }
-        pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-        
-        # Other sheets
-        region_analysis.to_excel(writer, sheet_name='Region Analysis')
-        category_analysis.to_excel(writer, sheet_name='Category Analysis')
-        segment_analysis.to_excel(writer, sheet_name='Segment Analysis')
-        yearly_perf.to_excel(writer, sheet_name='Yearly Performance')
-        monthly_data.to_excel(writer, sheet_name='Monthly Trend')
-        top_products_sales.to_excel(writer, sheet_name='Top Products by Sales')
-        top_products_profit.to_excel(writer, sheet_name='Top Products by Profit')
-        customer_sales.to_excel(writer, sheet_name='Top Customers')
-        shipping_analysis.to_excel(writer, sheet_name='Shipping Analysis')
-        discount_analysis.to_excel(writer, sheet_name='Discount Analysis')
-        rfm_top20.to_excel(writer, sheet_name='RFM Analysis')
-        correlation_matrix.to_excel(writer, sheet_name='Correlations')
-    
-    print("✓ Analysis exported to 'Sales_Analysis_Complete.xlsx'")
-    print("  Contains 12 sheets with comprehensive analysis")
-except Exception as e:
-    print(f"✗ Error exporting to Excel: {e}")
-
-print()
+@section('export', requires=['kpis', 'regional', 'category', 'customer', 'time', 'product',
+                            'shipping', 'discount', 'rfm', 'correlation'])
+def export_results(pipeline, kpis, region_analysis, category_analysis, customer, time, product,
+                 shipping_analysis, discount_analysis, rfm, correlation_matrix):
+    heading(pipeline, "13. EXPORTING ANALYSIS RESULTS")
+
+    report_tables = {
+        'summary': summary_frame(kpis),
+        'region_analysis': region_analysis,
+        'category_analysis': category_analysis,
+        'segment_analysis': customer['segment_analysis'],
+        'yearly_perf': time['yearly_perf'],
+        'monthly_data': time['monthly_data'],
+        'period_windows': time['period_windows'],
+        'windows_yoy': time['windows_yoy'],
+        'top_products_sales': product['top_products_sales'],
+        'top_products_profit': product['top_products_profit'],
+        'customer_sales': customer['customer_sales'],
+        'shipping_analysis': shipping_analysis,
+        'discount_analysis': discount_analysis,
+        'rfm_top20': rfm['rfm_top20'],
+        'correlation_matrix': correlation_matrix,
+    }
+
+    written = 0
+    try:
+        written = export_report(pipeline.options, report_tables)
+    except Exception as e:
+        print(f"✗ Error exporting analysis results: {e}")
+
+    print()
+    return written
+
 
 # ==========================================
 # 14. CREATE VISUALIZATIONS
 # ==========================================
 
-print("\n14. CREATING VISUALIZATIONS")
-print("="*70)
-
-try:
-    # Create output directory for plots
-    import os
-    os.makedirs('visualizations', exist_ok=True)
-    
-    # Visualization 1: Sales by Region
-    plt.figure(figsize=(12, 6))
-    region_sales = df.groupby('Region')['Sales'].sum().sort_values(ascending=False)
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
-    bars = plt.bar(region_sales.index, region_sales.values, color=colors, edgecolor='black', linewidth=1.5)
-    plt.title('Total Sales by Region', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Region', fontsize=14, fontweight='bold')
-    plt.ylabel('Sales ($)', fontsize=14, fontweight='bold')
-    plt.xticks(fontsize=12)
-    plt.yticks(fontsize=12)
-    
-    # Add value labels on bars
-    for i, (bar, value) in enumerate(zip(bars, region_sales.values)):
-        plt.text(bar.get_x() + bar.get_width()/2, value + 20000, 
-                f'${value:,.0f}', ha='center', va='bottom', fontsize=11, fontweight='bold')
-    
-    plt.grid(axis='y', alpha=0.3, linestyle='--')
-    plt.tight_layout()
-    plt.savefig('visualizations/01_sales_by_region.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: sales_by_region.png")
-    
-    # Visualization 2: Sales by Category (Pie Chart)
-    plt.figure(figsize=(10, 8))
-    category_sales = df.groupby('Category')['Sales'].sum()
-    colors_pie = ['#FF6B6B', '#4ECDC4', '#95E1D3']
-    explode = (0.05, 0.05, 0.05)
-    
-    wedges, texts, autotexts = plt.pie(category_sales.values, labels=category_sales.index, 
-                                        autopct='%1.1f%%', startangle=90, colors=colors_pie,
-                                        explode=explode, shadow=True, textprops={'fontsize': 12})
-    
-    for autotext in autotexts:
-        autotext.set_color('white')
-        autotext.set_fontweight('bold')
-        autotext.set_fontsize(13)
-    
-    for text in texts:
-        text.set_fontsize(14)
-        text.set_fontweight('bold')
-    
-    plt.title('Sales Distribution by Category', fontsize=18, fontweight='bold', pad=20)
-    plt.tight_layout()
-    plt.savefig('visualizations/02_sales_by_category.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: sales_by_category.png")
-    
-    # Visualization 3: Monthly Sales Trend
-    plt.figure(figsize=(16, 6))
-    monthly_data_plot = df.groupby(df['Order Date'].dt.to_period('M')).agg({
-        'Sales': 'sum',
-        'Profit': 'sum'
-    })
-    monthly_data_plot.index = monthly_data_plot.index.to_timestamp()
-    
-    plt.plot(monthly_data_plot.index, monthly_data_plot['Sales']/1000, 
-            marker='o', linewidth=2.5, markersize=6, label='Sales', color='#FF6B6B')
-    plt.plot(monthly_data_plot.index, monthly_data_plot['Profit']/1000, 
-            marker='s', linewidth=2.5, markersize=6, label='Profit', color='#4ECDC4')
-    
-    plt.title('Monthly Sales and Profit Trend', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Month', fontsize=14, fontweight='bold')
-    plt.ylabel('Amount (Thousands $)', fontsize=14, fontweight='bold')
-    plt.legend(fontsize=12, loc='upper left')
-    plt.grid(True, alpha=0.3, linestyle='--')
-    plt.xticks(rotation=45, fontsize=10)
-    plt.yticks(fontsize=11)
-    plt.tight_layout()
-    plt.savefig('visualizations/03_monthly_trend.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: monthly_trend.png")
-    
-    # Visualization 4: Top 10 Sub-Categories
-    plt.figure(figsize=(12, 8))
-    top_subcats = df.groupby('Sub-Category')['Sales'].sum().sort_values(ascending=True).tail(10)
-    colors_bar = plt.cm.viridis(np.linspace(0.3, 0.9, len(top_subcats)))
-    
-    bars = plt.barh(range(len(top_subcats)), top_subcats.values, color=colors_bar, edgecolor='black', linewidth=1)
-    plt.yticks(range(len(top_subcats)), top_subcats.index, fontsize=11)
-    plt.title('Top 10 Sub-Categories by Sales', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Sales ($)', fontsize=14, fontweight='bold')
-    plt.ylabel('Sub-Category', fontsize=14, fontweight='bold')
-    plt.xticks(fontsize=11)
-    
-    # Add value labels
-    for i, (bar, value) in enumerate(zip(bars, top_subcats.values)):
-        plt.text(value + 5000, i, f'${value:,.0f}', va='center', fontsize=10, fontweight='bold')
-    
-    plt.grid(axis='x', alpha=0.3, linestyle='--')
-    plt.tight_layout()
-    plt.savefig('visualizations/04_top_subcategories.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: top_subcategories.png")
-    
-    # Visualization 5: Profit Margin Distribution
-    plt.figure(figsize=(12, 6))
-    plt.hist(df['Profit Margin'], bins=50, color='#4ECDC4', edgecolor='black', linewidth=0.5, alpha=0.7)
-    plt.axvline(df['Profit Margin'].mean(), color='red', linestyle='--', linewidth=2.5, 
-               label=f'Mean: {df["Profit Margin"].mean():.1f}%')
-    plt.axvline(df['Profit Margin'].median(), color='green', linestyle='--', linewidth=2.5,
-               label=f'Median: {df["Profit Margin"].median():.1f}%')
-    
-    plt.title('Profit Margin Distribution', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Profit Margin (%)', fontsize=14, fontweight='bold')
-    plt.ylabel('Frequency', fontsize=14, fontweight='bold')
-    plt.legend(fontsize=12)
-    plt.grid(axis='y', alpha=0.3, linestyle='--')
-    plt.xticks(fontsize=11)
-    plt.yticks(fontsize=11)
-    plt.tight_layout()
-    plt.savefig('visualizations/05_profit_margin_distribution.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: profit_margin_distribution.png")
-    
-    # Visualization 6: Sales Heatmap
-    plt.figure(figsize=(10, 6))
-    heatmap_data = df.pivot_table(values='Sales', index='Region', columns='Category', aggfunc='sum')
-    sns.heatmap(heatmap_data, annot=True, fmt=',.0f', cmap='YlOrRd', linewidths=1, 
-               cbar_kws={'label': 'Sales ($)'}, annot_kws={'fontsize': 10, 'fontweight': 'bold'})
-    
-    plt.title('Sales Heatmap: Region vs Category', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Category', fontsize=14, fontweight='bold')
-    plt.ylabel('Region', fontsize=14, fontweight='bold')
-    plt.xticks(fontsize=12, rotation=0)
-    plt.yticks(fontsize=12, rotation=0)
-    plt.tight_layout()
-    plt.savefig('visualizations/06_sales_heatmap.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: sales_heatmap.png")
-    
-    # Visualization 7: Customer Segment Performance
-    plt.figure(figsize=(12, 6))
-    segment_data = df.groupby('Segment')[['Sales', 'Profit']].sum()
-    
-    x = np.arange(len(segment_data))
-    width = 0.35
-    
-    fig, ax = plt.subplots(figsize=(12, 6))
-    bars1 = ax.bar(x - width/2, segment_data['Sales']/1000, width, label='Sales', 
-                  color='#FF6B6B', edgecolor='black', linewidth=1)
-    bars2 = ax.bar(x + width/2, segment_data['Profit']/1000, width, label='Profit',
-                  color='#4ECDC4', edgecolor='black', linewidth=1)
-    
-    ax.set_title('Sales and Profit by Customer Segment', fontsize=18, fontweight='bold', pad=20)
-    ax.set_xlabel('Customer Segment', fontsize=14, fontweight='bold')
-    ax.set_ylabel('Amount (Thousands $)', fontsize=14, fontweight='bold')
-    ax.set_xticks(x)
-    ax.set_xticklabels(segment_data.index, fontsize=12)
-    ax.legend(fontsize=12)
-    ax.grid(axis='y', alpha=0.3, linestyle='--')
-    
-    # Add value labels
-    for bars in [bars1, bars2]:
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'${height:.0f}K', ha='center', va='bottom', fontsize=10, fontweight='bold')
-    
-    plt.tight_layout()
-    plt.savefig('visualizations/07_segment_performance.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: segment_performance.png")
-    
-    # Visualization 8: Yearly Growth Trend
-    plt.figure(figsize=(12, 6))
-    yearly_sales = df.groupby('Order Year')['Sales'].sum()/1000
-    
-    plt.plot(yearly_sales.index, yearly_sales.values, marker='o', linewidth=3, 
-            markersize=10, color='#FF6B6B', markerfacecolor='white', 
-            markeredgecolor='#FF6B6B', markeredgewidth=2)
-    
-    plt.title('Year-over-Year Sales Growth', fontsize=18, fontweight='bold', pad=20)
-    plt.xlabel('Year', fontsize=14, fontweight='bold')
-    plt.ylabel('Sales (Thousands $)', fontsize=14, fontweight='bold')
-    plt.grid(True, alpha=0.3, linestyle='--')
-    plt.xticks(yearly_sales.index, fontsize=12)
-    plt.yticks(fontsize=11)
-    
-    # Add value labels
-    for x, y in zip(yearly_sales.index, yearly_sales.values):
-        plt.text(x, y + 10, f'${y:.0f}K', ha='center', va='bottom', 
-                fontsize=11, fontweight='bold')
-    
-    plt.tight_layout()
-    plt.savefig('visualizations/08_yearly_growth.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print("✓ Created: yearly_growth.png")
-    
-    print("\n✓ All visualizations saved in 'visualizations' folder")
-    
-except Exception as e:
-    print(f"✗ Error creating visualizations: {e}")
-
-print()
+@section('charts', requires=['clean', 'engine'])
+def create_visualizations(pipeline, df, engine):
+    options = pipeline.options
+    heading(pipeline, "14. CREATING VISUALIZATIONS")
+
+    timings = []
+    try:
+        # Plotting libraries are only imported when charts are requested
+        from charts import CHART_DIR, DEFAULT_CHART_WORKERS, chart_data, render_charts
+        workers = options.chart_workers or DEFAULT_CHART_WORKERS
+        timings, wall = render_charts(chart_data(engine, df), CHART_DIR, workers=workers,
+                                      use_cache=not options.no_chart_cache)
+        rendered = [seconds for _, _, seconds in timings if seconds is not None]
+        for name, path, seconds in timings:
+            if seconds is None:
+                print(f"✓ Unchanged: {os.path.basename(path)} (cached)")
+            else:
+                print(f"✓ Created: {os.path.basename(path)} ({seconds:.2f}s)")
+        print(f"  Chart cache: {len(timings) - len(rendered)} hits, {len(rendered)} misses")
+        if rendered:
+            print(f"  {len(rendered)} charts rendered in {wall:.2f}s with "
+                  f"{min(workers, len(rendered))} worker(s) (sum of chart times {sum(rendered):.2f}s)")
+        print(f"\n✓ All visualizations saved in '{CHART_DIR}' folder")
+
+    except Exception as e:
+        print(f"✗ Error creating visualizations: {e}")
+
+    print()
+    return timings
+
 
 # ==========================================
 # 15. SUMMARY AND INSIGHTS
 # ==========================================
 
-print("\n15. KEY INSIGHTS AND RECOMMENDATIONS")
-print("="*70)
+@section('insights')
+def key_insights(pipeline):
+    heading(pipeline, "15. KEY INSIGHTS AND RECOMMENDATIONS")
 
-print("""
+    print("""
 ┌────────────────────────────────────────────────────────────────┐
 │                    KEY BUSINESS INSIGHTS                       │
 ├────────────────────────────────────────────────────────────────┤
@@ -802,10 +975,10 @@ print("""
 └────────────────────────────────────────────────────────────────┘
 """)
 
-print("\n" + "="*70)
-print("ANALYSIS COMPLETED SUCCESSFULLY!")
-print("="*70)
-print("""
+    print("\n" + "="*70)
+    print("ANALYSIS COMPLETED SUCCESSFULLY!")
+    print("="*70)
+    print("""
 Output Files Generated:
 1. Sales_Analysis_Complete.xlsx - Comprehensive analysis in Excel format
 2. visualizations/ folder - 8 professional visualizations
@@ -817,5 +990,109 @@ Next Steps:
 4. Implement recommended actions based on insights
 """)
 
-print("\nScript execution completed!")
-print("="*70)
+
+# ==========================================
+# ENTRY POINT
+# ==========================================
+
+def build_pipeline(options=None):
+    """A report Pipeline over SECTIONS; ``options`` default to the CLI defaults.
+
+    Asking for metrics or profiles gives an InstrumentedPipeline; otherwise
+    sections run with no measurement at all.
+    """
+    if options is None:
+        options = build_parser().parse_args([])
+    if options.metrics or options.profile_dir:
+        return InstrumentedPipeline(SECTIONS, options, trace_memory=options.trace_memory,
+                                    profile_dir=options.profile_dir)
+    return Pipeline(SECTIONS, options)
+
+
+def report_metrics(pipeline):
+    """Print the section metrics of an instrumented run and write them out."""
+    options = pipeline.options
+    metrics = pipeline.metrics_frame()
+    columns = ['wall_seconds', 'cpu_seconds', 'rss_peak_mb', 'rss_net_mb', 'rows_in', 'rows_out']
+    if options.trace_memory:
+        columns += ['heap_peak_mb', 'heap_net_mb']
+    print("\nSECTION METRICS")
+    print("=" * 70)
+    print(metrics[columns].sort_values('wall_seconds', ascending=False))
+    if options.metrics:
+        print(f"✓ Section metrics written to '{write_metrics(pipeline, options.metrics)}'")
+    if options.profile_dir:
+        print(f"✓ Per-section cProfile dumps in '{options.profile_dir}'")
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+
+    # Set display options
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
+    pd.set_option('display.max_colwidth', 50)
+
+    print("="*70)
+    print("SALES PERFORMANCE DASHBOARD - DATA ANALYSIS")
+    print("="*70)
+    print()
+
+    if is_filtered(options) and (options.stream or options.append or options.sql or options.parallel
+                                 or options.star_schema):
+        print("✗ Date and dimension filters apply to the in-memory report only "
+              "(not --stream, --append, --sql, --parallel or --star-schema)")
+        return 2
+
+    if is_partitioned(options.input) and (options.stream or options.append or options.sql):
+        print("✗ A partitioned dataset is read by the in-memory report, --parallel and --star-schema "
+              "only (not --stream, --append or --sql)")
+        return 2
+
+    if options.stream:
+        status = run_stream(options)
+    elif options.parallel:
+        status = run_parallel(options)
+    elif options.append:
+        status = run_append(options)
+    elif options.sql:
+        status = run_sql(options)
+    elif options.star_schema:
+        status = run_star(options)
+    else:
+        pipeline = build_pipeline(options)
+        try:
+            plan = pipeline.plan(options.only)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return 2
+        if options.tables_only:
+            plan = [name for name in plan if name not in PLOTTING_SECTIONS]
+        if options.only or options.tables_only:
+            print(f"Running sections: {', '.join(plan)}")
+            print()
+        try:
+            pipeline.run(plan)
+        except ValueError as e:
+            if not (is_filtered(options) or is_partitioned(options.input)):
+                raise
+            print(f"✗ {e}")
+            return 2
+        engine = pipeline.results.get('engine')
+        if engine is not None:
+            print(f"✓ Aggregation engine ran {len(engine.results)} of its {len(engine.plan)} passes "
+                  f"({engine.rolled} rolled up from the OLAP cube)")
+        if isinstance(pipeline, InstrumentedPipeline):
+            report_metrics(pipeline)
+        status = 0
+
+    if status == 0:
+        print("\nScript execution completed!")
+        print("="*70)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
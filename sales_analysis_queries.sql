@@ -512,10 +512,13 @@ FROM (
     SELECT 
         customer_id,
         strftime('%Y', MIN(order_date)) AS acquisition_year,
-        SUM(CASE WHEN order_date = MIN(order_date) THEN sales ELSE 0 END) AS first_order_value,
+        SUM(CASE WHEN order_date = first_order_date THEN sales ELSE 0 END) AS first_order_value,
         SUM(sales) AS total_sales,
         SUM(profit) AS total_profit
-    FROM superstore
+    FROM (
+        SELECT *, MIN(order_date) OVER (PARTITION BY customer_id) AS first_order_date
+        FROM superstore
+    )
     GROUP BY customer_id
 )
 GROUP BY acquisition_year
@@ -0,0 +1,156 @@
+"""
+DATE-RANGE AND DIMENSION SLICES
+===============================
+Row indexes that take a slice of the cleaned frame (a date range and/or
+some regions, segments or categories) without a boolean mask over every
+row.
+
+The index holds:
+- the row positions in ``Order Date`` order, with the sorted dates beside
+  them. A date range is two binary searches, and the positions between
+  them are the rows of the range.
+- per dimension, the row positions of each value, stored grouped by value
+  with offsets. A value is one array lookup.
+
+The date positions and dimension positions are intersected, and the rows
+are taken in their original order. The report on a slice therefore matches
+the report on a CSV pre-filtered to the same rows, and the cost of a filtered
+run follows the size of the slice rather than the history. Building the
+index sorts every row once. It is saved in the cleaned-data cache entry, so
+only the first filtered run pays for it.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+INDEX_FORMAT = 1
+INDEX_SUBDIR = 'index'
+INDEX_META = 'index.json'
+FILTER_DIMENSIONS = ['Region', 'Segment', 'Category']
+
+
+def index_path(cache_dir, data_key):
+    """Where the slice index for a cleaned-data cache entry is kept."""
+    return os.path.join(cache_dir, data_key, INDEX_SUBDIR)
+
+
+class SliceIndex:
+    """Sorted ``Order Date`` positions and per-value positions of FILTER_DIMENSIONS.
+
+    ``dimensions`` maps each dimension to ``(values, positions, offsets)``:
+    the rows of ``values[i]`` are ``positions[offsets[i]:offsets[i + 1]]``,
+    in ascending order.
+    """
+
+    def __init__(self, order, dates, dimensions):
+        self.order = order
+        self.dates = dates
+        self.dimensions = dimensions
+
+    @classmethod
+    def build(cls, df):
+        """Index of the cleaned frame ``df``."""
+        dates = df['Order Date'].to_numpy()
+        order = np.argsort(dates, kind='stable')
+        dimensions = {}
+        for dimension in FILTER_DIMENSIONS:
+            codes, values = pd.factorize(df[dimension], sort=True)
+            positions = np.argsort(codes, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(values)))])
+            dimensions[dimension] = ([str(value) for value in values], positions, offsets)
+        return cls(order, dates[order], dimensions)
+
+    def __len__(self):
+        return len(self.order)
+
+    def date_positions(self, start=None, end=None):
+        """Positions of the rows ordered from ``start`` to ``end`` (whole days, inclusive)."""
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), 'left')
+        hi = len(self.dates) if end is None else np.searchsorted(
+            self.dates, np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1)), 'left')
+        return np.sort(self.order[lo:max(lo, hi)])
+
+    def value_positions(self, dimension, values):
+        """Positions of the rows whose ``dimension`` is one of ``values``."""
+        names, positions, offsets = self.dimensions[dimension]
+        lookup = {name: i for i, name in enumerate(names)}
+        unknown = [value for value in values if value not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown {dimension} {', '.join(map(repr, unknown))}; "
+                             f"choose from {', '.join(names)}")
+        parts = [positions[offsets[lookup[value]]:offsets[lookup[value] + 1]] for value in values]
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def positions(self, start=None, end=None, filters=None):
+        """Row positions (ascending) matching the date range and ``filters``
+        (dimension -> values); None when nothing is filtered."""
+        selected = []
+        if start is not None or end is not None:
+            selected.append(self.date_positions(start, end))
+        for dimension, values in (filters or {}).items():
+            selected.append(self.value_positions(dimension, values))
+        if not selected:
+            return None
+        selected.sort(key=len)
+        rows = selected[0]
+        for other in selected[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def take(self, df, start=None, end=None, filters=None):
+        """The rows of ``df`` (the frame the index was built on) in the slice.
+
+        Categoricals keep their full categories; the report groups with
+        ``observed=True``, so unused ones never appear.
+        """
+        rows = self.positions(start, end, filters)
+        if rows is None:
+            return df
+        return df.take(rows).reset_index(drop=True)
+
+    def save(self, path):
+        """Write the index to the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'order.npy'), self.order, allow_pickle=False)
+        np.save(os.path.join(path, 'dates.npy'), self.dates, allow_pickle=False)
+        values = {}
+        for i, (dimension, (names, positions, offsets)) in enumerate(self.dimensions.items()):
+            np.save(os.path.join(path, f'positions{i}.npy'), positions, allow_pickle=False)
+            np.save(os.path.join(path, f'offsets{i}.npy'), offsets, allow_pickle=False)
+            values[dimension] = names
+        with open(os.path.join(path, INDEX_META), 'w') as handle:
+            json.dump({'format': INDEX_FORMAT, 'rows': len(self), 'values': values}, handle, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by ``save`` (memory-mapped); None if missing or outdated."""
+        try:
+            with open(os.path.join(path, INDEX_META)) as handle:
+                meta = json.load(handle)
+        except OSError:
+            return None
+        if meta['format'] != INDEX_FORMAT or list(meta['values']) != FILTER_DIMENSIONS:
+            return None
+
+        def array(name):
+            return np.load(os.path.join(path, name), mmap_mode='r', allow_pickle=False)
+
+        dimensions = {dimension: (names, array(f'positions{i}.npy'), array(f'offsets{i}.npy'))
+                      for i, (dimension, names) in enumerate(meta['values'].items())}
+        return cls(array('order.npy'), array('dates.npy'), dimensions)
+
+
+def load_or_build_index(df, cache_dir=None, data_key=None):
+    """The slice index of ``df``: loaded from the cache entry ``data_key``, else
+    built (and saved when a key is given). Returns ``(index, loaded)``."""
+    path = index_path(cache_dir, data_key) if data_key else None
+    index = SliceIndex.load(path) if path else None
+    if index is not None and len(index) == len(df):
+        return index, True
+    index = SliceIndex.build(df)
+    if path:
+        index.save(path)
+    return index, False
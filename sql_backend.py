@@ -0,0 +1,242 @@
+"""
+SQLITE EXECUTION BACKEND
+========================
+Runs the query catalogue in sales_analysis_queries.sql against a local
+SQLite database, as an indexed, disk-backed alternative to the in-memory
+pandas report.
+
+The CSV is bulk-loaded in batches (one transaction per batch, so memory is
+bounded by the batch size), then the indexes declared in the catalogue are
+built and the planner statistics refreshed. The database records the digest
+of the CSV it was built from and is only rebuilt when the CSV changes. It is
+kept in WAL mode so several read-only connections can run independent
+queries concurrently; sqlite3 releases the GIL while a query executes.
+
+``parity_report`` cross-checks the queries that have a pandas counterpart
+against the tables built by sales_analysis.py.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_cache import file_digest
+from superstore_data import CSV_ENCODING
+
+QUERIES_FILE = 'sales_analysis_queries.sql'
+DATABASE_FILE = 'superstore.db'
+DEFAULT_BATCH_SIZE = 100_000
+DEFAULT_SQL_WORKERS = min(8, os.cpu_count() or 1)
+CSV_DATE_FORMAT = '%m/%d/%Y'
+PARITY_TOLERANCE = 0.011
+
+
+def sql_column(csv_column):
+    """Catalogue column name for a CSV header, e.g. 'Sub-Category' -> 'sub_category'."""
+    return re.sub(r'[^0-9a-z]+', '_', csv_column.lower()).strip('_')
+
+
+# ==========================================
+# QUERY CATALOGUE
+# ==========================================
+
+def parse_catalogue(path=QUERIES_FILE):
+    """Split the catalogue into its schema, index and query statements.
+
+    Returns ``{'schema': [...], 'indexes': [...], 'queries': {number: (title, sql)}}``;
+    queries are numbered and titled by their '-- Query N: Title' comments.
+    """
+    with open(path, encoding='utf-8') as handle:
+        text = handle.read()
+    catalogue = {'schema': [], 'indexes': [], 'queries': {}}
+    for statement in text.split(';'):
+        title = re.search(r'--\s*Query\s+(\d+):\s*(.+)', statement)
+        sql = '\n'.join(line for line in statement.splitlines()
+                        if not line.strip().startswith('--')).strip()
+        if not sql:
+            continue
+        keyword = sql.split(None, 2)[:2]
+        if keyword[0].upper() == 'CREATE' and keyword[1].upper() == 'TABLE':
+            catalogue['schema'].append(sql)
+        elif keyword[0].upper() == 'CREATE' and keyword[1].upper() == 'INDEX':
+            catalogue['indexes'].append(sql)
+        elif title:
+            catalogue['queries'][int(title.group(1))] = (title.group(2).strip(), sql)
+    return catalogue
+
+
+# ==========================================
+# BULK LOAD
+# ==========================================
+
+def _source_digest(connection):
+    try:
+        row = connection.execute("SELECT value FROM load_info WHERE key = 'csv_digest'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def build_database(csv_path, db_path=DATABASE_FILE, catalogue=None, batch_size=DEFAULT_BATCH_SIZE,
+                   rebuild=False):
+    """Load ``csv_path`` into ``db_path`` unless it already holds that CSV.
+
+    Rows are inserted in ``batch_size`` transactions; duplicate Row IDs
+    (exact duplicate rows) are ignored, as the pandas cleaning drops them.
+    Returns ``{'rows', 'batches', 'load_seconds', 'index_seconds', 'reused'}``.
+    """
+    catalogue = catalogue or parse_catalogue()
+    digest = file_digest(csv_path)
+    if not rebuild and os.path.exists(db_path):
+        with sqlite3.connect(db_path) as connection:
+            if _source_digest(connection) == digest:
+                rows = connection.execute('SELECT COUNT(*) FROM superstore').fetchone()[0]
+                return {'rows': rows, 'batches': 0, 'load_seconds': 0.0, 'index_seconds': 0.0, 'reused': True}
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        for statement in catalogue['schema']:
+            connection.execute(statement)
+
+        start, batches = time.perf_counter(), 0
+        reader = pd.read_csv(csv_path, encoding=CSV_ENCODING, dtype={'Postal Code': str},
+                             chunksize=batch_size)
+        for chunk in reader:
+            for column in ('Order Date', 'Ship Date'):
+                chunk[column] = pd.to_datetime(chunk[column], format=CSV_DATE_FORMAT).dt.strftime('%Y-%m-%d')
+            columns = [sql_column(column) for column in chunk.columns]
+            values = chunk.astype(object).where(chunk.notna(), None)
+            with connection:
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO superstore ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    values.itertuples(index=False, name=None))
+            batches += 1
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection:
+            for statement in catalogue['indexes']:
+                connection.execute(statement)
+            connection.execute('ANALYZE')
+            connection.execute('CREATE TABLE load_info (key TEXT PRIMARY KEY, value TEXT)')
+            connection.execute("INSERT INTO load_info VALUES ('csv_digest', ?)", (digest,))
+        index_seconds = time.perf_counter() - start
+        rows = connection.execute('SELECT COUNT(*) FROM superstore').fetchone()[0]
+    finally:
+        connection.close()
+    return {'rows': rows, 'batches': batches, 'load_seconds': load_seconds,
+            'index_seconds': index_seconds, 'reused': False}
+
+
+# ==========================================
+# QUERY EXECUTION
+# ==========================================
+
+def run_query(db_path, sql):
+    """Run one query on its own read-only connection; returns ``(frame, seconds)``."""
+    start = time.perf_counter()
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        frame = pd.read_sql_query(sql, connection)
+    finally:
+        connection.close()
+    return frame, time.perf_counter() - start
+
+
+def run_catalogue(db_path=DATABASE_FILE, catalogue=None, numbers=None, workers=1):
+    """Run the catalogue queries (all, or ``numbers``), ``workers`` at a time.
+
+    Returns ``({number: (title, frame, seconds)}, wall_seconds)`` in query order.
+    """
+    catalogue = catalogue or parse_catalogue()
+    queries = catalogue['queries']
+    numbers = sorted(queries) if numbers is None else list(numbers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        futures = {number: pool.submit(run_query, db_path, queries[number][1]) for number in numbers}
+        results = {number: (queries[number][0], *futures[number].result()) for number in numbers}
+    return results, time.perf_counter() - start
+
+
+# ==========================================
+# PARITY WITH THE PANDAS REPORT
+# ==========================================
+
+# Query number -> (pandas table, SQL key column(s), {SQL column: pandas column}).
+# Only measures defined the same way in both implementations are compared:
+# the SQL 'avg_order_value' is a per-row average and its margins are
+# sum(profit)/sum(sales), whereas the pandas report averages per order and
+# per row margin.
+PARITY_CHECKS = {
+    1: ('kpis', None, {'total_orders': 'total_orders', 'total_customers': 'total_customers',
+                       'unique_products': 'unique_products', 'total_sales': 'total_sales',
+                       'total_profit': 'total_profit', 'total_quantity_sold': 'total_quantity'}),
+    2: ('yearly_perf', 'year', {'orders': 'Orders', 'customers': 'Customers',
+                                'sales': 'Sales', 'profit': 'Profit'}),
+    3: ('region_analysis', 'region', {'total_orders': 'Total Orders', 'total_customers': 'Total Customers',
+                                      'total_sales': 'Total Sales', 'total_profit': 'Total Profit',
+                                      'total_quantity': 'Quantity Sold'}),
+    6: ('category_analysis', 'category', {'orders': 'Total Orders', 'total_sales': 'Total Sales',
+                                          'total_profit': 'Total Profit', 'units_sold': 'Quantity Sold'}),
+    11: ('segment_analysis', 'segment', {'total_customers': 'Total Customers', 'total_orders': 'Total Orders',
+                                         'total_sales': 'Total Sales', 'total_profit': 'Total Profit',
+                                         'orders_per_customer': 'Orders per Customer'}),
+    12: ('customer_sales', 'customer_id', {'total_sales': 'Total Sales', 'total_profit': 'Total Profit',
+                                           'total_orders': 'Number of Orders'}),
+    15: ('monthly_data', 'year_month', {'orders': 'Orders', 'monthly_sales': 'Sales',
+                                        'monthly_profit': 'Profit'}),
+    19: ('shipping_analysis', 'ship_mode', {'total_shipments': 'Total Shipments',
+                                            'total_sales': 'Total Sales', 'total_profit': 'Total Profit',
+                                            'pct_of_orders': '% of Orders'}),
+}
+
+
+def _pandas_keys(table):
+    """Index of a pandas report table as strings comparable with SQL keys."""
+    index = table.index
+    if isinstance(index, pd.MultiIndex):
+        index = index.get_level_values(0)
+    return index.astype(str)
+
+
+def parity_report(results, tables):
+    """Compare SQL query results with the pandas ``tables`` (name -> frame or KPI dict).
+
+    Returns one row per checked query: rows matched, largest absolute
+    difference over the compared measures and whether it is within
+    PARITY_TOLERANCE (the report's 2-decimal rounding).
+    """
+    rows = []
+    for number, (table_name, key, columns) in PARITY_CHECKS.items():
+        if number not in results or table_name not in tables:
+            continue
+        frame = results[number][1]
+        expected = tables[table_name]
+        if key is None:
+            sql_values = frame.iloc[0][list(columns)].to_numpy(dtype=float)
+            pandas_values = np.array([expected[column] for column in columns.values()], dtype=float)
+            matched, missing = 1, 0
+        else:
+            sql = frame.set_index(frame[key].astype(str))
+            pandas = expected.set_axis(_pandas_keys(expected), axis=0)
+            common = pandas.index.intersection(sql.index)
+            missing = len(pandas.index.difference(sql.index))
+            matched = len(common)
+            sql_values = sql.loc[common, list(columns)].to_numpy(dtype=float)
+            pandas_values = pandas.loc[common, list(columns.values())].to_numpy(dtype=float)
+        max_diff = float(np.nanmax(np.abs(sql_values - pandas_values))) if matched else float('nan')
+        rows.append({'Query': number, 'Title': results[number][0], 'Pandas Table': table_name,
+                     'Rows Matched': matched, 'Rows Missing': missing, 'Max Abs Diff': round(max_diff, 4),
+                     'Match': bool(matched and not missing and max_diff <= PARITY_TOLERANCE)})
+    return pd.DataFrame(rows).set_index('Query')
@@ -0,0 +1,309 @@
+"""
+STAR-SCHEMA PARQUET EXPORT
+==========================
+Writes the cleaned Superstore rows as a star schema for Power BI: one fact
+table with integer surrogate keys, and one table per dimension.
+
+    Sales_Star_Schema/
+        fact_sales/part-00000.parquet   one part per export run
+        dim_customer.parquet            Customer ID, Customer Name, Segment
+        dim_product.parquet             Product ID, Product Name, Category, Sub-Category
+        dim_geography.parquet           Country, Region, State, City, Postal Code
+        dim_ship_mode.parquet           Ship Mode
+        dim_date.parquet                every day from the first order to the last shipment
+
+The long strings (customer and product names, cities, states) are stored
+once per dimension member instead of once per row. Fact rows carry only
+their int32 keys, Order ID and the measures. Parquet stores every
+repeated-value column dictionary-encoded, so Power BI reads typed columns
+instead of parsing a flat CSV on each refresh. Date keys are YYYYMMDD
+integers, and the date table has no gaps, so it can be marked as the
+model's date table.
+
+The export is incremental. Exported rows are remembered by their Row ID
+keys (see dedup.py), and a later run appends only new rows, as a new fact
+part. Dimension members keep their surrogate keys across runs. New
+customers, products and so on get the next free keys, and the dimension
+tables (a few thousand rows) are rewritten.
+
+    python star_schema.py --input Sample_Superstore.csv --compare
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dedup import DEFAULT_POLICY, HashSet, duplicate_mask, load_store, row_keys
+from partitions import PartitionedDataset, is_partitioned, load_partitions
+from superstore_data import (CORE_COLUMNS, CSV_DTYPES, DATA_FILE, calendar_table, clean_superstore, frame_memory,
+                             load_superstore, load_superstore_untyped)
+
+STAR_DIR = 'Sales_Star_Schema'
+STAR_META = '_star.json'
+STAR_FORMAT = 1
+SEEN_DIR = '_seen'
+FACT_DIR = 'fact_sales'
+# Every raw column: the geography dimension needs the ones the report skips
+STAR_COLUMNS = sorted(set(CORE_COLUMNS) | set(CSV_DTYPES))
+# Dimension -> (surrogate key, natural key columns, attribute columns)
+DIMENSIONS = {
+    'customer': ('Customer Key', ['Customer ID'], ['Customer Name', 'Segment']),
+    'product': ('Product Key', ['Product ID', 'Product Name'], ['Category', 'Sub-Category']),
+    'geography': ('Geography Key', ['Country', 'Region', 'State', 'City', 'Postal Code'], []),
+    'ship_mode': ('Ship Mode Key', ['Ship Mode'], []),
+}
+FACT_MEASURES = ['Sales', 'Quantity', 'Discount', 'Profit', 'Shipping Days']
+
+
+def _labels(frame, columns):
+    """One string per row identifying its natural key (missing values as '')."""
+    parts = [frame[column].astype('string').fillna('') for column in columns]
+    labels = parts[0].str.cat(parts[1:], sep='\x1f') if len(parts) > 1 else parts[0]
+    return pd.Index(labels.to_numpy(dtype=object))
+
+
+def _plain(frame):
+    """``frame`` with its categorical columns decoded to their values' dtype."""
+    return frame.astype({column: frame[column].cat.categories.dtype for column in frame.columns
+                         if isinstance(frame[column].dtype, pd.CategoricalDtype)})
+
+
+def date_keys(dates):
+    """YYYYMMDD integer keys of a datetime column."""
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy(dtype=np.int32)
+
+
+def date_dimension(first, last):
+    """One row per day from ``first`` to ``last``."""
+    dates = pd.date_range(first, last, freq='D')
+    calendar = calendar_table(dates)
+    calendar.columns = [column.removeprefix('Order ') for column in calendar.columns]
+    table = pd.DataFrame({'Date Key': date_keys(dates), 'Date': dates})
+    for column in calendar.columns:
+        values = calendar[column]
+        table[column] = values.astype(str).to_numpy() if isinstance(values.dtype, pd.PeriodDtype) else values.to_numpy()
+    table['Weekday'] = dates.day_name()
+    return table
+
+
+def _write(frame, path):
+    """Write a table atomically with dictionary-encoded columns."""
+    staging = path + '.tmp'
+    frame.to_parquet(staging, index=False, use_dictionary=True, compression='snappy')
+    os.replace(staging, path)
+
+
+class StarSchema:
+    """The star-schema export in ``path``: its dimension tables, the keys of
+    the rows already exported and the fact parts written so far."""
+
+    def __init__(self, path=STAR_DIR):
+        self.path = path
+        self.dimensions = {}
+        self.dates = None
+        self.seen = HashSet()
+        self.meta = {'format': STAR_FORMAT, 'dedup_policy': DEFAULT_POLICY, 'rows': 0, 'parts': []}
+        meta_path = os.path.join(path, STAR_META)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as handle:
+            meta = json.load(handle)
+        if meta.get('format') != STAR_FORMAT:
+            raise ValueError(f"Star schema in '{path}' was written by another export format; "
+                             f"delete it and export again")
+        self.meta = meta
+        for name in DIMENSIONS:
+            self.dimensions[name] = pd.read_parquet(os.path.join(path, f'dim_{name}.parquet'))
+        self.dates = pd.read_parquet(os.path.join(path, 'dim_date.parquet'))
+        self.seen = load_store(os.path.join(path, SEEN_DIR)) or HashSet()
+
+    def _keys(self, name, rows):
+        """Surrogate keys of ``rows`` in dimension ``name``, adding new members.
+        Returns ``(keys, added)``."""
+        key, natural, attributes = DIMENSIONS[name]
+        # Match each distinct natural key once, then map the keys back to rows
+        ids = rows.groupby(natural, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+        _, first = np.unique(ids, return_index=True)
+        members = _plain(rows.iloc[first][natural + attributes].reset_index(drop=True))
+        table = self.dimensions.get(name)
+        positions = np.full(len(members), -1) if table is None else \
+            _labels(table, natural).get_indexer(_labels(members, natural))
+        new = positions < 0
+        member_keys = np.empty(len(members), dtype=np.int32)
+        member_keys[~new] = table[key].to_numpy()[positions[~new]] if table is not None else []
+        next_key = int(table[key].max()) + 1 if table is not None and len(table) else 1
+        member_keys[new] = np.arange(next_key, next_key + new.sum(), dtype=np.int32)
+        if new.any():
+            added = members[new]
+            added.insert(0, key, member_keys[new])
+            self.dimensions[name] = added if table is None else pd.concat([table, added], ignore_index=True)
+        return member_keys[ids], int(new.sum())
+
+    def append(self, df):
+        """Add the rows of the cleaned frame ``df`` not exported yet.
+
+        Returns ``{'new_rows', 'skipped_rows', 'added': {dimension: new members},
+        'part'}``; ``part`` is None when every row was already exported.
+        """
+        keys = row_keys(df, self.meta['dedup_policy'])
+        repeated = duplicate_mask(keys)
+        if repeated.any():
+            raise ValueError(f"Input repeats {int(repeated.sum())} keys under the '{self.meta['dedup_policy']}' "
+                             f"policy (e.g. Row IDs {df['Row ID'].to_numpy()[repeated][:5].tolist()})")
+        new = ~self.seen.contains(keys)
+        stats = {'new_rows': int(new.sum()), 'skipped_rows': int((~new).sum()), 'added': {}, 'part': None}
+        if not new.any():
+            return stats
+        rows = df[new].reset_index(drop=True)
+
+        fact = pd.DataFrame({'Row ID': rows['Row ID'], 'Order ID': rows['Order ID'],
+                             'Order Date Key': date_keys(rows['Order Date']),
+                             'Ship Date Key': date_keys(rows['Ship Date'])})
+        for name, (key, _, _) in DIMENSIONS.items():
+            fact[key], stats['added'][name] = self._keys(name, rows)
+        for column in FACT_MEASURES:
+            fact[column] = rows[column]
+
+        first = min(rows['Order Date'].min(), rows['Ship Date'].min())
+        last = max(rows['Order Date'].max(), rows['Ship Date'].max())
+        if self.dates is not None:
+            first, last = min(first, self.dates['Date'].min()), max(last, self.dates['Date'].max())
+        dates = date_dimension(first, last)
+        stats['added']['date'] = len(dates) - (0 if self.dates is None else len(self.dates))
+        self.dates = dates
+
+        os.makedirs(os.path.join(self.path, FACT_DIR), exist_ok=True)
+        part = os.path.join(FACT_DIR, f'part-{len(self.meta["parts"]):05d}.parquet')
+        _write(fact, os.path.join(self.path, part))
+        self.seen.add(keys[new])
+        self.meta['parts'].append(part)
+        self.meta['rows'] += len(fact)
+        stats['part'] = part
+        return stats
+
+    def save(self):
+        """Write the dimension tables, the exported keys and the metadata."""
+        for name, table in self.dimensions.items():
+            _write(table, os.path.join(self.path, f'dim_{name}.parquet'))
+        _write(self.dates, os.path.join(self.path, 'dim_date.parquet'))
+        self.seen.save(os.path.join(self.path, SEEN_DIR))
+        with open(os.path.join(self.path, STAR_META), 'w') as handle:
+            json.dump(self.meta, handle, indent=2)
+
+    def table_sizes(self):
+        """Rows and bytes of every table, the fact parts combined."""
+        sizes = {'fact_sales': (self.meta['rows'], sum(os.path.getsize(os.path.join(self.path, part))
+                                                       for part in self.meta['parts']))}
+        for name in [*DIMENSIONS, 'date']:
+            table = self.dates if name == 'date' else self.dimensions[name]
+            sizes[f'dim_{name}'] = (len(table), os.path.getsize(os.path.join(self.path, f'dim_{name}.parquet')))
+        return sizes
+
+
+def load_star_input(path):
+    """Every raw column of ``path`` (a CSV or a partitioned dataset), cleaned."""
+    if is_partitioned(path):
+        partitions, _ = PartitionedDataset(path).select()
+        raw = load_partitions(partitions, STAR_COLUMNS)
+    else:
+        raw = load_superstore(path, STAR_COLUMNS)
+    return clean_superstore(raw, verbose=False)
+
+
+def export_star_schema(path, star_dir=STAR_DIR):
+    """Append the rows of ``path`` not exported yet to the star schema in ``star_dir``.
+
+    Returns the stats of ``StarSchema.append`` plus ``seconds`` and the
+    schema's ``sizes`` (table -> rows, bytes).
+    """
+    start = time.perf_counter()
+    schema = StarSchema(star_dir)
+    stats = schema.append(load_star_input(path))
+    if stats['part'] is not None:
+        schema.save()
+    stats['seconds'] = time.perf_counter() - start
+    stats['sizes'] = schema.table_sizes() if schema.meta['parts'] else {}
+    return stats
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    return [path]
+
+
+def compare_with_csv(csv_path, star_dir=STAR_DIR, repeat=3):
+    """Size on disk, load time (median of ``repeat``) and in-memory size of the
+    flat CSV against the star schema, both read completely with pandas."""
+    def timed(load):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frames = load()
+            samples.append(time.perf_counter() - start)
+        return float(np.median(samples)), sum(frame_memory(frame) for frame in frames)
+
+    csv_files = PartitionedDataset(csv_path).select()[0] if is_partitioned(csv_path) else [{'path': csv_path}]
+    csv_bytes = sum(os.path.getsize(partition['path']) for partition in csv_files)
+    csv_seconds, csv_memory = timed(lambda: [load_superstore_untyped(partition['path']) for partition in csv_files])
+
+    star_files = [file for file in _files(star_dir) if file.endswith('.parquet')]
+    star_bytes = sum(os.path.getsize(file) for file in star_files)
+    star_seconds, star_memory = timed(lambda: [pd.read_parquet(os.path.join(star_dir, FACT_DIR))] + [
+        pd.read_parquet(file) for file in star_files if os.path.dirname(file) == star_dir.rstrip(os.sep)])
+
+    table = pd.DataFrame([
+        {'Format': 'flat CSV', 'Files': len(csv_files), 'Size MB': csv_bytes / 1e6,
+         'Load s': csv_seconds, 'Memory MB': csv_memory / 1e6},
+        {'Format': 'star schema (Parquet)', 'Files': len(star_files), 'Size MB': star_bytes / 1e6,
+         'Load s': star_seconds, 'Memory MB': star_memory / 1e6},
+    ]).set_index('Format')
+    table['vs CSV'] = (table['Size MB'] / table['Size MB'].iloc[0]).map('{:.0%} of the size'.format) + ', ' + (
+        table['Load s'].iloc[0] / table['Load s']).map('{:.1f}x faster load'.format)
+    table.loc['flat CSV', 'vs CSV'] = 'baseline'
+    return table.round(3)
+
+
+def print_export(stats, star_dir):
+    """Print the outcome of ``export_star_schema``."""
+    if stats['part'] is None:
+        print(f"✓ No new rows: all {stats['skipped_rows']:,} rows are already in '{star_dir}'")
+        return
+    print(f"✓ Appended {stats['new_rows']:,} fact rows as '{stats['part']}' in {stats['seconds']:.2f}s "
+          f"({stats['skipped_rows']:,} rows already exported)")
+    for name, (rows, size) in stats['sizes'].items():
+        added = stats['added'].get(name.removeprefix('dim_'))
+        note = f", {added:,} new" if added is not None else ''
+        print(f"  - {name:<16}{rows:>10,} rows{note:<14}{size / 1e3:>10,.1f} KB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the Superstore rows as a star schema in Parquet.')
+    parser.add_argument('--input', default=DATA_FILE,
+                        help='Superstore CSV, or a directory or glob of partitions (default: %(default)s)')
+    parser.add_argument('--output', default=STAR_DIR, help='star-schema directory (default: %(default)s)')
+    parser.add_argument('--compare', action='store_true',
+                        help='compare size and load time with the flat CSV')
+    options = parser.parse_args(argv)
+
+    try:
+        stats = export_star_schema(options.input, options.output)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 2
+    print_export(stats, options.output)
+    if options.compare:
+        pd.set_option('display.width', None)
+        print("\nStar schema against the flat CSV (every table read with pandas):")
+        print(compare_with_csv(options.input, options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+STREAMING (OUT-OF-CORE) AGGREGATION
+===================================
+Reads the Superstore CSV in chunks and folds each cleaned chunk into the
+mergeable partial aggregates from aggregates.py, so the section 3-10 tables
+can be built for files that do not fit in memory.
+
+Peak memory is bounded by the chunk size plus the aggregate state: sums and
+counts per group, the distinct (group, ID) rows behind the exact 'nunique'
+metrics (or fixed-size sketches in approximate mode), the distinct
+order/customer/product IDs for the KPIs and a 64-bit hash per kept row for
+cross-chunk duplicate detection. The correlation matrix and the profit
+margin distribution come from fixed-size mergeable statistics (see
+ReportStatistics in aggregates.py).
+
+The product and customer RANKINGS take two passes: the first keeps a
+bounded set of candidate groups per ranking (see topk.py), the second
+aggregates the rows of the candidates that can still rank, exactly.
+"""
+
+from aggregates import (RANKINGS, REPORT_AGGREGATIONS, PartialAggregate, report_partials,
+                        report_from_partials)
+from dedup import HashSet, duplicate_mask, row_keys
+from superstore_data import clean_superstore, load_superstore
+from topk import TopKCandidates, member_rows
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Tables produced by the streaming path, in report order
+STREAM_TABLES = ['region_analysis', 'category_analysis', 'segment_analysis',
+                 'yearly_perf', 'shipping_analysis', 'discount_analysis']
+
+
+def iter_clean_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield cleaned chunks of the CSV with duplicate rows removed across chunks."""
+    seen = HashSet()
+    for chunk in load_superstore(path, chunksize=chunksize):
+        keys = row_keys(chunk, 'row')
+        keep = ~(duplicate_mask(keys) | seen.contains(keys))
+        seen.add(keys[keep])
+        chunk = chunk[keep].copy()
+        yield clean_superstore(chunk, verbose=False, drop_duplicates=False)
+
+
+def stream_partials(path, chunksize=DEFAULT_CHUNKSIZE, approx_error=None, statistics=None):
+    """Fold every chunk into the partial aggregates behind the streamed tables,
+    and into ``statistics`` (a ReportStatistics) when given."""
+    partials = report_partials(STREAM_TABLES, approx_error)
+    for chunk in iter_clean_chunks(path, chunksize):
+        for partial in partials.values():
+            partial.update(chunk)
+        if statistics is not None:
+            statistics.update(chunk)
+    return partials
+
+
+def stream_tables(path, chunksize=DEFAULT_CHUNKSIZE, approx_error=None, statistics=None):
+    """Section 3 KPIs and the STREAM_TABLES, computed chunk by chunk.
+
+    Returns ``(kpis, tables)``. Without ``approx_error`` the tables equal
+    the in-memory tables built by sales_analysis.py. ``statistics`` is
+    updated in the same pass.
+    """
+    return report_from_partials(stream_partials(path, chunksize, approx_error, statistics))
+
+
+def stream_rankings(path, chunksize=DEFAULT_CHUNKSIZE):
+    """The RANKINGS tables, computed chunk by chunk in two passes.
+
+    Returns ``(tables, candidates)``, where ``candidates`` maps each table to
+    the candidate groups kept and the groups aggregated in the second pass.
+    The tables equal the in-memory ones.
+    """
+    candidates = {name: TopKCandidates(REPORT_AGGREGATIONS[name][0], column, k, ascending)
+                  for name, (column, k, ascending, _) in RANKINGS.items()}
+    for chunk in iter_clean_chunks(path, chunksize):
+        for ranking in candidates.values():
+            ranking.update(chunk)
+
+    # The tables rank rounded values, so groups within a cent of the cut
+    # can still tie with it
+    survivors = {name: ranking.survivors(tolerance=0.01) for name, ranking in candidates.items()}
+    partials = {name: PartialAggregate(*REPORT_AGGREGATIONS[name]) for name in RANKINGS}
+    for chunk in iter_clean_chunks(path, chunksize):
+        for name, partial in partials.items():
+            groups = survivors[name]
+            partial.update(chunk if groups is None else chunk[member_rows(chunk, partial.by, groups)])
+
+    tables = {name: RANKINGS[name][3](partial.result()) for name, partial in partials.items()}
+    counts = {name: (len(candidates[name]), len(partials[name].totals)) for name in RANKINGS}
+    return tables, counts
@@ -0,0 +1,197 @@
+"""
+SUPERSTORE DATA LOADING AND CLEANING
+====================================
+Loading and preprocessing steps for the Superstore dataset, shared by the
+analysis script and the columnar cache (see data_cache.py).
+
+Any change to this module changes the cache fingerprint, so cached frames
+built by an older version of the cleaning logic are never reused.
+"""
+
+import pandas as pd
+
+from dedup import duplicate_mask, row_keys
+
+DATA_FILE = 'Sample_Superstore.csv'
+CSV_ENCODING = 'latin-1'
+DATE_FORMAT = '%m/%d/%Y'
+
+# Load schema. Low-cardinality dimensions and the ID/name columns are read
+# as categoricals (dictionary-encoded), integer columns are downcast. Sales,
+# Discount and Profit stay float64: float32 would shift the report totals
+# and push discounts such as 0.2 into the wrong Discount Range bucket.
+DIMENSION_COLUMNS = ['Ship Mode', 'Segment', 'Country', 'City', 'State',
+                     'Region', 'Category', 'Sub-Category']
+ID_COLUMNS = ['Order ID', 'Customer ID', 'Customer Name', 'Product ID', 'Product Name']
+CSV_DTYPES = {
+    **{column: 'category' for column in DIMENSION_COLUMNS + ID_COLUMNS},
+    'Row ID': 'int32',
+    'Postal Code': 'Int32',
+    'Quantity': 'int16',
+    'Sales': 'float64',
+    'Discount': 'float64',
+    'Profit': 'float64',
+}
+
+# Columns every run reads: cleaning derives the calculated columns from
+# these, and Row ID keeps duplicate detection exact when other columns are
+# projected away
+CORE_COLUMNS = ['Row ID', 'Order Date', 'Ship Date', 'Sales', 'Discount', 'Profit']
+
+# Additional raw columns read by each report section (keyed by its name in
+# sales_analysis.py); sections not listed need only the core columns. The
+# aggregation engine computes every metric requested for a grouping key in
+# one pass, so a section also needs the columns of the other tables grouped
+# by the same key (e.g. the product matrix shares Product Name with the
+# product tables).
+SECTION_COLUMNS = {
+    'kpis': ['Order ID', 'Customer ID', 'Product ID', 'Quantity'],
+    'regional': ['Region', 'Order ID', 'Customer ID', 'Quantity'],
+    'category': ['Category', 'Sub-Category', 'Order ID', 'Quantity'],
+    'customer': ['Segment', 'Customer ID', 'Customer Name', 'Order ID'],
+    'time': ['Order ID', 'Customer ID', 'Region', 'Category'],
+    'product': ['Product Name', 'Order ID', 'Quantity'],
+    'shipping': ['Ship Mode', 'Region', 'Order ID'],
+    'discount': ['Category', 'Order ID', 'Quantity'],
+    'rfm': ['Customer ID', 'Customer Name', 'Order ID'],
+    'product_matrix': ['Product Name', 'Order ID', 'Quantity'],
+    'correlation': ['Quantity'],
+    'charts': ['Region', 'Category', 'Sub-Category', 'Segment', 'Order ID', 'Customer ID', 'Quantity'],
+}
+
+# Discount buckets used by the discount impact analysis
+DISCOUNT_BINS = [-0.01, 0, 0.1, 0.2, 0.3, 0.4, 1]
+DISCOUNT_LABELS = ['No Discount', '1-10%', '11-20%', '21-30%', '31-40%', '40%+']
+
+
+def report_columns(sections=None):
+    """Raw columns needed by ``sections`` (every section by default)."""
+    columns = set(CORE_COLUMNS)
+    for section in SECTION_COLUMNS if sections is None else sections:
+        columns.update(SECTION_COLUMNS.get(section, []))
+    return sorted(columns)
+
+
+def load_superstore(path=DATA_FILE, columns=None, chunksize=None):
+    """Read the Superstore CSV with the typed load schema.
+
+    Only ``columns`` are parsed (default: the columns of every section).
+    With ``chunksize`` an iterator of chunks is returned instead.
+    """
+    usecols = report_columns() if columns is None else columns
+    dtypes = {column: dtype for column, dtype in CSV_DTYPES.items() if column in usecols}
+    return pd.read_csv(path, encoding=CSV_ENCODING, usecols=usecols, dtype=dtypes,
+                       chunksize=chunksize)
+
+
+def load_superstore_untyped(path=DATA_FILE):
+    """Read every column with pandas' default dtypes (for memory comparisons)."""
+    return pd.read_csv(path, encoding=CSV_ENCODING)
+
+
+def frame_memory(df):
+    """Deep memory usage of a frame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def clean_superstore(df, verbose=True, drop_duplicates=True):
+    """Remove duplicates, parse the date columns and add calculated columns.
+
+    Pass ``drop_duplicates=False`` when duplicates were already removed by
+    the caller (e.g. across chunks in streaming mode).
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+
+    # Check for missing values
+    log("Missing values:")
+    missing_values = df.isnull().sum()
+    log(missing_values[missing_values > 0] if missing_values.sum() > 0 else "No missing values found!")
+    log()
+
+    # Check for duplicates: one 64-bit hash per row instead of comparing
+    # every column
+    if drop_duplicates:
+        repeated = duplicate_mask(row_keys(df, 'row'))
+        duplicates = int(repeated.sum())
+        log(f"Duplicate rows: {duplicates}")
+        if duplicates > 0:
+            df = df[~repeated].copy()
+            log(f"✓ Removed {duplicates} duplicate rows")
+        log()
+
+    # Create new calculated columns, converting the date columns to datetime
+    # on the way
+    df['Profit Margin'] = (df['Profit'] / df['Sales']) * 100
+    df = add_date_columns(df)
+    log("✓ Date columns converted to datetime format")
+    log()
+    df = add_discount_range(df)
+
+    log("✓ Created calculated columns:")
+    log("  - Profit Margin")
+    log("  - Order Year, Month, Quarter")
+    log("  - Shipping Days")
+    log("  - Year-Month, Year-Quarter")
+    log("  - Discount Range")
+    log()
+
+    return df
+
+
+def date_codes(values, date_format=DATE_FORMAT):
+    """Integer codes of the date strings ``values`` and the parsed distinct dates.
+
+    ``dates.take(codes)`` is the parsed column. Each distinct string is
+    parsed once; missing values map to a trailing NaT.
+    """
+    codes, uniques = pd.factorize(values)
+    dates = pd.DatetimeIndex(pd.to_datetime(uniques, format=date_format))
+    missing = codes < 0
+    if missing.any():
+        dates = dates.append(pd.DatetimeIndex([pd.NaT], dtype=dates.dtype))
+        codes[missing] = len(dates) - 1
+    return codes, dates
+
+
+def parse_dates(values, date_format=DATE_FORMAT):
+    """Parse a column of date strings, once per distinct value."""
+    codes, dates = date_codes(values, date_format)
+    return pd.Series(dates.take(codes), index=values.index, name=values.name)
+
+
+def calendar_table(dates):
+    """Calendar columns derived from the order date, one row per date in ``dates``."""
+    dates = pd.Series(dates)
+    return pd.DataFrame({
+        'Order Year': dates.dt.year,
+        'Order Month': dates.dt.month,
+        'Order Month Name': dates.dt.strftime('%b'),
+        'Order Quarter': dates.dt.quarter,
+        'Year-Month': dates.dt.to_period('M'),
+        'Year-Quarter': dates.dt.to_period('Q'),
+    })
+
+
+def add_date_columns(df):
+    """Parse Order Date and Ship Date and add the calendar and Shipping Days columns.
+
+    Each distinct date string is parsed once and the calendar columns are
+    looked up per distinct order date, so the cost follows the number of
+    dates rather than rows (about 1,400 dates however many orders).
+    """
+    order_codes, order_dates = date_codes(df['Order Date'])
+    df['Order Date'] = order_dates.take(order_codes)
+    df['Ship Date'] = parse_dates(df['Ship Date'])
+    calendar = calendar_table(order_dates)
+    for column in ['Order Year', 'Order Month', 'Order Month Name', 'Order Quarter']:
+        df[column] = calendar[column].take(order_codes).array
+    df['Shipping Days'] = (df['Ship Date'] - df['Order Date']).dt.days
+    for column in ['Year-Month', 'Year-Quarter']:
+        df[column] = calendar[column].take(order_codes).array
+    return df
+
+
+def add_discount_range(df):
+    """Bucket the discount rate into the DISCOUNT_LABELS ranges."""
+    df['Discount Range'] = pd.cut(df['Discount'], bins=DISCOUNT_BINS, labels=DISCOUNT_LABELS)
+    return df
@@ -0,0 +1,264 @@
+"""
+SYNTHETIC SUPERSTORE GENERATOR
+==============================
+Writes Superstore-schema CSVs of any size (1M, 10M, 50M rows...) whose
+distributions follow Sample_Superstore.csv, for benchmarking the report at
+scale (see benchmark.py).
+
+Every synthetic order copies the shape of a randomly drawn real order: its
+order date, ship mode and shipping days, ship-to city/state/region and
+number of lines. Every line copies a real line shipped to the same state:
+its sub-category, quantity, discount and profit margin. So the seasonality,
+the state-dependent discounts and the discount/margin relationship carry
+over. Customers and products are drawn from synthetic catalogues:
+- customers grow with the row count, keeping the real rows per customer;
+  the real customers' order counts set how often each one buys
+- products grow with the square root of the row count, since catalogues
+  grow more slowly than sales; each keeps its real counterpart's
+  sub-category and list price (with a little jitter)
+
+Rows are generated and appended in chunks, so memory does not depend on the
+output size. The same seed always produces the same file.
+
+    python synthetic_data.py --rows 10m --output superstore_10m.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from superstore_data import CSV_ENCODING, DATA_FILE
+
+# Row counts accepted by name on the command line
+SCALES = {'1m': 1_000_000, '10m': 10_000_000, '50m': 50_000_000}
+DEFAULT_GENERATOR_CHUNK = 250_000
+DEFAULT_SEED = 0
+CSV_DATE_FORMAT = '%m/%d/%Y'
+
+
+def parse_rows(value):
+    """Row count from an integer or a scale name ('1m', '10m', '50m')."""
+    value = str(value).lower().replace('_', '').replace(',', '')
+    rows = SCALES[value] if value in SCALES else int(value)
+    if rows < 1:
+        raise ValueError(f"Row count must be positive, got {value}")
+    return rows
+
+
+def _group_offsets(codes, groups):
+    """Start and size of each group code in a frame sorted by ``codes``."""
+    sizes = np.bincount(codes, minlength=groups)
+    return np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes
+
+
+def _format_dates(dates):
+    """m/d/YYYY strings (no zero padding, as in the source CSV), formatted once per unique date."""
+    codes, uniques = pd.factorize(dates)
+    labels = np.array([f"{day.month}/{day.day}/{day.year}" for day in uniques], dtype=object)
+    return labels[codes]
+
+
+class SuperstoreGenerator:
+    """Generates synthetic Superstore rows modelled on a real sample.
+
+    ``rows`` sizes the customer and product catalogues; ``customers`` and
+    ``products`` override them (the product catalogue never shrinks below
+    the sample's).
+    """
+
+    def __init__(self, rows, sample_path=DATA_FILE, seed=DEFAULT_SEED, customers=None, products=None):
+        self.rows = rows
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        sample = pd.read_csv(sample_path, encoding=CSV_ENCODING, dtype={'Postal Code': 'Int64'})
+        sample['Order Date'] = pd.to_datetime(sample['Order Date'], format=CSV_DATE_FORMAT)
+        sample['Ship Date'] = pd.to_datetime(sample['Ship Date'], format=CSV_DATE_FORMAT)
+        self.columns = list(sample.columns)
+        scale = rows / len(sample)
+        self._model_orders(sample)
+        self._model_lines(sample)
+        self._build_customers(sample, customers or max(1, round(sample['Customer ID'].nunique() * scale)))
+        self._build_products(sample, products or max(1, round(sample['Product ID'].nunique() * np.sqrt(scale))))
+
+    def _model_orders(self, sample):
+        orders = sample.groupby('Order ID', sort=False).agg(
+            order_date=('Order Date', 'first'), ship_date=('Ship Date', 'first'),
+            ship_mode=('Ship Mode', 'first'), prefix=('Order ID', 'first'),
+            city=('City', 'first'), state=('State', 'first'), postal_code=('Postal Code', 'first'),
+            region=('Region', 'first'), lines=('Row ID', 'size'))
+        orders['prefix'] = orders['prefix'].str.split('-').str[0]
+        orders['ship_days'] = (orders['ship_date'] - orders['order_date']).dt.days
+        self.orders = orders.reset_index(drop=True)
+        self.states = pd.Index(sorted(sample['State'].unique()))
+        self.order_states = self.states.get_indexer(self.orders['state'])
+
+    def _model_lines(self, sample):
+        lines = pd.DataFrame({
+            'state': self.states.get_indexer(sample['State']),
+            'sub_category': sample['Sub-Category'],
+            'quantity': sample['Quantity'],
+            'discount': sample['Discount'],
+            'margin': sample['Profit'] / sample['Sales'],
+        }).sort_values('state', kind='stable').reset_index(drop=True)
+        self.lines = lines
+        self.line_starts, self.line_sizes = _group_offsets(lines['state'].to_numpy(), len(self.states))
+
+    def _build_customers(self, sample, count):
+        real = sample.groupby('Customer ID').agg(name=('Customer Name', 'first'), segment=('Segment', 'first'),
+                                                 orders=('Order ID', 'nunique'))
+        base = np.arange(count) % len(real)
+        copy = np.arange(count) // len(real)
+        ids = real.index.to_numpy()[base]
+        names = real['name'].to_numpy()[base]
+        clones = copy > 0
+        # Further copies of a real customer get a new number and a suffixed name
+        ids[clones] = [f"{cid.split('-')[0]}-{100000 + k}" for cid, k in zip(ids[clones], np.flatnonzero(clones))]
+        names[clones] = [f"{name} {c + 1}" for name, c in zip(names[clones], copy[clones])]
+        weights = real['orders'].to_numpy(dtype=float)[base]
+        self.customer_ids = ids
+        self.customer_names = names
+        self.customer_segments = real['segment'].to_numpy()[base]
+        self.customer_weights = np.cumsum(weights / weights.sum())
+
+    def _build_products(self, sample, count):
+        list_price = sample['Sales'] / (sample['Quantity'] * (1 - sample['Discount']))
+        real = sample.assign(list_price=list_price).groupby('Product ID').agg(
+            name=('Product Name', 'first'), category=('Category', 'first'),
+            sub_category=('Sub-Category', 'first'), list_price=('list_price', 'median'))
+        # Never fewer products than the sample, so every sub-category has some
+        count = max(count, len(real))
+        base = np.arange(count) % len(real)
+        copy = np.arange(count) // len(real)
+        ids = real.index.to_numpy()[base]
+        names = real['name'].to_numpy()[base]
+        prices = real['list_price'].to_numpy()[base]
+        clones = copy > 0
+        ids[clones] = [f"{pid.rsplit('-', 1)[0]}-{20000000 + k}" for pid, k in zip(ids[clones], np.flatnonzero(clones))]
+        names[clones] = [f"{name} #{c + 1}" for name, c in zip(names[clones], copy[clones])]
+        prices[clones] *= self.rng.lognormal(0, 0.15, clones.sum())
+
+        self.sub_categories = pd.Index(sorted(real['sub_category'].unique()))
+        sub_codes = self.sub_categories.get_indexer(real['sub_category'].to_numpy()[base])
+        order = np.argsort(sub_codes, kind='stable')
+        self.product_ids = ids[order]
+        self.product_names = names[order]
+        self.product_categories = real['category'].to_numpy()[base][order]
+        self.product_sub_categories = real['sub_category'].to_numpy()[base][order]
+        self.product_prices = prices[order]
+        self.product_starts, self.product_sizes = _group_offsets(sub_codes[order], len(self.sub_categories))
+        self.line_sub_codes = self.sub_categories.get_indexer(self.lines['sub_category'])
+
+    def _orders(self, count, first_order):
+        """``count`` synthetic orders: template order rows plus customer and Order ID."""
+        template = self.rng.integers(0, len(self.orders), count)
+        orders = self.orders.iloc[template].reset_index(drop=True)
+        orders['state_code'] = self.order_states[template]
+        orders['customer'] = np.searchsorted(self.customer_weights, self.rng.random(count), side='right')
+        orders['customer'] = orders['customer'].clip(upper=len(self.customer_ids) - 1)
+        number = np.arange(first_order, first_order + count) + 100000
+        orders['order_id'] = (orders['prefix'] + '-' + orders['order_date'].dt.year.astype(str)
+                              + '-' + pd.Series(number).astype(str))
+        return orders
+
+    def chunk(self, first_row, rows, first_order):
+        """Rows ``first_row``.. of the file (at most ``rows``); returns ``(frame, orders_used)``."""
+        # Enough orders to cover the chunk; the last one may be cut short
+        orders = self._orders(max(1, int(rows / self.orders['lines'].mean() * 1.2) + 8), first_order)
+        ends = np.cumsum(orders['lines'].to_numpy())
+        used = int(np.searchsorted(ends, rows)) + 1
+        while used > len(orders):
+            more = self._orders(len(orders), first_order + len(orders))
+            orders = pd.concat([orders, more], ignore_index=True)
+            ends = np.cumsum(orders['lines'].to_numpy())
+            used = int(np.searchsorted(ends, rows)) + 1
+        orders = orders.iloc[:used]
+        order_of_row = np.repeat(np.arange(used), orders['lines'].to_numpy())[:rows]
+        rows = len(order_of_row)
+        row_orders = orders.iloc[order_of_row].reset_index(drop=True)
+
+        # Lines: a real line shipped to the same state, then a product of its sub-category
+        states = row_orders['state_code'].to_numpy()
+        line = self.line_starts[states] + (self.rng.random(rows) * self.line_sizes[states]).astype(np.int64)
+        sub = self.line_sub_codes[line]
+        product = self.product_starts[sub] + (self.rng.random(rows) * self.product_sizes[sub]).astype(np.int64)
+        quantity = self.lines['quantity'].to_numpy()[line]
+        discount = self.lines['discount'].to_numpy()[line]
+        sales = (self.product_prices[product] * quantity * (1 - discount)).round(4)
+        profit = (sales * self.lines['margin'].to_numpy()[line]).round(4)
+        customer = row_orders['customer'].to_numpy()
+
+        frame = pd.DataFrame({
+            'Row ID': np.arange(first_row, first_row + rows) + 1,
+            'Order ID': row_orders['order_id'],
+            'Order Date': _format_dates(row_orders['order_date']),
+            'Ship Date': _format_dates(row_orders['order_date']
+                                       + pd.to_timedelta(row_orders['ship_days'], unit='D')),
+            'Ship Mode': row_orders['ship_mode'],
+            'Customer ID': self.customer_ids[customer],
+            'Customer Name': self.customer_names[customer],
+            'Segment': self.customer_segments[customer],
+            'Country': 'United States',
+            'City': row_orders['city'],
+            'State': row_orders['state'],
+            'Postal Code': row_orders['postal_code'],
+            'Region': row_orders['region'],
+            'Product ID': self.product_ids[product],
+            'Category': self.product_categories[product],
+            'Sub-Category': self.product_sub_categories[product],
+            'Product Name': self.product_names[product],
+            'Sales': sales,
+            'Quantity': quantity,
+            'Discount': discount,
+            'Profit': profit,
+        })
+        return frame[self.columns], used
+
+    def write(self, path, chunksize=DEFAULT_GENERATOR_CHUNK):
+        """Write ``self.rows`` rows to ``path`` chunk by chunk; returns the number of orders."""
+        written, orders = 0, 0
+        while written < self.rows:
+            frame, used = self.chunk(written, min(chunksize, self.rows - written), orders)
+            frame.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0, index=False,
+                         encoding=CSV_ENCODING)
+            written += len(frame)
+            orders += used
+        return orders
+
+
+def generate_superstore(path, rows, sample_path=DATA_FILE, seed=DEFAULT_SEED, chunksize=DEFAULT_GENERATOR_CHUNK,
+                        customers=None, products=None):
+    """Write a synthetic ``rows``-row Superstore CSV to ``path``.
+
+    Returns ``{'rows', 'orders', 'customers', 'products', 'seconds'}``.
+    """
+    start = time.perf_counter()
+    generator = SuperstoreGenerator(rows, sample_path, seed, customers, products)
+    orders = generator.write(path, chunksize)
+    return {'rows': rows, 'orders': orders, 'customers': len(generator.customer_ids),
+            'products': len(generator.product_ids), 'seconds': time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Superstore CSV.')
+    parser.add_argument('--rows', type=parse_rows, default=SCALES['1m'],
+                        help=f"row count or one of {', '.join(SCALES)} (default: 1m)")
+    parser.add_argument('--output', help='CSV to write (default: superstore_<rows>.csv)')
+    parser.add_argument('--sample', default=DATA_FILE, help='real CSV the distributions are taken from')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='random seed (default: %(default)s)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_GENERATOR_CHUNK,
+                        help='rows generated and written per chunk (default: %(default)s)')
+    parser.add_argument('--customers', type=int, help='customer catalogue size (default: scaled with rows)')
+    parser.add_argument('--products', type=int, help='product catalogue size (default: scaled with rows)')
+    options = parser.parse_args(argv)
+
+    path = options.output or f'superstore_{options.rows}.csv'
+    info = generate_superstore(path, options.rows, options.sample, options.seed, options.chunksize,
+                               options.customers, options.products)
+    print(f"✓ Wrote {info['rows']:,} rows to '{path}' in {info['seconds']:.1f}s")
+    print(f"  {info['orders']:,} orders, {info['customers']:,} customers, {info['products']:,} products")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+TOP-K AND BOTTOM-K SELECTION
+============================
+Ranked tables (top products, top customers, loss-making products, top
+sub-categories) keep the first k rows of a grouped table. ``top_k`` finds
+them with a partial selection (``np.partition``) and sorts only those k
+rows, instead of sorting the whole table. The result equals a stable
+``sort_values(...).head(k)``: ties keep their order in the table, and
+missing values rank last.
+
+In streaming mode a group's total is spread over many chunks, so its rank
+is only known once every chunk has been read. ``TopKCandidates`` keeps a
+bounded candidate set instead of every group. From each chunk it keeps the
+best ``size`` groups and two bounds: the most and the least that any group
+left out could have in that chunk. Candidate sets merge by summing. After
+the last chunk, a group's total is bounded by its known partial sums plus
+the bounds of the chunks that left it out. Every group whose upper bound
+falls below the k-th best lower bound is ruled out. The survivors are few,
+and aggregating them exactly (a second pass over their rows) gives the
+exact top k.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Candidates kept per chunk, as a multiple of k
+CANDIDATE_FACTOR = 100
+
+
+def _rank_keys(data, column, ascending):
+    """Float keys whose ascending order is the ranking; missing values rank last."""
+    values = (data if column is None else data[column]).to_numpy(dtype=float, na_value=np.nan)
+    keys = values if ascending else -values
+    return np.where(np.isnan(keys), np.inf, keys)
+
+
+def top_k(data, k, column=None, ascending=False):
+    """The ``k`` rows of ``data`` (a Series, or a frame ranked by ``column``)
+    with the largest values, or the smallest with ``ascending=True``."""
+    keys = _rank_keys(data, column, ascending)
+    if k <= 0:
+        return data.iloc[:0]
+    if k < len(keys):
+        kth = np.partition(keys, k - 1)[k - 1]
+        rows = np.flatnonzero(keys <= kth)
+    else:
+        rows = np.arange(len(keys))
+    return data.iloc[rows[np.argsort(keys[rows], kind='stable')[:k]]]
+
+
+class TopKCandidates:
+    """Bounded, mergeable candidates for the ``k`` groups of ``by`` with the
+    largest (or, with ``ascending``, smallest) sum of ``column``.
+
+    ``listed`` holds, per candidate group, its summed partial scores in the
+    chunks that kept it and the bounds of those chunks. ``high`` and ``low``
+    sum the bounds of every chunk. Scores are the sums, negated for
+    ``ascending``, so a larger score always ranks first.
+    """
+
+    def __init__(self, by, column, k, ascending=False, size=None):
+        self.by = by
+        self.column = column
+        self.k = k
+        self.ascending = ascending
+        self.size = size or CANDIDATE_FACTOR * k
+        self.listed = None
+        self.high = 0.0
+        self.low = 0.0
+        self.truncated = False
+
+    def update(self, chunk):
+        """Fold a chunk of cleaned rows into the candidates."""
+        sums = chunk.groupby(self.by, observed=True)[self.column].sum()
+        scores = -sums if self.ascending else sums
+        high = low = 0.0
+        if len(scores) > self.size:
+            values = scores.to_numpy()
+            cut = np.partition(values, len(values) - self.size)[len(values) - self.size]
+            # A group left out scored at most ``cut`` here, or nothing if absent
+            high, low = max(cut, 0.0), min(values.min(), 0.0)
+            scores = scores[values >= cut]
+        listed = pd.DataFrame({'score': scores, 'high': high, 'low': low})
+        self._merge(listed, high, low, len(scores) < len(sums))
+        return self
+
+    def merge(self, other):
+        """Fold another candidate set for the same ranking into this one."""
+        if other.listed is not None:
+            self._merge(other.listed, other.high, other.low, other.truncated)
+        return self
+
+    def _merge(self, listed, high, low, truncated):
+        if self.listed is not None:
+            listed = pd.concat([self.listed, listed])
+            listed = listed.groupby(level=list(range(listed.index.nlevels)), observed=True).sum()
+        self.listed = listed
+        self.high += high
+        self.low += low
+        self.truncated = self.truncated or truncated
+
+    def bounds(self):
+        """Lower and upper bounds of each candidate's score over every chunk."""
+        listed = self.listed
+        return pd.DataFrame({'lower': listed['score'] + self.low - listed['low'],
+                             'upper': listed['score'] + self.high - listed['high']})
+
+    def survivors(self, tolerance=0.0):
+        """Index of the candidate groups that can still rank in the top k.
+
+        Groups within ``tolerance`` of the cut are kept as well (e.g. to
+        resolve ties after rounding). None when the candidates cannot rule
+        out the groups no chunk kept; every group must then be aggregated.
+        """
+        if self.listed is None:
+            return None
+        if not self.truncated:
+            return self.listed.index
+        bounds = self.bounds()
+        if len(bounds) < self.k:
+            return None
+        threshold = np.partition(bounds['lower'].to_numpy(), len(bounds) - self.k)[len(bounds) - self.k]
+        if self.high >= threshold - tolerance:
+            return None
+        return bounds.index[(bounds['upper'] >= threshold - tolerance).to_numpy()]
+
+    def __len__(self):
+        return 0 if self.listed is None else len(self.listed)
+
+
+def member_rows(frame, by, groups):
+    """Boolean mask of the rows of ``frame`` whose ``by`` key is in the index ``groups``."""
+    if isinstance(by, str):
+        return frame[by].isin(groups).to_numpy()
+    return pd.MultiIndex.from_frame(frame[list(by)]).isin(groups)